@@ -0,0 +1,61 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+"""
+Compare process launches per second with and without the spawn server.
+
+Usage:
+  spawn.py [--threads NUM] [--seconds NUM] [--ballast MB]
+
+Options:
+  --threads NUM     Number of worker threads [default: 8]
+  --seconds NUM     Duration of each measurement [default: 5]
+  --ballast MB      Memory to allocate first, to mimic a large session
+                    [default: 0]
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+from docopt import docopt
+
+from sxrumble import spawner
+from sxrumble.operations import run_command
+
+
+COMMAND = ['true']
+
+
+def measure(threads: int, seconds: float) -> float:
+    deadline = monotonic() + seconds
+
+    def worker() -> int:
+        launches = 0
+        while monotonic() < deadline:
+            run_command(COMMAND, None)
+            launches += 1
+        return launches
+
+    with ThreadPoolExecutor(threads) as e:
+        futures = [e.submit(worker) for _ in range(threads)]
+    return sum(f.result() for f in futures) / seconds
+
+
+def main() -> None:
+    args = docopt(__doc__)
+    threads = int(args['--threads'])
+    seconds = float(args['--seconds'])
+    ballast = bytearray(int(args['--ballast']) * 2 ** 20)  # noqa
+
+    print('subprocess:   {:8.1f} launches/s'.format(measure(threads, seconds)))
+    spawner.start()
+    try:
+        print('spawn server: {:8.1f} launches/s'.format(
+            measure(threads, seconds),
+        ))
+    finally:
+        spawner.stop()
+
+
+if __name__ == '__main__':
+    main()
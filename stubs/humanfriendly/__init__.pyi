@@ -1,2 +1,7 @@
 class InvalidSize(Exception): ...
+class InvalidTimespan(Exception): ...
 def parse_size(size: str, binary: bool = ...) -> int: ...
+def parse_timespan(timespan: str) -> float: ...
+def format_size(
+    size: int, keep_width: bool = ..., binary: bool = ...) -> str: ...
+def format_number(number: float, num_decimals: int = ...) -> str: ...
@@ -0,0 +1,287 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Access logs of SX clusters imported as sessions. Requests of the REST API
+# are mapped to operations and anything else is skipped.
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import zlib
+from collections import deque
+from datetime import datetime, timezone
+from multiprocessing.pool import AsyncResult  # noqa
+from typing import Deque, Iterable, List, Optional, Pattern, Tuple  # noqa
+from urllib.parse import parse_qs, unquote
+
+from sxrumble.config import Config, Session, get_session_filename
+from sxrumble.exceptions import ValidationError
+from sxrumble.sessions import SessionWriter
+
+
+# Bytes of the log parsed by a single task, about.
+CHUNK_SIZE = 16 * 1024 * 1024
+# Chunks parsed or waiting to be written, per process.
+CHUNKS_AHEAD = 2
+LOG_FORMATS = {
+    'combined':
+        r'^\S+ \S+ \S+ \[(?P<time>[^\]]+)\] '
+        r'"(?P<method>[A-Z]+) (?P<path>\S+)[^"]*" \d+ (?P<bytes>\d+|-)',
+}
+REQUIRED_GROUPS = ('time', 'method', 'path')
+TIME_FORMATS = (
+    '%d/%b/%Y:%H:%M:%S %z',
+    '%Y-%m-%dT%H:%M:%S%z',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+)
+WILDCARDS = re.compile(r'[*?\[]')
+
+# (time, type, params)
+ImportedOperation = Tuple[float, str, dict]
+# (first byte, byte past the last)
+Chunk = Tuple[int, int]
+
+
+logger = logging.getLogger(__name__)
+
+
+class LogParser:
+    """Turns lines of an access log into operations of a session."""
+
+    def __init__(self, config: Config, log_format: str, keep_names: bool) \
+            -> None:
+        self.pattern = compile_format(log_format)
+        self.volumes = config.volumes
+        self.min_size = config.min_size
+        self.max_size = config.max_size
+        self.entropy_size = config.entropy_size
+        self.keep_names = keep_names
+        # Names are hashed with the seed, so they are the same within a
+        # session, and cannot be guessed from another one.
+        self.key = config.entropy_seed.encode()
+        # Time of the first line, which the session starts at.
+        self.origin = 0.0
+        self.last_time = (None, 0.0)  # type: Tuple[Optional[str], float]
+
+    def parse_line(self, line: str) -> Optional[ImportedOperation]:
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+        try:
+            time = self.parse_time(match.group('time'))
+            operation = self.map_request(
+                match.group('method'),
+                match.group('path'),
+                match.groupdict().get('bytes'),
+            )
+        except ValueError:
+            return None
+        if operation is None:
+            return None
+        return (time - self.origin,) + operation
+
+    def parse_time(self, value: str) -> float:
+        # Lines of the same second are common, parse those once.
+        if value == self.last_time[0]:
+            return self.last_time[1]
+        time = parse_log_time(value)
+        self.last_time = value, time
+        return time
+
+    def map_request(self, method: str, path: str, size: Optional[str]) \
+            -> Optional[Tuple[str, dict]]:
+        # Paths of requests have no scheme nor host, no need for `urlsplit`.
+        path, _, query_string = path.partition('?')
+        query = parse_qs(query_string, keep_blank_values=True) \
+            if query_string else {}
+        volume, _, name = unquote(path).lstrip('/').partition('/')
+        if method == 'GET' and not volume:
+            if 'volumeList' in query:
+                return 'ListVolumes', {}
+            return None
+        if volume.startswith('.'):
+            if method == 'GET' and volume == '.users' and not name:
+                return 'ListUsers', {}
+            return None
+        volume = self.map_volume(volume)
+        if method == 'GET' and not name:
+            if query.get('o') == ['acl']:
+                return 'ShowVolumeAcl', {'volume': volume}
+            return self.map_listing(volume, query)
+        if method == 'PUT' and name and not name.endswith('/'):
+            return 'UploadNewFile', self.map_upload(volume, name, size)
+        return None
+
+    def map_volume(self, volume: str) -> str:
+        if volume in self.volumes:
+            return volume
+        # Not `hash`, which differs between runs.
+        return self.volumes[zlib.crc32(volume.encode()) % len(self.volumes)]
+
+    def map_listing(self, volume: str, query: dict) -> Tuple[str, dict]:
+        path = query.get('filter', [''])[0].lstrip('/')
+        if WILDCARDS.search(path):
+            return 'GlobFiles', {
+                'volume': volume, 'pattern': self.map_name(path),
+            }
+        params = {'volume': volume}
+        if path:
+            params['prefix'] = self.map_name(path.rstrip('/')) + '/'
+        if 'recursive' in query:
+            params['recursive'] = True
+        return 'ListFiles', params
+
+    def map_upload(self, volume: str, name: str, size: Optional[str]) \
+            -> dict:
+        if size is None or size == '-':
+            size_bytes = self.min_size
+        else:
+            size_bytes = min(max(int(size), self.min_size), self.max_size)
+        filename = self.map_name(name)
+        # The same file takes the same content, on every import.
+        offsets = self.entropy_size - size_bytes + 1
+        return {
+            'volume': volume,
+            'filename': filename,
+            'size': size_bytes,
+            'offset': zlib.crc32(filename.encode()) % offsets,
+        }
+
+    def map_name(self, name: str) -> str:
+        if self.keep_names:
+            return name
+        return '/'.join(
+            self.hash_component(c) for c in name.split('/')
+        )
+
+    def hash_component(self, component: str) -> str:
+        if not component:
+            return component
+        # Patterns keep matching something, not anything in particular.
+        if WILDCARDS.search(component):
+            return '*'
+        digest = hashlib.sha1(self.key + component.encode()).hexdigest()
+        return 'sxrumble-' + digest[:16]
+
+
+def compile_format(log_format: str) -> Pattern:
+    try:
+        pattern = re.compile(LOG_FORMATS.get(log_format, log_format))
+    except re.error as e:
+        raise ValidationError("Invalid log format: {}".format(e))
+    missing = [g for g in REQUIRED_GROUPS if g not in pattern.groupindex]
+    if missing:
+        raise ValidationError(
+            "Log format is missing the groups: " + ', '.join(missing),
+        )
+    return pattern
+
+
+def parse_log_time(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    for time_format in TIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value, time_format)
+        except ValueError:
+            continue
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    raise ValueError("Invalid time: " + value)
+
+
+def import_log(
+        log_filename: str, config: Config, log_format: str,
+        keep_names: bool = False, session_filename: str = None) -> None:
+    parser = LogParser(config, log_format, keep_names)
+    parser.origin = find_origin(log_filename, parser)
+    if session_filename is None:
+        session_filename = get_session_filename(Session(config), 'yaml')
+    logger.info('Importing %s...', log_filename)
+    writer = SessionWriter(session_filename, config)
+    last, skipped = 0.0, 0
+    try:
+        for operations, chunk_skipped in parse_chunks(log_filename, parser):
+            # Chunks are sorted, the few lines out of order across them
+            # are moved up to the previous operation.
+            for time, type_, params in operations:
+                last = max(time, last)
+                writer.write_operation(last, type_, params)
+            skipped += chunk_skipped
+    finally:
+        writer.close()
+    logger.info(
+        'Saved %s operations to %s, skipped %s lines',
+        writer.count,
+        session_filename,
+        skipped,
+    )
+
+
+def find_origin(filename: str, parser: LogParser) -> float:
+    with open(filename, encoding='utf-8', errors='replace') as f:
+        for line in f:
+            operation = parser.parse_line(line)
+            if operation is not None:
+                return operation[0]
+    raise ValidationError("No requests found in " + filename)
+
+
+def parse_chunks(filename: str, parser: LogParser) \
+        -> Iterable[Tuple[List[ImportedOperation], int]]:
+    tasks = [
+        (filename, parser, start, end)
+        for start, end in get_chunks(filename, CHUNK_SIZE)
+    ]
+    processes = os.cpu_count() or 1
+    if processes == 1 or len(tasks) == 1:
+        yield from map(parse_chunk, tasks)
+        return
+    # Only a few chunks are parsed ahead of the writer, so memory does not
+    # grow with the log when writing falls behind.
+    pending = deque()  # type: Deque[AsyncResult]
+    with multiprocessing.Pool(processes) as pool:
+        for task in tasks:
+            if len(pending) >= processes * CHUNKS_AHEAD:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(parse_chunk, (task,)))
+        while pending:
+            yield pending.popleft().get()
+
+
+def get_chunks(filename: str, size: int) -> List[Chunk]:
+    """Split a file into chunks of about `size` bytes, at line breaks."""
+    total = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        while boundaries[-1] + size < total:
+            f.seek(boundaries[-1] + size)
+            f.readline()
+            boundaries.append(f.tell())
+    if boundaries[-1] < total:
+        boundaries.append(total)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def parse_chunk(task: Tuple[str, LogParser, int, int]) \
+        -> Tuple[List[ImportedOperation], int]:
+    filename, parser, start, end = task
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        lines = f.read(end - start).decode(errors='replace').splitlines()
+    operations = []  # type: List[ImportedOperation]
+    skipped = 0
+    for line in lines:
+        operation = parser.parse_line(line)
+        if operation is None:
+            skipped += 1
+        else:
+            operations.append(operation)
+    operations.sort(key=lambda o: o[0])
+    return operations, skipped
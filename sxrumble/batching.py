@@ -0,0 +1,173 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Uploads to the same directory, through the same endpoint, coalesced into
+# a single `sxcp` per batch. Every upload keeps a future of its own.
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from time import monotonic
+from typing import Any, Callable, Dict, List, Optional, Tuple  # noqa
+
+from sxrumble.config import Options
+from sxrumble.control import Gate
+from sxrumble.operations import Operation, UploadBatch, UploadNewFile
+from sxrumble.phases import (
+    QUEUED, DEQUEUED, PAYLOAD_READY, SPAWNED, EXITED,
+)
+
+
+# (endpoint, volume, directory)
+BatchKey = Tuple[int, str, str]
+Pending = List[Tuple[UploadNewFile, Future]]
+
+
+logger = logging.getLogger(__name__)
+
+
+class UploadBatcher:
+    """Submits operations to an executor, uploads in batches."""
+
+    def __init__(
+            self, executor: Executor, options: Options, gate: Gate,
+            late_threshold: float = None) -> None:
+        self.executor = executor
+        self.options = options
+        self.gate = gate
+        # Batches starting later than this past their linger are reported.
+        self.late_threshold = late_threshold
+        self.lock = threading.Lock()
+        self.batches = {}  # type: Dict[BatchKey, Pending]
+        # When batches are flushed if not full, in the order they started,
+        # as every batch lingers alike. A single thread waits for them.
+        self.deadlines = OrderedDict()  # type: Dict[BatchKey, float]
+        self.wakeup = threading.Condition(self.lock)
+        self.timer = None  # type: Optional[threading.Thread]
+        self.closed = False
+        # Uploads submitted, but not taking a thread of their own: waiting
+        # for their batch, or in a batch after its first upload.
+        self.coalesced = 0
+
+    def submit(
+            self, operation: Operation, fn: Callable,
+            *args: Any) -> Future:
+        """Run `fn(*args)`, or upload `operation` with others."""
+        if self.options.upload_batch < 2 or \
+                not isinstance(operation, UploadNewFile):
+            return self.executor.submit(fn, *args)
+        future = Future()  # type: Future
+        directory, _ = os.path.split(operation.filename)
+        key = (operation.endpoint, operation.volume, directory)
+        with self.lock:
+            self.coalesced += 1
+            pending = self.batches.setdefault(key, [])
+            pending.append((operation, future))
+            if len(pending) >= self.options.upload_batch:
+                self.flush(key)
+            elif len(pending) == 1:
+                self.deadlines[key] = monotonic() + self.options.upload_linger
+                if self.timer is None:
+                    self.timer = threading.Thread(
+                        target=self.linger, name='upload-linger', daemon=True,
+                    )
+                    self.timer.start()
+                self.wakeup.notify()
+        return future
+
+    def linger(self) -> None:
+        with self.lock:
+            while not self.closed:
+                if not self.deadlines:
+                    self.wakeup.wait()
+                    continue
+                key, deadline = next(iter(self.deadlines.items()))
+                delay = deadline - monotonic()
+                if delay > 0:
+                    self.wakeup.wait(delay)
+                else:
+                    self.flush(key)
+
+    def flush(self, key: BatchKey) -> None:
+        pending = self.batches.pop(key)
+        self.deadlines.pop(key, None)
+        self.coalesced -= 1
+        self.executor.submit(self.run, pending)
+
+    def run(self, pending: Pending) -> None:
+        size = len(pending)
+        # Uploads cancelled while waiting are left out.
+        pending = [
+            (o, f) for o, f in pending if f.set_running_or_notify_cancel()
+        ]
+        try:
+            with self.gate:
+                self.check_late([o for o, _ in pending])
+                batch = run_batch([o for o, _ in pending], self.options)
+        except BaseException as e:
+            self.release(size)
+            for _, future in pending:
+                future.set_exception(e)
+            return
+        # Before the results, so that the batch never counts twice.
+        self.release(size)
+        for operation, future in pending:
+            copy_outcome(batch, operation)
+            future.set_result(operation)
+
+    def check_late(self, uploads: List[UploadNewFile]) -> None:
+        if self.late_threshold is None or not uploads:
+            return
+        # The first upload of a batch waited the longest.
+        late = monotonic() - uploads[0].phases.stamps[QUEUED] - \
+            self.options.upload_linger
+        if late > self.late_threshold:
+            logger.warning(
+                'Batch of %d uploads starts %.3fs late', len(uploads), late,
+            )
+
+    def release(self, size: int) -> None:
+        with self.lock:
+            self.coalesced -= size - 1
+
+    def close(self) -> None:
+        """Submit the batches still waiting, before the executor is shut."""
+        with self.lock:
+            for key in list(self.batches):
+                self.flush(key)
+            self.closed = True
+            self.wakeup.notify()
+        if self.timer is not None:
+            self.timer.join()
+
+
+def run_batch(uploads: List[UploadNewFile], options: Options) \
+        -> Optional[UploadBatch]:
+    if not uploads:
+        return None
+    for upload in uploads:
+        upload.phases.mark(DEQUEUED)
+    first = uploads[0]
+    batch = UploadBatch(
+        first.config,
+        volume=first.volume,
+        directory=os.path.dirname(first.filename),
+        files=[
+            (os.path.basename(u.filename), u.size, u.offset) for u in uploads
+        ],
+    )
+    batch.endpoint, batch.sx_url = first.endpoint, first.sx_url
+    batch.run(options)
+    return batch
+
+
+def copy_outcome(batch: UploadBatch, operation: UploadNewFile) -> None:
+    for phase in (PAYLOAD_READY, SPAWNED, EXITED):
+        operation.phases.mark(phase, batch.phases.stamps[phase])
+    operation.duration = batch.duration
+    operation.returncode = batch.returncode
+    operation.error_class = batch.error_class
+    operation.retries = batch.retries
+    operation.bytes = operation.size
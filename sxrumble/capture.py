@@ -0,0 +1,155 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Output of the sx tools, bounded: listings can be huge, so stdout is only
+# counted. The spawn server imports this, so only the standard library.
+
+import os
+import selectors
+import signal
+from subprocess import CompletedProcess
+from time import monotonic, sleep
+from typing import List, Optional, Tuple  # noqa
+
+
+CHUNK_SIZE = 65536
+OUTPUT_LIMIT = 65536
+
+
+class CommandResult(CompletedProcess):
+    """`CompletedProcess` with counters of the whole stdout.
+
+    `stdout` and `stderr` hold at most `OUTPUT_LIMIT` bytes.
+    """
+
+    def __init__(
+            self, args: List[str], returncode: int, stdout: bytes,
+            stderr: bytes, stdout_size: int = 0, stdout_lines: int = 0,
+            timed_out: bool = False) -> None:
+        super().__init__(args, returncode, stdout, stderr)
+        self.stdout_size = stdout_size
+        self.stdout_lines = stdout_lines
+        self.timed_out = timed_out
+
+
+class Output:
+
+    def __init__(self) -> None:
+        self.stdout = bytearray()
+        self.stderr = bytearray()
+        self.stdout_size = 0
+        self.stdout_lines = 0
+        self.timed_out = False
+
+    def add_stdout(self, chunk: bytes) -> None:
+        self.stdout_size += len(chunk)
+        self.stdout_lines += chunk.count(b'\n')
+        self.stdout += chunk
+        # Keep the tail, but trim in bulk rather than on every chunk.
+        if len(self.stdout) > 2 * OUTPUT_LIMIT:
+            del self.stdout[:-OUTPUT_LIMIT]
+
+    def add_stderr(self, chunk: bytes) -> None:
+        free = OUTPUT_LIMIT - len(self.stderr)
+        if free > 0:
+            self.stderr += chunk[:free]
+
+    def get_stdout(self) -> bytes:
+        return bytes(self.stdout[-OUTPUT_LIMIT:])
+
+    def get_stderr(self) -> bytes:
+        return bytes(self.stderr)
+
+
+def communicate(
+        stdin: int, stdout: int, stderr: int, data: bytes,
+        deadline: float = None) -> Output:
+    """Feed `data` to stdin while reading stdout and stderr until EOF.
+
+    Gives up at `deadline`, a `monotonic` time, setting `timed_out`.
+    Closes all the descriptors.
+    """
+    output = Output()
+    readers = {stdout: output.add_stdout, stderr: output.add_stderr}
+    view = memoryview(data)
+    with selectors.DefaultSelector() as selector:
+        if view:
+            os.set_blocking(stdin, False)
+            selector.register(stdin, selectors.EVENT_WRITE)
+        else:
+            os.close(stdin)
+        selector.register(stdout, selectors.EVENT_READ)
+        selector.register(stderr, selectors.EVENT_READ)
+        while selector.get_map():
+            timeout = None  # type: Optional[float]
+            if deadline is not None:
+                timeout = deadline - monotonic()
+                if timeout <= 0:
+                    output.timed_out = True
+                    for key in list(selector.get_map().values()):
+                        selector.unregister(key.fd)
+                        os.close(key.fd)
+                    break
+            for key, _ in selector.select(timeout):
+                fd = key.fd
+                if fd == stdin:
+                    try:
+                        written = os.write(fd, view[:CHUNK_SIZE])
+                    except BrokenPipeError:
+                        written = len(view)
+                    view = view[written:]
+                    if not view:
+                        selector.unregister(fd)
+                        os.close(fd)
+                    continue
+                chunk = os.read(fd, CHUNK_SIZE)
+                if chunk:
+                    readers[fd](chunk)
+                else:
+                    selector.unregister(fd)
+                    os.close(fd)
+    return output
+
+
+def wait(pid: int, deadline: float = None) -> Tuple[int, bool]:
+    """Wait for a process, killing its group once past `deadline`.
+
+    Return the wait status and whether the process was killed.
+    """
+    if deadline is None:
+        return os.waitpid(pid, 0)[1], False
+    delay = 0.0005
+    while True:
+        waited, status = os.waitpid(pid, os.WNOHANG)
+        if waited:
+            return status, False
+        left = deadline - monotonic()
+        if left <= 0:
+            kill_group(pid)
+            return os.waitpid(pid, 0)[1], True
+        sleep(min(delay, left))
+        delay = min(delay * 2, 0.05)
+
+
+def kill_group(pgid: int) -> None:
+    try:
+        os.killpg(pgid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def get_deadline(timeout: Optional[float]) -> Optional[float]:
+    return None if timeout is None else monotonic() + timeout
+
+
+def make_pipes() -> Tuple[Tuple[int, int, int], Tuple[int, int, int]]:
+    """Return the child's and the parent's ends of stdin, stdout, stderr."""
+    stdin_r, stdin_w = os.pipe()
+    stdout_r, stdout_w = os.pipe()
+    stderr_r, stderr_w = os.pipe()
+    return (stdin_r, stdout_w, stderr_w), (stdin_w, stdout_r, stderr_r)
+
+
+def close_all(fds: Tuple[int, ...]) -> None:
+    for fd in fds:
+        os.close(fd)
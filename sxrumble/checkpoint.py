@@ -0,0 +1,96 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Progress of a replay, saved so that it can be resumed without recording
+# an operation twice.
+
+import json
+import os
+from typing import Dict, Optional  # noqa
+
+
+# Seconds between checkpoints.
+CHECKPOINT_INTERVAL = 10.0
+
+
+class Checkpoint:
+
+    def __init__(
+            self, filename: str, results: str, index: int = -1,
+            time: float = 0.0, done: Dict[int, float] = None,
+            results_size: int = 0, window_start: float = 0.0,
+            window_end: float = None) -> None:
+        self.filename = filename
+        self.results = results
+        # Every operation up to `index` has finished, the one at `index`
+        # was due `time` seconds into the session.
+        self.index = index
+        self.time = time
+        # Operations finished out of order past `index`.
+        self.done = done or {}  # type: Dict[int, float]
+        # Whatever the results file has past this is cut off on resume.
+        self.results_size = results_size
+        # A resume keeps to the window of the replay.
+        self.window_start = window_start
+        self.window_end = window_end  # type: Optional[float]
+
+    @classmethod
+    def load(cls, filename: str) -> 'Checkpoint':
+        try:
+            with open(filename) as f:
+                payload = json.load(f)
+        except FileNotFoundError:
+            raise SystemExit("No checkpoint to resume from: " + filename)
+        except ValueError:
+            raise SystemExit("Invalid checkpoint: " + filename)
+        return cls(
+            filename,
+            payload['results'],
+            payload['index'],
+            payload['time'],
+            {index: time for index, time in payload['done']},
+            payload['results_size'],
+            payload.get('window_start', 0.0),
+            payload.get('window_end'),
+        )
+
+    def is_done(self, index: int) -> bool:
+        return index <= self.index or index in self.done
+
+    def complete(self, index: int, time: float) -> None:
+        self.done[index] = time
+        while self.index + 1 in self.done:
+            self.index += 1
+            self.time = self.done.pop(self.index)
+
+    def save(self, results_size: int) -> None:
+        """Write the checkpoint, atomically replacing the previous one.
+
+        The results file must have been flushed up to `results_size`.
+        """
+        self.results_size = results_size
+        payload = {
+            'results': self.results,
+            'index': self.index,
+            'time': self.time,
+            'done': sorted(self.done.items()),
+            'results_size': results_size,
+            'window_start': self.window_start,
+            'window_end': self.window_end,
+        }
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(payload, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.filename)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.filename)
+        except FileNotFoundError:
+            pass
+
+
+def get_checkpoint_filename(session_filename: str) -> str:
+    return session_filename + '.checkpoint'
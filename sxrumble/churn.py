@@ -0,0 +1,67 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Volumes, users and grants created by the control-plane operations of a
+# run, under names of its own, and removed at its end.
+
+import random
+import threading
+from typing import Any, Dict, List, Optional  # noqa
+
+
+KINDS = ('volumes', 'users', 'grants')
+NAME_PREFIX = 'sxrumble-churn-'
+
+
+class ChurnState:
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        # Grants are (user, volume) pairs.
+        self.objects = {kind: [] for kind in KINDS}  # type: Dict[str, List]
+
+    def __getstate__(self) -> dict:
+        # Configs are sent to worker processes, locks cannot be.
+        return {'objects': self.objects}
+
+    def __setstate__(self, state: dict) -> None:
+        self.lock = threading.Lock()
+        self.objects = state['objects']
+
+    def add(self, kind: str, item: Any) -> None:
+        with self.lock:
+            if item not in self.objects[kind]:
+                self.objects[kind].append(item)
+
+    def discard(self, kind: str, item: Any) -> None:
+        with self.lock:
+            if item in self.objects[kind]:
+                self.objects[kind].remove(item)
+
+    def pick(self, kind: str) -> Optional[Any]:
+        """Return an object at random, if there is one."""
+        with self.lock:
+            items = self.objects[kind]
+            return random.choice(items) if items else None
+
+    def take(self, kind: str) -> Optional[Any]:
+        """Remove an object at random and return it, if there is one."""
+        with self.lock:
+            items = self.objects[kind]
+            if not items:
+                return None
+            i = random.randrange(len(items))
+            # Swapped with the last one, the order does not matter.
+            items[i], items[-1] = items[-1], items[i]
+            return items.pop()
+
+    def discard_grants(self, user: str) -> None:
+        """Forget the grants of a deleted user."""
+        with self.lock:
+            self.objects['grants'] = [
+                g for g in self.objects['grants'] if g[0] != user
+            ]
+
+
+def new_name() -> str:
+    return NAME_PREFIX + '{:012x}'.format(random.getrandbits(48))
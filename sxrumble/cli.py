@@ -9,10 +9,15 @@ from docopt import docopt
 
 from sxrumble import get_name_and_version
 from sxrumble import runner
-from sxrumble.config import Session
+from sxrumble.accesslog import import_log
+from sxrumble.compare import compare_files
+from sxrumble.config import Config, Session, Options
+from sxrumble.control import send_command
 from sxrumble.exceptions import ValidationError
 from sxrumble.logs import configure_logging
 from sxrumble.parsers import parse_args
+from sxrumble.partition import split_session, merge_sessions
+from sxrumble.synthesize import synthesize_session
 
 
 logger = logging.getLogger(__name__)
@@ -20,12 +25,58 @@ logger = logging.getLogger(__name__)
 
 __doc__ = """
 Usage:
-  sxrumble record SX_URL VOLUMES... [--] [options] [-c | -C]
-  sxrumble replay SESSION_FILE [-c | -C]
+  sxrumble record SX_URL VOLUMES... [--] [options] [--trace FILE]
+                  [--no-spawn-server] [--log-rate NUM] [--log-json FILE]
+                  [--timeout SPEC] [--retries NUM] [--retry-backoff SECONDS]
+                  [--endpoint-policy POLICY] [--namespace SPEC]
+                  [--manifest FILE] [--upload-batch NUM]
+                  [--upload-linger SECONDS]
+                  [--rate OPS | --slo SPEC | --users NUM]
+                  [--user-model FILE] [--mix SPEC]
+                  [--dashboard] [--metrics-address ADDRESS]
+                  [--metrics-file FILE] [--metrics-interval SECONDS]
+                  [--control-socket SOCKET] [--host-interval SECONDS]
+                  [--warm-up TIME] [--cool-down TIME] [--steady-state]
+                  [-c | -C]
+  sxrumble replay SESSION_FILE [--trace FILE] [--no-spawn-server]
+                  [--log-rate NUM] [--log-json FILE] [--timeout SPEC]
+                  [--retries NUM] [--retry-backoff SECONDS] [--resume]
+                  [--from TIME] [--to TIME] [--manifest FILE]
+                  [--upload-batch NUM] [--upload-linger SECONDS]
+                  [--dashboard] [--metrics-address ADDRESS]
+                  [--metrics-file FILE] [--metrics-interval SECONDS]
+                  [--control-socket SOCKET] [--host-interval SECONDS]
+                  [--warm-up TIME] [--cool-down TIME] [--steady-state]
+                  [-c | -C]
+  sxrumble populate SX_URL VOLUMES... --count NUM [--] [options]
+                    [--batch NUM] [--manifest FILE] [--resume]
+                    [--no-spawn-server] [--log-rate NUM] [--log-json FILE]
+                    [--timeout SPEC] [--retries NUM] [--retry-backoff SECONDS]
+                    [--endpoint-policy POLICY] [--namespace SPEC] [-c | -C]
+  sxrumble synthesize MODEL_FILE [--output FILE] [-c | -C]
+  sxrumble import LOG_FILE SX_URL VOLUMES... [--] [options]
+                  [--output FILE] [--format FORMAT] [--keep-names] [-c | -C]
+  sxrumble split SESSION_FILE [--shards NUM] [--by KEY] [-c | -C]
+  sxrumble merge SESSION_FILES... [--output FILE] [-c | -C]
+  sxrumble compare RESULTS_A RESULTS_B [--p99-threshold PCT]
+                   [--throughput-threshold PCT] [--alpha P]
+                   [--warm-up TIME] [--cool-down TIME] [--steady-state]
+                   [-c | -C]
+  sxrumble control SOCKET COMMAND... [-c | -C]
   sxrumble (-h | --help)
   sxrumble (-v | --version)
 
-Generate activity on cluster SX_URL in VOLUMES.
+Generate activity on cluster SX_URL in VOLUMES, or populate VOLUMES with
+files to run against, or import the access log LOG_FILE of a cluster as a
+session to replay against SX_URL. SX_URL can be several URLs
+separated by commas, such as nodes or users of a cluster, each optionally
+followed by `=WEIGHT`, as in `sx://a@node1=2,sx://b@node2`. Synthesize a
+session from the workload model in MODEL_FILE without running it. Split a
+session into shards which can be replayed in parallel, or merge sessions into
+one. Compare results of two runs and exit with an error if RESULTS_B regressed
+against RESULTS_A. Send COMMAND to a record or replay listening on SOCKET:
+`threads NUM`, `rate OPS`, `weights TYPE=WEIGHT,...`, `speed FACTOR`,
+`pause`, `resume`, `status` or `snapshot`.
 
 Options:
   -h, --help                Show help
@@ -40,6 +91,120 @@ Options:
   --entropy-seed SEED       Seed for the entropy file. This should be a
                             12-character hexadecimal string. If not specified,
                             a random seed will be used.
+  --trace FILE              Save timings of the harness phases of every
+                            operation as a Chrome trace (chrome://tracing)
+  -o, --output FILE         Session file to create. Named after the current
+                            date, if not specified.
+  --shards NUM              Number of shards to split a session into
+                            [default: 2]
+  --format FORMAT           Line format of the access log, `combined` or a
+                            regular expression with the groups `time`,
+                            `method`, `path` and optionally `bytes`
+                            [default: combined]
+  --keep-names              Keep the names of files in the access log
+                            instead of anonymizing them
+  --by KEY                  Split by `round-robin`, `volume`, `type` or
+                            `time` [default: round-robin]
+  --no-spawn-server         Launch the sx tools directly from worker threads
+                            instead of through a spawn server process
+  --log-rate NUM            Maximum number of debug messages, such as finished
+                            operations, logged per second. 0 for no limit.
+                            [default: 100]
+  --log-json FILE           Also write the log to FILE as JSON lines
+  --timeout SPEC            Seconds after which an operation is killed, such
+                            as `60` for all types or `30,UploadNewFile=120`
+                            for a different timeout of uploads. No timeout,
+                            if not specified.
+  --retries NUM             Number of times operations failing with a timeout,
+                            network or server error are retried [default: 0]
+  --retry-backoff SECONDS   Base of the random exponential delay between
+                            retries [default: 1]
+  --resume                  Continue an interrupted replay from its last
+                            checkpoint, appending to its results and keeping
+                            the files uploaded so far, or an interrupted
+                            populate from the manifest given with --manifest
+  --from TIME               Replay only the operations due at or after TIME
+                            into the session, such as `90`, `30m` or `1h`
+  --to TIME                 Replay only the operations due before TIME
+  --endpoint-policy POLICY  Spread operations over the URLs of SX_URL by
+                            `round-robin`, `weighted` at random, or `sticky`
+                            to send each volume to one URL
+                            [default: round-robin]
+  --namespace SPEC          Shape of the directory trees files are uploaded
+                            to, such as `depth=3,fanout=4:16:64`: the number
+                            of directory levels, the directories per level
+                            (the last one applies to deeper levels),
+                            `name-length=12-64` for random file names of 12
+                            to 64 characters, `prefix=NAME` shared by every
+                            file name, and `recursive=0.1` for the share of
+                            recursive listings. Files are uploaded to the
+                            root of the volumes, if not specified.
+  --count NUM               Number of files to populate the volumes with
+  --batch NUM               Number of files uploaded by a single `sxcp`
+                            [default: 100]
+  --manifest FILE           Manifest of the uploaded files. Written by
+                            populate, named after the current date if not
+                            specified. Record and replay keep the files of
+                            the manifest instead of emptying the volumes.
+  --upload-batch NUM        Upload up to NUM new files to the same directory
+                            with a single `sxcp`. Each file is still counted
+                            as an operation of its own. [default: 1]
+  --upload-linger SECONDS   Longest wait for a batch of uploads to fill up
+                            [default: 0.01]
+  --rate OPS                Start operations at random, OPS per second on
+                            average, instead of whenever a thread is free.
+                            Response times then include the time spent
+                            waiting for a thread.
+  --slo SPEC                Adapt the number of operations in flight, up to
+                            the number of threads, to the highest one within
+                            a latency target, such as `p99=0.5` for the 99th
+                            percentile of service times, in seconds, and
+                            `errors=1` for the percentage of failed
+                            operations [default errors: 1]
+  --users NUM               Run NUM virtual users instead, each going from
+                            operation to operation of a user model with
+                            think times in between, on its own volume and
+                            endpoint
+  --user-model FILE         YAML state machine of virtual users, instead of
+                            listing, reading and uploading files with
+                            pauses
+  --mix SPEC                Relative weights of operation types, such as
+                            `UploadNewFile=4,ListFiles=1`. Control-plane
+                            churn, CreateVolume, DeleteVolume, CreateUser,
+                            DeleteUser, GrantAcl and RevokeAcl, only runs
+                            if listed. Every other type alike, if not given.
+  --dashboard               Show live throughput, latencies and errors of
+                            the last seconds, and the progress of replays,
+                            instead of logging every operation
+  --metrics-address ADDRESS
+                            Serve the metrics of the run to Prometheus at
+                            http://ADDRESS/metrics, such as `:9464` on every
+                            interface or `127.0.0.1:9464`
+  --metrics-file FILE       Periodically write the metrics of the run to
+                            FILE, for the textfile collector of the node
+                            exporter
+  --metrics-interval SECONDS
+                            Seconds between writes of the metrics file
+                            [default: 15]
+  --control-socket SOCKET   Listen on the Unix socket SOCKET for commands
+                            changing the load while running, see `control`
+  --host-interval SECONDS   Seconds between samples of the CPU, memory, open
+                            files and network of the load generator host,
+                            saved next to the results and warned about when
+                            saturated. 0 to not sample. [default: 1]
+  --warm-up TIME            Leave the first TIME of the run, such as `30` or
+                            `5m`, out of its report and comparisons
+  --cool-down TIME          Leave the last TIME of the run out of its report
+                            and comparisons
+  --steady-state            Also leave out the start and the end of the run
+                            until its throughput and latency are steady
+  --p99-threshold PCT       Allowed increase of p99 latency of any operation
+                            type, in percent [default: 10]
+  --throughput-threshold PCT
+                            Allowed decrease of throughput, in percent
+                            [default: 10]
+  --alpha P                 Significance level of the latency test
+                            [default: 0.01]
 """
 
 
@@ -54,11 +219,18 @@ def main(argv: list) -> None:
         raw_args['color'],
         raw_args['no_color'],
     )
-    configure_logging(use_colors=use_colors)
 
     try:
         args = parse_args(raw_args)
-        handle_cli(args)
+        listener = configure_logging(
+            use_colors=use_colors,
+            debug_rate=args['log_rate'],
+            json_file=args['log_json'],
+        )
+        try:
+            handle_cli(args)
+        finally:
+            listener.stop()
     except ValidationError as e:
         message = "sxrumble: " + str(e)
         raise SystemExit(message)
@@ -75,6 +247,20 @@ def handle_cli(args: dict) -> None:
         return handle_record_command(args)
     if args['replay'] is True:
         return handle_replay_command(args)
+    if args['populate'] is True:
+        return handle_populate_command(args)
+    if args['synthesize'] is True:
+        return handle_synthesize_command(args)
+    if args['import'] is True:
+        return handle_import_command(args)
+    if args['split'] is True:
+        return handle_split_command(args)
+    if args['merge'] is True:
+        return handle_merge_command(args)
+    if args['compare'] is True:
+        return handle_compare_command(args)
+    if args['control'] is True:
+        return handle_control_command(args)
     raise NotImplementedError()
 
 
@@ -84,10 +270,57 @@ def handle_record_command(args: dict) -> None:
 
 
 def handle_replay_command(args: dict) -> None:
-    session = Session.from_file(args['session_file'])
+    session = Session.for_replay(args['session_file'], Options(**args))
     runner.replay_session(session)
 
 
+def handle_populate_command(args: dict) -> None:
+    session = Session.from_cli(args)
+    runner.populate_session(session)
+
+
+def handle_synthesize_command(args: dict) -> None:
+    synthesize_session(args['model_file'], args['output'])
+
+
+def handle_import_command(args: dict) -> None:
+    import_log(
+        args['log_file'],
+        Config(**args),
+        args['format'],
+        args['keep_names'],
+        args['output'],
+    )
+
+
+def handle_split_command(args: dict) -> None:
+    split_session(args['session_file'], args['shards'], args['by'])
+
+
+def handle_merge_command(args: dict) -> None:
+    merge_sessions(args['session_files'], args['output'])
+
+
+def handle_compare_command(args: dict) -> None:
+    compare_files(
+        args['results_a'],
+        args['results_b'],
+        p99_threshold=args['p99_threshold'],
+        throughput_threshold=args['throughput_threshold'],
+        alpha=args['alpha'],
+        warm_up=args['warm_up'] or 0.0,
+        cool_down=args['cool_down'] or 0.0,
+        steady_state=args['steady_state'],
+    )
+
+
+def handle_control_command(args: dict) -> None:
+    reply = send_command(args['socket'], ' '.join(args['command']))
+    print(reply)
+    if reply.startswith('error'):
+        raise SystemExit(1)
+
+
 def parse_argv(argv: list) -> dict:
     parsed_args = docopt(
         __doc__,
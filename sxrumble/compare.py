@@ -0,0 +1,118 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import logging
+from typing import List
+
+from sxrumble.results import Results, load_results
+from sxrumble.stats import percentile, mann_whitney_u
+from sxrumble.steady import find_window
+
+
+logger = logging.getLogger(__name__)
+
+
+class OperationComparison:
+    """Latency of one operation type in two runs."""
+
+    def __init__(self, name: str, a: List[float], b: List[float]) -> None:
+        self.name = name
+        a, b = sorted(a), sorted(b)
+        self.count_a, self.count_b = len(a), len(b)
+        self.p50_a, self.p50_b = percentile(a, 50), percentile(b, 50)
+        self.p99_a, self.p99_b = percentile(a, 99), percentile(b, 99)
+        self.p_value = mann_whitney_u(a, b)
+
+    @property
+    def p99_change(self) -> float:
+        return relative_change(self.p99_a, self.p99_b)
+
+
+def compare_files(
+        filename_a: str, filename_b: str, *, p99_threshold: float,
+        throughput_threshold: float, alpha: float, warm_up: float = 0.0,
+        cool_down: float = 0.0, steady_state: bool = False) -> None:
+    logger.info('Loading %s and %s...', filename_a, filename_b)
+    a = load_results(filename_a)
+    b = load_results(filename_b)
+    if warm_up or cool_down or steady_state:
+        a = select_window(a, filename_a, warm_up, cool_down, steady_state)
+        b = select_window(b, filename_b, warm_up, cool_down, steady_state)
+    regressions = compare(
+        a, b,
+        p99_threshold=p99_threshold,
+        throughput_threshold=throughput_threshold,
+        alpha=alpha,
+    )
+    if regressions:
+        raise SystemExit(
+            "sxrumble: Performance regressed:\n" + '\n'.join(regressions),
+        )
+    logger.info('No regressions found')
+
+
+def select_window(
+        results: Results, filename: str, warm_up: float, cool_down: float,
+        steady_state: bool) -> Results:
+    window = find_window(results, warm_up, cool_down, steady_state)
+    if window is None:
+        raise SystemExit(
+            "Nothing is left of {} past its warm-up and cool-down".format(
+                filename,
+            ),
+        )
+    logger.info(
+        'Comparing %s from %.0fs to %.0fs, %s',
+        filename, window.start, window.end, window.description,
+    )
+    return results.window(window.start, window.end)
+
+
+def compare(
+        a: Results, b: Results, *, p99_threshold: float,
+        throughput_threshold: float, alpha: float) -> List[str]:
+    """Log the differences between two runs and return the regressions."""
+    regressions = []  # type: List[str]
+
+    durations_a = a.durations_by_type()
+    durations_b = b.durations_by_type()
+    for name in sorted(set(durations_a) & set(durations_b)):
+        comparison = OperationComparison(
+            name, durations_a[name], durations_b[name],
+        )
+        log_comparison(comparison)
+        if comparison.p99_change > p99_threshold \
+                and comparison.p_value < alpha:
+            regressions.append(
+                "{} p99 latency is {:+.1f}% (p-value {:.2g})".format(
+                    name, comparison.p99_change, comparison.p_value,
+                ),
+            )
+
+    throughput_a, throughput_b = a.throughput(), b.throughput()
+    throughput_change = relative_change(throughput_a, throughput_b)
+    logger.info(
+        'Throughput: %.2f -> %.2f ops/s (%+.1f%%)',
+        throughput_a, throughput_b, throughput_change,
+    )
+    if -throughput_change > throughput_threshold:
+        regressions.append(
+            "Throughput is {:+.1f}%".format(throughput_change),
+        )
+    return regressions
+
+
+def log_comparison(c: OperationComparison) -> None:
+    logger.info(
+        '%s: %d -> %d ops, p50 %.3fs -> %.3fs, p99 %.3fs -> %.3fs '
+        '(%+.1f%%), p-value %.2g',
+        c.name, c.count_a, c.count_b, c.p50_a, c.p50_b, c.p99_a, c.p99_b,
+        c.p99_change, c.p_value,
+    )
+
+
+def relative_change(before: float, after: float) -> float:
+    """Return the change in percent."""
+    if before == 0:
+        return 0.0
+    return (after - before) / before * 100
@@ -0,0 +1,83 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Operations in flight adapted to a latency target, as in TCP: slow start
+# up to the first window missing the SLO, then additive increase and
+# multiplicative decrease.
+
+import logging
+from array import array
+from time import monotonic
+from typing import List, Tuple  # noqa
+
+from sxrumble.operations import Operation
+from sxrumble.stats import percentile
+
+
+# Shortest window, in seconds, and fewest operations in a window.
+CONTROL_INTERVAL = 1.0
+MIN_SAMPLES = 20
+DECREASE = 0.75
+
+logger = logging.getLogger(__name__)
+
+
+class ConcurrencyController:
+
+    def __init__(self, maximum: int, slo: dict, start_time: float) -> None:
+        self.maximum = maximum
+        self.slo = slo
+        self.limit = 1
+        self.slow_start = True
+        # Highest concurrency of a window within the SLO.
+        self.best = 0
+        self.start_time = self.window_start = start_time
+        self.durations = array('d')
+        self.failed = 0
+        # (seconds into the run, concurrency, latency, percentage of errors)
+        self.trajectory = []  # type: List[Tuple[float, int, float, float]]
+
+    def add(self, operation: Operation) -> None:
+        if operation.error_class != 'ok':
+            self.failed += 1
+            return
+        self.durations.append(operation.duration)
+
+    def update(self, now: float = None) -> None:
+        """Adjust the concurrency, once a window is complete."""
+        now = monotonic() if now is None else now
+        count = len(self.durations) + self.failed
+        if now - self.window_start < CONTROL_INTERVAL or count < MIN_SAMPLES:
+            return
+        latency = percentile(sorted(self.durations), self.slo['percentile']) \
+            if self.durations else 0.0
+        errors = 100.0 * self.failed / count
+        previous = self.limit
+        if latency <= self.slo['latency'] and errors <= self.slo['errors']:
+            self.best = max(self.best, previous)
+            grown = previous * 2 if self.slow_start else previous + 1
+            self.limit = min(grown, self.maximum)
+        else:
+            self.slow_start = False
+            self.limit = max(int(previous * DECREASE), 1)
+        self.trajectory.append(
+            (now - self.start_time, previous, latency, errors),
+        )
+        logger.info(
+            'Concurrency %d -> %d: p%g=%.3fs, %.1f%% errors',
+            previous, self.limit, self.slo['percentile'], latency, errors,
+        )
+        self.window_start = now
+        self.durations = array('d')
+        self.failed = 0
+
+    def log(self) -> None:
+        if not self.trajectory:
+            return
+        if not self.best:
+            logger.warning('No concurrency met the SLO')
+            return
+        logger.info(
+            'Highest concurrency within the SLO: %d of %d threads',
+            self.best, self.maximum,
+        )
@@ -3,36 +3,50 @@
 
 import os.path
 from time import localtime, strftime
-from typing import Any
+from typing import Any, Optional
 
 import yaml
 
+from sxrumble.churn import ChurnState
+from sxrumble.namespace import Namespace
+
 
 ENTROPY_FILE_PATH = os.path.expanduser('~/.sxrumble-entropy')
 ENTROPY_SEED_LENGTH = 12
 ENTROPY_SEED_CHARACTERS = '0123456789abcdef'
 
+# Key of the timeout of operation types without a timeout of their own.
+DEFAULT_TIMEOUT_KEY = '*'
+
+# How operations are spread over the endpoints of a run.
+ENDPOINT_POLICIES = ('round-robin', 'weighted', 'sticky')
+
 
 CONFIG_FIELDS = (
     'sx_url', 'volumes', 'threads', 'min_size', 'max_size', 'entropy_size',
-    'entropy_seed',
+    'entropy_seed', 'endpoints', 'endpoint_policy', 'namespace',
 )
 
 
 class Session:
 
-    def __init__(self, config: 'Config', operations: list = None) -> None:
+    def __init__(
+            self, config: 'Config', operations: list = None,
+            options: 'Options' = None) -> None:
         self._creation_time = localtime()
+        self.filename = None  # type: Optional[str]
         self.config = config
         self.operations = operations
+        self.options = options or Options()
 
     @classmethod
     def from_cli(cls, args: dict) -> 'Session':
         config = Config(**args)
-        return cls(config, None)
+        return cls(config, None, Options(**args))
 
     @classmethod
-    def from_file(cls, filename: str) -> 'Session':
+    def from_file(cls, filename: str, options: 'Options' = None) \
+            -> 'Session':
         with open(filename) as f:
             payload = yaml.safe_load(f)
 
@@ -40,7 +54,21 @@ class Session:
         # Replay session needs more threads than record session to be accurate.
         config.threads *= 2
         operations = payload['operations']
-        return cls(config, operations)
+        session = cls(config, operations, options)
+        session.filename = filename
+        return session
+
+    @classmethod
+    def for_replay(cls, filename: str, options: 'Options' = None) \
+            -> 'Session':
+        """Read only the config, the operations are streamed by replay."""
+        from sxrumble.sessions import SessionReader
+        with SessionReader(filename) as reader:
+            config = reader.config
+        config.threads *= 2
+        session = cls(config, None, options)
+        session.filename = filename
+        return session
 
     def serialize(self) -> dict:
         return {
@@ -66,16 +94,77 @@ class Config:
         self.max_size = kwargs['max_size']
         self.entropy_size = kwargs['entropy_size']
         self.entropy_seed = kwargs['entropy_seed']
+        self.endpoints = kwargs['endpoints']
+        self.endpoint_policy = kwargs['endpoint_policy']
+        self.namespace = kwargs['namespace']
+        # Directories populated by this run, not saved.
+        self.tree = Namespace(**self.namespace)
+        # Objects created by control-plane operations of this run.
+        self.churn = ChurnState()
 
     def serialize(self) -> dict:
         return {name: getattr(self, name) for name in CONFIG_FIELDS}
 
 
-def save_session_to_file(session: Session) -> str:
-    payload = session.serialize()
-    filename = 'sxrumble-{}.yaml'.format(
+class Options:
+    """Settings of a single run, which are not saved in the session file."""
+
+    def __init__(self, **kwargs: Any) -> None:
+        from sxrumble.validators import validate_options
+        kwargs = validate_options(kwargs)
+        self.trace_file = kwargs['trace_file']
+        self.spawn_server = kwargs['spawn_server']
+        self.timeouts = kwargs['timeouts']
+        self.retries = kwargs['retries']
+        self.retry_backoff = kwargs['retry_backoff']
+        self.resume = kwargs['resume']
+        self.window_start = kwargs['window_start']
+        self.window_end = kwargs['window_end']
+        self.manifest = kwargs['manifest']
+        self.populate_count = kwargs['populate_count']
+        self.batch_size = kwargs['batch_size']
+        self.upload_batch = kwargs['upload_batch']
+        self.upload_linger = kwargs['upload_linger']
+        self.rate = kwargs['rate']
+        self.slo = kwargs['slo']
+        self.dashboard = kwargs['dashboard']
+        self.metrics_address = kwargs['metrics_address']
+        self.metrics_file = kwargs['metrics_file']
+        self.metrics_interval = kwargs['metrics_interval']
+        self.control_socket = kwargs['control_socket']
+        self.host_interval = kwargs['host_interval']
+        self.users = kwargs['users']
+        self.user_model = kwargs['user_model']
+        self.mix = kwargs['mix']
+        self.warm_up = kwargs['warm_up']
+        self.cool_down = kwargs['cool_down']
+        self.steady_state = kwargs['steady_state']
+
+    def get_timeout(self, operation_name: str) -> Optional[float]:
+        return self.timeouts.get(
+            operation_name,
+            self.timeouts.get(DEFAULT_TIMEOUT_KEY),
+        )
+
+
+def get_session_filename(session: Session, extension: str) -> str:
+    return 'sxrumble-{}.{}'.format(
         strftime('%Y-%m-%d-%H:%M:%S', session._creation_time),
+        extension,
     )
-    with open(filename, 'w') as f:
-        yaml.safe_dump(payload, f, default_flow_style=False)
+
+
+def save_session_to_file(session: Session) -> str:
+    from sxrumble.sessions import SessionWriter
+    filename = get_session_filename(session, 'yaml')
+    writer = SessionWriter(filename, session.config)
+    try:
+        for operation in session.operations or []:
+            writer.write_operation(
+                operation['time'],
+                operation['type'],
+                operation['params'],
+            )
+    finally:
+        writer.close()
     return filename
@@ -0,0 +1,274 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Commands changing the load of a running session, one per line on a Unix
+# socket. The control thread only sets attributes of `Controls` and the
+# gate, which the dispatch loops and the workers read.
+
+import logging
+import os
+import socket
+import threading
+from itertools import accumulate
+from socketserver import StreamRequestHandler, ThreadingMixIn, UnixStreamServer
+from typing import Any, List, Optional  # noqa
+
+from sxrumble.config import Session
+from sxrumble.dashboard import render
+from sxrumble.exceptions import ValidationError
+from sxrumble.metrics import Metrics, TYPE_NAMES
+from sxrumble.parsers import parse_count
+
+
+# Most threads of a controlled run, which are started as needed.
+MAX_THREADS = 256
+# Seconds between checks of the controls by waiting dispatch loops.
+POLL_INTERVAL = 0.1
+
+logger = logging.getLogger(__name__)
+
+
+class Gate:
+    """Lets at most `limit` threads in at once, the limit may change."""
+
+    def __init__(self, limit: int) -> None:
+        self.condition = threading.Condition()
+        self.limit = limit
+        self.inside = 0
+
+    def set_limit(self, limit: int) -> None:
+        with self.condition:
+            self.limit = limit
+            self.condition.notify_all()
+
+    def __enter__(self) -> None:
+        with self.condition:
+            while self.inside >= self.limit:
+                self.condition.wait()
+            self.inside += 1
+
+    def __exit__(self, *args: Any) -> None:
+        with self.condition:
+            self.inside -= 1
+            self.condition.notify()
+
+
+class Controls:
+    """Settings of a run which can change while it runs."""
+
+    def __init__(
+            self, threads: int, max_threads: int = None,
+            rate: float = None, replay: bool = False) -> None:
+        self.max_threads = max_threads or threads
+        self.gate = Gate(threads)
+        self.rate = rate
+        self.replay = replay
+        self.speed = 1.0
+        self.paused = False
+        # Cumulative, in the order of `ALL_OPERATIONS`, see `pick_operation`.
+        self.weights = None  # type: Optional[List[float]]
+
+    @classmethod
+    def for_session(cls, session: Session, replay: bool = False) \
+            -> 'Controls':
+        threads = session.config.threads
+        max_threads = None
+        if session.options.control_socket is not None:
+            max_threads = max(threads, MAX_THREADS)
+        controls = cls(
+            threads, max_threads, rate=session.options.rate, replay=replay,
+        )
+        if not replay:
+            controls.weights = session.options.mix
+        return controls
+
+    @property
+    def threads(self) -> int:
+        return self.gate.limit
+
+    def execute(self, command: str) -> str:
+        """Apply a command, return the reply."""
+        name, _, value = command.strip().partition(' ')
+        value = value.strip()
+        if name == 'threads':
+            threads = parse_count(value)
+            if not 1 <= threads <= self.max_threads:
+                raise ValidationError(
+                    "Threads must be between 1 and {}".format(
+                        self.max_threads,
+                    ),
+                )
+            self.gate.set_limit(threads)
+        elif name == 'rate':
+            if self.rate is None:
+                raise ValidationError("Not running at a fixed rate")
+            self.rate = parse_positive(value, 'rate')
+        elif name == 'weights':
+            if self.replay:
+                raise ValidationError("A replay runs the operations saved")
+            self.weights = parse_weights(value)
+        elif name == 'speed':
+            if not self.replay:
+                raise ValidationError("Only replays have a speed")
+            self.speed = parse_positive(value, 'speed')
+        elif name in ('pause', 'resume'):
+            self.paused = name == 'pause'
+        elif name != 'status':
+            raise ValidationError("Unknown command: " + name)
+        if name != 'status':
+            logger.info('Control: %s', command.strip())
+        return 'ok ' + self.format_status()
+
+    def format_status(self) -> str:
+        status = ['threads={}'.format(self.threads)]
+        if self.rate is not None:
+            status.append('rate={:g}'.format(self.rate))
+        if self.replay:
+            status.append('speed={:g}'.format(self.speed))
+        elif self.weights is not None:
+            weights = [self.weights[0]] + [
+                b - a for a, b in zip(self.weights, self.weights[1:])
+            ]
+            status.append('weights={}'.format(','.join(
+                '{}={:g}'.format(name, weight)
+                for name, weight in zip(TYPE_NAMES, weights) if weight
+            )))
+        if self.paused:
+            status.append('paused')
+        return ' '.join(status)
+
+
+def parse_positive(value: str, name: str) -> float:
+    try:
+        number = float(value)
+    except ValueError:
+        raise ValidationError("Invalid {}: {}".format(name, value))
+    if number <= 0:
+        raise ValidationError("{} must be greater than 0".format(
+            name.capitalize(),
+        ))
+    return number
+
+
+def parse_weights(spec: str) -> Optional[List[float]]:
+    """Parse weights such as `UploadNewFile=3,ListFiles=1`, cumulatively.
+
+    Types which are not listed are not picked, no weights at all means the
+    default types alike.
+    """
+    if not spec:
+        return None
+    weights = {}
+    for item in spec.split(','):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in TYPE_NAMES:
+            raise ValidationError("Unknown operation: " + name)
+        try:
+            weights[name] = float(weight or 1)
+        except ValueError:
+            raise ValidationError("Invalid weight: " + weight)
+    if any(w < 0 for w in weights.values()) or not sum(weights.values()):
+        raise ValidationError("Weights must not be negative, nor all 0")
+    return list(accumulate(weights.get(name, 0.0) for name in TYPE_NAMES))
+
+
+class ControlUnixServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: str, controls: Controls, metrics: Metrics) \
+            -> None:
+        super().__init__(path, ControlHandler)
+        self.controls = controls
+        self.metrics = metrics
+
+    def execute(self, command: str) -> str:
+        if command.strip() == 'snapshot':
+            return 'ok\n' + '\n'.join(render(self.metrics.snapshot()))
+        try:
+            return self.controls.execute(command)
+        except ValidationError as e:
+            return 'error ' + str(e)
+
+
+class ControlHandler(StreamRequestHandler):
+
+    def handle(self) -> None:
+        for line in self.rfile:
+            command = line.decode(errors='replace').strip()
+            if command:
+                reply = self.server.execute(command)  # type: ignore
+                self.wfile.write(reply.encode() + b'\n')
+
+
+class ControlServer:
+    """Takes commands on a Unix socket, in a thread of its own."""
+
+    def __init__(self, path: str, controls: Controls, metrics: Metrics) \
+            -> None:
+        self.path = path
+        remove_stale_socket(path)
+        try:
+            self.server = ControlUnixServer(path, controls, metrics)
+        except OSError as e:
+            raise SystemExit("Cannot listen on {}: {}".format(
+                path, e.strerror,
+            ))
+        self.thread = threading.Thread(
+            target=self.server.serve_forever, name='control', daemon=True,
+        )
+
+    def start(self) -> None:
+        logger.info('Listening for commands on %s', self.path)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+        os.remove(self.path)
+
+
+def remove_stale_socket(path: str) -> None:
+    """Remove the socket of a run which is gone, refuse a live one."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+        return
+    finally:
+        probe.close()
+    raise SystemExit("{} is used by another run".format(path))
+
+
+def start_control(
+        session: Session, controls: Controls, metrics: Metrics) \
+        -> Optional[ControlServer]:
+    if session.options.control_socket is None:
+        return None
+    server = ControlServer(session.options.control_socket, controls, metrics)
+    server.start()
+    return server
+
+
+def send_command(path: str, command: str) -> str:
+    """Send a command to the socket of a run, return the reply."""
+    client = socket.socket(socket.AF_UNIX)
+    try:
+        client.connect(path)
+    except OSError as e:
+        client.close()
+        raise SystemExit("Cannot connect to {}: {}".format(path, e.strerror))
+    with client:
+        client.sendall(command.encode() + b'\n')
+        client.shutdown(socket.SHUT_WR)
+        reply = b''
+        while True:
+            data = client.recv(4096)
+            if not data:
+                break
+            reply += data
+    return reply.decode().rstrip('\n')
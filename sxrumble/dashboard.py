@@ -0,0 +1,106 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# A live view of a running session, redrawn in place on the terminal.
+
+import logging
+import sys
+import threading
+from typing import List, TextIO  # noqa
+
+import humanfriendly
+
+from sxrumble.logs import console_diversion, console_filter
+from sxrumble.metrics import Metrics, Snapshot
+
+
+# Seconds between redraws.
+REFRESH_INTERVAL = 1.0
+# Moves the cursor up a number of lines and clears the screen below.
+REDRAW = '\033[{}F\033[J'
+
+
+class Dashboard:
+
+    def __init__(self, metrics: Metrics, stream: TextIO = None) -> None:
+        self.metrics = metrics
+        self.stream = stream or sys.stdout
+        self.height = 0
+        self.lines = []  # type: List[str]
+        # Log records are written from the thread of the log listener.
+        self.lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='dashboard', daemon=True,
+        )
+
+    def start(self) -> None:
+        # Only warnings and errors are logged in between the redraws.
+        console_filter.level = logging.WARNING
+        console_diversion.write = self.write_log
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.draw()
+        console_diversion.write = None
+        console_filter.level = logging.NOTSET
+
+    def run(self) -> None:
+        while not self.stopped.wait(REFRESH_INTERVAL):
+            self.draw()
+
+    def draw(self) -> None:
+        lines = render(self.metrics.snapshot())
+        with self.lock:
+            self.clear()
+            self.lines = lines
+            self.write_frame()
+
+    def write_log(self, text: str) -> None:
+        """Write log records above the frame, which is drawn again."""
+        with self.lock:
+            if not self.stream.isatty():
+                self.stream.write(text)
+                self.stream.flush()
+                return
+            self.clear()
+            self.stream.write(text)
+            self.write_frame()
+
+    def clear(self) -> None:
+        if self.height and self.stream.isatty():
+            self.stream.write(REDRAW.format(self.height))
+
+    def write_frame(self) -> None:
+        self.stream.write(''.join(line + '\n' for line in self.lines))
+        self.stream.flush()
+        self.height = len(self.lines)
+
+
+def render(snapshot: Snapshot) -> List[str]:
+    status = [
+        '{:.0f}s'.format(snapshot.elapsed),
+        '{} in flight'.format(snapshot.in_flight),
+        '{:.1f} ops/s'.format(snapshot.rate),
+        '{}/s'.format(humanfriendly.format_size(
+            int(snapshot.bytes_rate), binary=True,
+        )),
+        '{:.1f}% errors'.format(snapshot.errors),
+    ]
+    if snapshot.lag_p99 is not None:
+        status.append('lag p99={:.3f}s'.format(snapshot.lag_p99))
+    if snapshot.progress is not None:
+        status.append('{:.1f}% done'.format(snapshot.progress * 100))
+    lines = [
+        ' | '.join(status),
+        '{:<16}{:>10}{:>10}{:>10}{:>8}'.format(
+            'type', 'ops/s', 'p50', 'p99', 'errors',
+        ),
+    ]
+    for name, summary in snapshot.types.items():
+        lines.append('{:<16}{:>10.1f}{:>9.3f}s{:>9.3f}s{:>7.1f}%'.format(
+            name, summary.rate, summary.p50, summary.p99, summary.errors,
+        ))
+    return lines
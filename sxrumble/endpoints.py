@@ -0,0 +1,41 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Operations spread over the endpoints of a run by the policy of the config.
+
+import random
+import zlib
+from bisect import bisect
+from itertools import accumulate, count
+from typing import List, Optional  # noqa
+
+from sxrumble.config import Config
+from sxrumble.operations import Operation
+
+
+class EndpointSelector:
+
+    def __init__(self, config: Config) -> None:
+        self.urls = [e['url'] for e in config.endpoints]  # type: List[str]
+        self.policy = config.endpoint_policy
+        self.weights = list(accumulate(e['weight'] for e in config.endpoints))
+        self.counter = count()
+
+    def pick(self, volume: Optional[str] = None) -> int:
+        if len(self.urls) == 1:
+            return 0
+        if self.policy == 'weighted':
+            return self.pick_weighted(random.random())
+        if self.policy == 'sticky' and volume is not None:
+            # Not `hash`, which differs between runs.
+            return self.pick_weighted(zlib.crc32(volume.encode()) / 2 ** 32)
+        return next(self.counter) % len(self.urls)
+
+    def pick_weighted(self, point: float) -> int:
+        """Pick the endpoint at `point` of [0, 1) of the total weight."""
+        return bisect(self.weights, point * self.weights[-1])
+
+    def assign(self, operation: Operation) -> None:
+        endpoint = self.pick(getattr(operation, 'volume', None))
+        operation.endpoint = endpoint
+        operation.sx_url = self.urls[endpoint]
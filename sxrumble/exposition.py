@@ -0,0 +1,212 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Metrics of a running session for Prometheus, over HTTP or in a textfile.
+# Both only format the totals of `Metrics`, so workers are never waited for.
+
+import logging
+import os
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from typing import List, Tuple  # noqa
+
+from sxrumble.metrics import (
+    Histogram, Metrics, LATENCY_BUCKETS, TYPE_NAMES,
+)
+from sxrumble.operations import ERROR_CLASSES
+
+
+OPENMETRICS_CONTENT_TYPE = \
+    'application/openmetrics-text; version=1.0.0; charset=utf-8'
+TEXT_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+logger = logging.getLogger(__name__)
+
+
+def format_metrics(metrics: Metrics, openmetrics: bool = True) -> str:
+    lines = []  # type: List[str]
+
+    def add_family(name: str, type_: str, help_: str) -> None:
+        # The Prometheus text format names counters after their samples.
+        if type_ == 'counter' and not openmetrics:
+            name += '_total'
+        lines.append('# HELP {} {}'.format(name, help_))
+        lines.append('# TYPE {} {}'.format(name, type_))
+
+    # Types which did not run yet are left out.
+    types = [
+        (name, totals) for name, totals in zip(TYPE_NAMES, metrics.totals)
+        if any(totals.results)
+    ]
+    add_family('sxrumble_operations', 'counter', 'Finished operations.')
+    for name, totals in types:
+        for result, count in zip(ERROR_CLASSES, totals.results):
+            lines.append(
+                'sxrumble_operations_total{{type="{}",result="{}"}} {}'
+                .format(name, result, count),
+            )
+    add_family(
+        'sxrumble_bytes', 'counter',
+        'Bytes sent and received by finished operations.',
+    )
+    for name, totals in types:
+        lines.append(
+            'sxrumble_bytes_total{{type="{}"}} {}'.format(name, totals.bytes),
+        )
+    add_family(
+        'sxrumble_operation_duration_seconds', 'histogram',
+        'Service time of successful operations.',
+    )
+    for name, totals in types:
+        add_histogram(
+            lines, 'sxrumble_operation_duration_seconds', name,
+            totals.durations,
+        )
+    add_family(
+        'sxrumble_operation_response_seconds', 'histogram',
+        'Time of successful operations from their intended start.',
+    )
+    for name, totals in types:
+        add_histogram(
+            lines, 'sxrumble_operation_response_seconds', name,
+            totals.response_times,
+        )
+    add_family(
+        'sxrumble_in_flight', 'gauge',
+        'Operations dispatched but not finished.',
+    )
+    lines.append('sxrumble_in_flight {}'.format(
+        metrics.dispatched - metrics.finished,
+    ))
+    add_family(
+        'sxrumble_schedule_lag_seconds', 'gauge',
+        'Delay of the start of the last operation past its intended start.',
+    )
+    lines.append('sxrumble_schedule_lag_seconds {:.6f}'.format(metrics.lag))
+    progress = metrics.progress
+    if progress is not None:
+        add_family(
+            'sxrumble_replay_progress_ratio', 'gauge',
+            'Share of the replayed schedule dispatched so far.',
+        )
+        lines.append('sxrumble_replay_progress_ratio {:.6f}'.format(progress))
+    if openmetrics:
+        lines.append('# EOF')
+    return ''.join(line + '\n' for line in lines)
+
+
+def add_histogram(
+        lines: List[str], family: str, name: str,
+        histogram: Histogram) -> None:
+    # Copied first, as the reporting thread keeps counting.
+    counts = list(histogram.counts)
+    total = 0
+    for bound, count in zip(LATENCY_BUCKETS, counts):
+        total += count
+        lines.append('{}_bucket{{type="{}",le="{}"}} {}'.format(
+            family, name, format_bound(bound), total,
+        ))
+    lines.append('{}_count{{type="{}"}} {}'.format(family, name, total))
+    lines.append('{}_sum{{type="{}"}} {:.6f}'.format(
+        family, name, histogram.sum,
+    ))
+
+
+def format_bound(bound: float) -> str:
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+class MetricsHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], metrics: Metrics) -> None:
+        if ':' in address[0]:
+            self.address_family = socket.AF_INET6
+        super().__init__(address, MetricsHandler)
+        self.metrics = metrics
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self) -> None:
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        openmetrics = 'application/openmetrics-text' in \
+            self.headers.get('Accept', '')
+        body = format_metrics(self.server.metrics, openmetrics).encode()
+        self.send_response(200)
+        self.send_header(
+            'Content-Type',
+            OPENMETRICS_CONTENT_TYPE if openmetrics else TEXT_CONTENT_TYPE,
+        )
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        logger.debug('Metrics request: ' + format, *args)
+
+
+class MetricsServer:
+    """Serves the metrics at `/metrics` in a thread of its own."""
+
+    def __init__(self, metrics: Metrics, address: Tuple[str, int]) -> None:
+        try:
+            self.httpd = MetricsHTTPServer(address, metrics)
+        except OSError as e:
+            raise SystemExit("Cannot serve the metrics on {}:{}: {}".format(
+                address[0], address[1], e.strerror,
+            ))
+        self.thread = threading.Thread(
+            target=self.httpd.serve_forever, name='metrics', daemon=True,
+        )
+
+    def start(self) -> None:
+        host, port = self.httpd.server_address[:2]
+        logger.info('Serving the metrics on http://%s:%s/metrics', host, port)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()
+
+
+class TextfileWriter:
+    """Rewrites a file of the metrics every `interval` seconds.
+
+    The file is replaced at once, so the textfile collector of the node
+    exporter never reads half of it.
+    """
+
+    def __init__(self, metrics: Metrics, filename: str, interval: float) \
+            -> None:
+        self.metrics = metrics
+        self.filename = filename
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='metrics-file', daemon=True,
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        # The final totals.
+        self.write()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.write()
+
+    def write(self) -> None:
+        temporary = self.filename + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(format_metrics(self.metrics, openmetrics=False))
+        os.replace(temporary, self.filename)
@@ -0,0 +1,330 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Saturation of the host generating the load, sampled from `/proc`: latencies
+# measured while it is saturated say more about sxrumble than the cluster.
+
+import csv
+import logging
+import os
+import resource
+import threading
+from time import monotonic
+from typing import Dict, List, NamedTuple, Optional, TextIO, Tuple  # noqa
+
+import humanfriendly
+
+from sxrumble.metrics import Metrics
+
+
+# Share of the CPUs of the host, or of a CPU for the harness, which only
+# runs Python code on one at a time.
+CPU_SATURATION = 0.9
+# Per CPU of the host.
+LOAD_SATURATION = 2.0
+MEMORY_SATURATION = 0.05
+FD_SATURATION = 0.9
+# Samples in a row above a threshold, so a spike is not a saturation.
+SUSTAINED = 3
+
+Reading = NamedTuple('Reading', [
+    ('time', float),
+    ('cpu_busy', int),
+    ('cpu_total', int),
+    ('process_cpu', float),
+    ('context_switches', int),
+    ('rx_bytes', int),
+    ('tx_bytes', int),
+])
+
+Sample = NamedTuple('Sample', [
+    # Seconds into the run.
+    ('time', float),
+    ('finished', int),
+    # Shares of the CPUs of the host, and of one CPU.
+    ('cpu', float),
+    ('process_cpu', float),
+    ('load', float),
+    ('memory_available', int),
+    ('memory_total', int),
+    ('fds', int),
+    ('fd_limit', int),
+    # Per second.
+    ('context_switches', float),
+    ('rx_bytes', float),
+    ('tx_bytes', float),
+])
+
+# Name, what it is, whether a sample is saturated.
+CONDITIONS = [
+    (
+        'cpu', 'CPU of the host',
+        lambda s: s.cpu >= CPU_SATURATION,
+    ),
+    (
+        'process_cpu', 'CPU of sxrumble',
+        lambda s: s.process_cpu >= CPU_SATURATION,
+    ),
+    (
+        'load', 'load of the host',
+        lambda s: s.load >= LOAD_SATURATION * (os.cpu_count() or 1),
+    ),
+    (
+        'memory', 'memory of the host',
+        lambda s: s.memory_available < MEMORY_SATURATION * s.memory_total,
+    ),
+    (
+        'fds', 'open files of sxrumble',
+        lambda s: s.fds >= FD_SATURATION * s.fd_limit,
+    ),
+]
+
+
+logger = logging.getLogger(__name__)
+
+
+class HostMonitor:
+    """Samples the host every `interval` seconds in a thread of its own."""
+
+    def __init__(
+            self, metrics: Metrics, start_time: float, interval: float,
+            filename: str, append: bool = False, proc: str = '/proc') \
+            -> None:
+        self.metrics = metrics
+        self.start_time = start_time
+        self.interval = interval
+        self.filename = filename
+        self.proc = proc
+        self.fd_limit = resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+        self.samples = []  # type: List[Sample]
+        # Saturated samples in a row, and the start of the current period.
+        self.streaks = {name: 0 for name, _, _ in CONDITIONS}
+        self.saturated_since = {}  # type: Dict[str, float]
+        # (condition, start, end) in seconds into the run.
+        self.saturations = []  # type: List[Tuple[str, float, float]]
+        self.last = self.read()
+        self.file = open(filename, 'a' if append else 'w', newline='')
+        self.writer = csv.writer(self.file)
+        if not append or not self.file.tell():
+            self.writer.writerow(Sample._fields)
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(
+            target=self.run, name='host-monitor', daemon=True,
+        )
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.thread.join()
+        self.sample()
+        for name, since in sorted(self.saturated_since.items()):
+            self.saturations.append((name, since, self.samples[-1].time))
+        self.saturated_since.clear()
+        self.file.close()
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def read(self) -> Reading:
+        busy, total, context_switches = read_stat(self.proc)
+        rx_bytes, tx_bytes = read_net(self.proc)
+        times = os.times()
+        return Reading(
+            monotonic(), busy, total, times.user + times.system,
+            context_switches, rx_bytes, tx_bytes,
+        )
+
+    def sample(self) -> None:
+        reading = self.read()
+        last, self.last = self.last, reading
+        elapsed = reading.time - last.time
+        if elapsed <= 0:
+            return
+        memory_total, memory_available = read_meminfo(self.proc)
+        sample = Sample(
+            time=reading.time - self.start_time,
+            finished=self.metrics.finished,
+            cpu=(reading.cpu_busy - last.cpu_busy) / max(
+                reading.cpu_total - last.cpu_total, 1,
+            ),
+            process_cpu=(reading.process_cpu - last.process_cpu) / elapsed,
+            load=read_loadavg(self.proc),
+            memory_available=memory_available,
+            memory_total=memory_total,
+            fds=count_fds(self.proc),
+            fd_limit=self.fd_limit,
+            context_switches=(
+                reading.context_switches - last.context_switches
+            ) / elapsed,
+            rx_bytes=(reading.rx_bytes - last.rx_bytes) / elapsed,
+            tx_bytes=(reading.tx_bytes - last.tx_bytes) / elapsed,
+        )
+        self.samples.append(sample)
+        self.writer.writerow(format_sample(sample))
+        self.file.flush()
+        self.check(sample)
+
+    def check(self, sample: Sample) -> None:
+        for name, description, saturated in CONDITIONS:
+            if not saturated(sample):
+                self.streaks[name] = 0
+                since = self.saturated_since.pop(name, None)
+                if since is not None:
+                    self.saturations.append((name, since, sample.time))
+                    logger.info(
+                        'The %s is no longer saturated', description,
+                    )
+                continue
+            self.streaks[name] += 1
+            if self.streaks[name] == SUSTAINED:
+                since = self.samples[-SUSTAINED].time - self.interval
+                self.saturated_since[name] = max(since, 0.0)
+                logger.warning(
+                    'The %s is saturated (%s), latencies may be those of '
+                    'the load generator rather than of the cluster',
+                    description,
+                    format_condition(name, sample),
+                )
+
+    def log(self) -> None:
+        if not self.samples:
+            return
+        logger.info('Load generator host:')
+        logger.info(
+            ' - CPU %s, sxrumble %s, load up to %.2f',
+            format_peak([s.cpu for s in self.samples], '{:.0%}'),
+            format_peak([s.process_cpu for s in self.samples], '{:.0%}'),
+            max(s.load for s in self.samples),
+        )
+        logger.info(
+            ' - memory available down to %s, open files up to %d of %d',
+            humanfriendly.format_size(
+                min(s.memory_available for s in self.samples), binary=True,
+            ),
+            max(s.fds for s in self.samples),
+            self.fd_limit,
+        )
+        logger.info(
+            ' - context switches %s/s, network in %s/s, out %s/s at most',
+            format_count(max(s.context_switches for s in self.samples)),
+            humanfriendly.format_size(
+                int(max(s.rx_bytes for s in self.samples)), binary=True,
+            ),
+            humanfriendly.format_size(
+                int(max(s.tx_bytes for s in self.samples)), binary=True,
+            ),
+        )
+        descriptions = {name: d for name, d, _ in CONDITIONS}
+        for name, start, end in self.saturations:
+            logger.warning(
+                'The %s was saturated from %.0fs to %.0fs into the run',
+                descriptions[name], start, end,
+            )
+        logger.info('Saved the host samples to %s', self.filename)
+
+
+def start_host_monitor(
+        metrics: Metrics, start_time: float, interval: float,
+        filename: str, append: bool = False) -> Optional[HostMonitor]:
+    """Return a started monitor, unless disabled or there is no `/proc`."""
+    if not interval:
+        return None
+    try:
+        monitor = HostMonitor(metrics, start_time, interval, filename, append)
+    except (OSError, ValueError) as e:
+        logger.debug('Not monitoring the host: %s', e)
+        return None
+    monitor.start()
+    return monitor
+
+
+def get_host_filename(results_filename: str) -> str:
+    """Return the samples file of a run, next to its results."""
+    return os.path.splitext(results_filename)[0] + '.host.csv'
+
+
+def read_stat(proc: str) -> Tuple[int, int, int]:
+    """Return busy and total CPU ticks of the host and context switches."""
+    busy = total = context_switches = 0
+    with open(os.path.join(proc, 'stat')) as f:
+        for line in f:
+            fields = line.split()
+            if fields[0] == 'cpu':
+                # user nice system idle iowait irq softirq steal, guests
+                # are counted in user already.
+                ticks = [int(t) for t in fields[1:9]]
+                total = sum(ticks)
+                busy = total - sum(ticks[3:5])
+            elif fields[0] == 'ctxt':
+                context_switches = int(fields[1])
+    return busy, total, context_switches
+
+
+def read_loadavg(proc: str) -> float:
+    with open(os.path.join(proc, 'loadavg')) as f:
+        return float(f.read().split()[0])
+
+
+def read_meminfo(proc: str) -> Tuple[int, int]:
+    """Return the total and the available memory, in bytes."""
+    values = {}  # type: Dict[str, int]
+    with open(os.path.join(proc, 'meminfo')) as f:
+        for line in f:
+            name, _, value = line.partition(':')
+            if name in ('MemTotal', 'MemAvailable', 'MemFree'):
+                values[name] = int(value.split()[0]) * 1024
+    # Kernels before 3.14 only tell the free memory.
+    return values['MemTotal'], values.get('MemAvailable', values['MemFree'])
+
+
+def read_net(proc: str) -> Tuple[int, int]:
+    """Return bytes received and sent by every interface but loopback."""
+    rx_bytes = tx_bytes = 0
+    with open(os.path.join(proc, 'net', 'dev')) as f:
+        # Two lines of headers.
+        for line in list(f)[2:]:
+            interface, _, counters = line.partition(':')
+            if interface.strip() == 'lo':
+                continue
+            fields = counters.split()
+            rx_bytes += int(fields[0])
+            tx_bytes += int(fields[8])
+    return rx_bytes, tx_bytes
+
+
+def count_fds(proc: str) -> int:
+    return len(os.listdir(os.path.join(proc, 'self', 'fd')))
+
+
+def format_sample(sample: Sample) -> List[str]:
+    return [
+        '{:.3f}'.format(v) if isinstance(v, float) else str(v)
+        for v in sample
+    ]
+
+
+def format_condition(name: str, sample: Sample) -> str:
+    if name in ('cpu', 'process_cpu'):
+        return '{:.0%}'.format(getattr(sample, name))
+    if name == 'load':
+        return '{:.2f} on {} CPUs'.format(sample.load, os.cpu_count() or 1)
+    if name == 'memory':
+        return '{} available'.format(
+            humanfriendly.format_size(sample.memory_available, binary=True),
+        )
+    return '{} of {}'.format(sample.fds, sample.fd_limit)
+
+
+def format_peak(values: List[float], value_format: str) -> str:
+    ordered = sorted(values)
+    return '{} median, {} max'.format(
+        value_format.format(ordered[len(ordered) // 2]),
+        value_format.format(ordered[-1]),
+    )
+
+
+def format_count(count: float) -> str:
+    return humanfriendly.format_number(int(count))
@@ -1,27 +1,94 @@
 # Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
 # License: Apache 2.0, see LICENSE for more details.
 
+import json
 import logging
+import logging.handlers
+import queue
 import sys
+import threading
 from subprocess import CompletedProcess
-from typing import Union
-
-
-def configure_logging(*, use_colors: bool) -> None:
+from time import monotonic
+from typing import Callable, Dict, List, Optional, Union  # noqa
+
+
+def configure_logging(
+        *, use_colors: bool, debug_rate: int = 0,
+        json_file: str = None) -> logging.handlers.QueueListener:
+    """Send log records through a queue to handlers in a background thread.
+
+    Worker threads only put records on the queue, the formatting and the
+    writes happen in the listener thread. At most `debug_rate` debug
+    messages are let through per second, 0 meaning no limit.
+    """
+    handlers = [get_handler(use_colors=use_colors)]
+    if json_file is not None:
+        handlers.append(get_json_handler(json_file))
+    records = queue.Queue()  # type: queue.Queue
+    queue_handler = DeferredQueueHandler(records)
+    if debug_rate:
+        queue_handler.addFilter(RateLimitFilter({logging.DEBUG: debug_rate}))
     logger = logging.getLogger()
     logger.setLevel(logging.DEBUG)
-    handler = get_handler(use_colors=use_colors)
-    logger.addHandler(handler)
+    logger.addHandler(queue_handler)
+    listener = logging.handlers.QueueListener(records, *handlers)
+    listener.start()
+    return listener
 
 
 def get_handler(*, use_colors: bool) -> logging.Handler:
-    handler = logging.StreamHandler(sys.stdout)
+    handler = ConsoleHandler(sys.stdout)
     formatter = get_formatter(use_colors=use_colors)
     handler.setFormatter(formatter)
     handler.setLevel(logging.DEBUG)
+    handler.addFilter(console_filter)
     return handler
 
 
+class MinimumLevelFilter(logging.Filter):
+    """Lets through records of `level` and above.
+
+    Unlike the level of a handler, the level can be changed while the
+    listener thread is handling records.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.level = logging.NOTSET
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= self.level
+
+
+# Raised while the dashboard is drawn on the terminal.
+console_filter = MinimumLevelFilter()
+
+
+class ConsoleDiversion:
+    """Where console records are written instead of stdout, if set."""
+
+    def __init__(self) -> None:
+        self.write = None  # type: Optional[Callable[[str], None]]
+
+
+# Set while the dashboard is drawn on the terminal, which writes records
+# above its frame.
+console_diversion = ConsoleDiversion()
+
+
+class ConsoleHandler(logging.StreamHandler):
+
+    def emit(self, record: logging.LogRecord) -> None:
+        write = console_diversion.write
+        if write is None:
+            super().emit(record)
+            return
+        try:
+            write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
 def get_formatter(*, use_colors: bool) -> logging.Formatter:
     if use_colors:
         return ColoredFormatter(
@@ -33,6 +100,76 @@ def get_formatter(*, use_colors: bool) -> logging.Formatter:
     )
 
 
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queues records as they are, leaving all formatting to the listener.
+
+    Records never leave the process, so there is no need to turn their
+    arguments and tracebacks into strings up front.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def get_json_handler(filename: str) -> logging.Handler:
+    handler = logging.FileHandler(filename)
+    handler.setFormatter(JsonFormatter())
+    handler.setLevel(logging.DEBUG)
+    return handler
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as JSON objects, one per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return json.dumps(payload)
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets through at most a given number of records per second per level.
+
+    The first record let through after some were dropped mentions how many.
+    """
+
+    def __init__(self, rates: Dict[int, int]) -> None:
+        super().__init__()
+        self.rates = rates
+        self.lock = threading.Lock()
+        self.windows = {level: 0 for level in rates}  # type: Dict[int, int]
+        self.counts = {level: 0 for level in rates}  # type: Dict[int, int]
+        self.dropped = {level: 0 for level in rates}  # type: Dict[int, int]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level = record.levelno
+        rate = self.rates.get(level)
+        if rate is None:
+            return True
+        window = int(monotonic())
+        with self.lock:
+            if window != self.windows[level]:
+                self.windows[level] = window
+                self.counts[level] = 0
+            if self.counts[level] >= rate:
+                self.dropped[level] += 1
+                return False
+            self.counts[level] += 1
+            dropped, self.dropped[level] = self.dropped[level], 0
+        if dropped:
+            message = record.getMessage()
+            record.msg = '%s (%d similar messages suppressed)'
+            record.args = (message, dropped)
+        return True
+
+
 class ColoredFormatter(logging.Formatter):
     COLORS = {
         'INFO': '\033[34m',
@@ -0,0 +1,195 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Live metrics of a running session. Operations are added by the reporting
+# thread to a bucket per second, and views only read buckets at least a
+# second old, so neither side takes a lock.
+
+import random
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, deque
+from time import monotonic
+from typing import Deque, Dict, List, Optional, Tuple  # noqa
+
+from sxrumble.operations import Operation, ALL_OPERATIONS, ERROR_CLASSES
+from sxrumble.phases import QUEUED, DEQUEUED, REPORTED
+from sxrumble.stats import percentile
+
+
+# Seconds of the rolling statistics.
+WINDOW = 10
+# Latencies kept per second and type, sampled at random past that.
+MAX_SAMPLES = 1000
+# Upper bounds of the latency histograms, in seconds.
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+    float('inf'),
+)
+TYPE_NAMES = [o.get_name() for o in ALL_OPERATIONS]
+TYPE_INDEXES = {name: i for i, name in enumerate(TYPE_NAMES)}
+ERROR_INDEXES = {name: i for i, name in enumerate(ERROR_CLASSES)}
+
+
+class Bucket:
+    """Operations reported during one second."""
+
+    def __init__(self, second: int) -> None:
+        self.second = second
+        self.count = 0
+        self.bytes = 0
+        self.counts = Counter()  # type: Counter
+        self.failed = Counter()  # type: Counter
+        self.durations = {}  # type: Dict[str, array]
+        # Time from the intended start to the start.
+        self.lags = array('d')
+
+    def add(self, operation: Operation) -> None:
+        name = operation.get_name()
+        stamps = operation.phases.stamps
+        self.count += 1
+        self.counts[name] += 1
+        self.bytes += operation.bytes
+        sample(self.lags, stamps[DEQUEUED] - stamps[QUEUED], self.count)
+        if operation.error_class != 'ok':
+            self.failed[name] += 1
+            return
+        if name not in self.durations:
+            self.durations[name] = array('d')
+        sample(self.durations[name], operation.duration, self.counts[name])
+
+
+def sample(values: array, value: float, seen: int) -> None:
+    """Keep a uniform sample of `MAX_SAMPLES` of the `seen` values."""
+    if len(values) < MAX_SAMPLES:
+        values.append(value)
+        return
+    i = random.randrange(seen)
+    if i < MAX_SAMPLES:
+        values[i] = value
+
+
+class Histogram:
+    """Counts of observations per bucket of `LATENCY_BUCKETS`."""
+
+    __slots__ = ('counts', 'sum')
+
+    def __init__(self) -> None:
+        self.counts = [0] * len(LATENCY_BUCKETS)
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+
+
+class Totals:
+    """Outcomes of an operation type since the start of the run."""
+
+    __slots__ = ('results', 'bytes', 'durations', 'response_times')
+
+    def __init__(self) -> None:
+        # Count per error class.
+        self.results = [0] * len(ERROR_CLASSES)
+        self.bytes = 0
+        self.durations = Histogram()
+        self.response_times = Histogram()
+
+
+class Metrics:
+
+    def __init__(self, start_time: float) -> None:
+        self.start_time = start_time
+        self.began = monotonic()
+        self.buckets = deque()  # type: Deque[Bucket]
+        self.dispatched = 0
+        self.finished = 0
+        # Replays only: the window of the session which is replayed, and
+        # when the last operation dispatched is due, in seconds.
+        self.schedule = None  # type: Optional[Tuple[float, float]]
+        self.due = 0.0
+        self.totals = [Totals() for _ in TYPE_NAMES]  # type: List[Totals]
+        # Of the last operation reported.
+        self.lag = 0.0
+
+    def add(self, operation: Operation) -> None:
+        second = int(operation.phases.stamps[REPORTED])
+        buckets = self.buckets
+        if not buckets or buckets[-1].second != second:
+            buckets.append(Bucket(second))
+            while buckets[0].second < second - WINDOW - 1:
+                buckets.popleft()
+        buckets[-1].add(operation)
+        self.finished += 1
+        stamps = operation.phases.stamps
+        self.lag = stamps[DEQUEUED] - stamps[QUEUED]
+        totals = self.totals[TYPE_INDEXES[operation.get_name()]]
+        totals.results[ERROR_INDEXES[operation.error_class]] += 1
+        totals.bytes += operation.bytes
+        if operation.error_class == 'ok':
+            totals.durations.observe(operation.duration)
+            totals.response_times.observe(operation.phases.response_time())
+
+    @property
+    def progress(self) -> Optional[float]:
+        """Share of the schedule of a replay which was dispatched."""
+        if self.schedule is None:
+            return None
+        start, end = self.schedule
+        if end <= start:
+            return 1.0
+        return min(max((self.due - start) / (end - start), 0.0), 1.0)
+
+    def snapshot(self, now: float = None) -> 'Snapshot':
+        return Snapshot(self, monotonic() if now is None else now)
+
+
+class TypeSnapshot:
+
+    def __init__(self, rate: float, p50: float, p99: float, errors: float) \
+            -> None:
+        self.rate = rate
+        self.p50 = p50
+        self.p99 = p99
+        # Percentage of failed operations.
+        self.errors = errors
+
+
+class Snapshot:
+    """Rolling statistics of the last `WINDOW` complete seconds."""
+
+    def __init__(self, metrics: Metrics, now: float) -> None:
+        # The current second may still be written to, leave it out. Copying
+        # a deque happens under the GIL.
+        last = int(now) - 1
+        buckets = [
+            b for b in metrics.buckets.copy()
+            if last - WINDOW <= b.second < last
+        ]
+        # Shorter than the window at the start of a run.
+        span = min(WINDOW, max(last - int(metrics.began), 1))
+        self.elapsed = now - metrics.start_time
+        self.in_flight = metrics.dispatched - metrics.finished
+        count = sum(b.count for b in buckets)
+        failed = sum(sum(b.failed.values()) for b in buckets)
+        self.rate = count / span
+        self.bytes_rate = sum(b.bytes for b in buckets) / span
+        self.errors = 100.0 * failed / count if count else 0.0
+        lags = sorted(lag for b in buckets for lag in b.lags)
+        self.lag_p99 = percentile(lags, 99) if lags else None
+        self.progress = metrics.progress
+        self.types = OrderedDict()  # type: Dict[str, TypeSnapshot]
+        for name in TYPE_NAMES:
+            type_count = sum(b.counts[name] for b in buckets)
+            if not type_count:
+                continue
+            durations = sorted(
+                d for b in buckets for d in b.durations.get(name, ())
+            )
+            type_failed = sum(b.failed[name] for b in buckets)
+            self.types[name] = TypeSnapshot(
+                type_count / span,
+                percentile(durations, 50),
+                percentile(durations, 99),
+                100.0 * type_failed / type_count,
+            )
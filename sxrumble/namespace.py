@@ -0,0 +1,103 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Directory trees of the uploaded files, `depth` deep with `fanout`
+# directories per level. Operations are picked by a single thread, hence no
+# locking.
+
+import random
+from array import array
+from functools import reduce
+from operator import mul
+from typing import Dict, List, Optional, Set, Tuple  # noqa
+from uuid import uuid4
+
+
+HEX_DIGITS = '0123456789abcdef'
+
+
+class Namespace:
+
+    def __init__(
+            self, depth: int = 0, fanout: List[int] = None,
+            name_length: List[int] = None, prefix: str = 'sxrumble-',
+            recursive: float = 0.1) -> None:
+        fanout = fanout or [10]
+        self.depth = depth
+        # The last fanout applies to the deeper levels.
+        self.fanouts = [fanout[min(i, len(fanout) - 1)] for i in range(depth)]
+        self.leaves = reduce(mul, self.fanouts, 1)
+        # Random names after the prefix, a UUID if not specified.
+        self.name_length = name_length
+        self.prefix = prefix
+        # Share of the listings which are recursive.
+        self.recursive = recursive
+        self.populated = {}  # type: Dict[str, Tuple[Set[int], array]]
+
+    def pick_filename(self, volume: str) -> str:
+        return self.pick_directory(volume) + self.pick_name()
+
+    def pick_name(self) -> str:
+        if self.name_length is None:
+            return self.prefix + str(uuid4())
+        length = random.randint(*self.name_length) - len(self.prefix)
+        return self.prefix + ''.join(
+            random.choice(HEX_DIGITS) for _ in range(length)
+        )
+
+    def pick_directory(self, volume: str) -> str:
+        if not self.depth:
+            return ''
+        leaf = random.randrange(self.leaves)
+        self.add(volume, leaf)
+        return self.format_directory(leaf, self.depth)
+
+    def add(self, volume: str, leaf: int) -> None:
+        known, leaves = self.populated.setdefault(volume, (set(), array('Q')))
+        if leaf not in known:
+            known.add(leaf)
+            leaves.append(leaf)
+
+    def pick_prefix(self, volume: str) -> str:
+        """Pick a populated directory at any level, the root included."""
+        leaf = self.pick_populated(volume)
+        if leaf is None:
+            return ''
+        return self.format_directory(leaf, random.randint(0, self.depth))
+
+    def pick_pattern(self, volume: str) -> str:
+        """Pick a glob of about a sixteenth of a populated leaf directory."""
+        leaf = self.pick_populated(volume)
+        directory = '' if leaf is None else \
+            self.format_directory(leaf, self.depth)
+        return directory + self.prefix + random.choice(HEX_DIGITS) + '*'
+
+    def pick_recursive(self) -> bool:
+        return self.depth > 0 and random.random() < self.recursive
+
+    def pick_populated(self, volume: str) -> Optional[int]:
+        if volume not in self.populated:
+            return None
+        return random.choice(self.populated[volume][1])
+
+    def format_directory(self, leaf: int, level: int) -> str:
+        """Path of the first `level` directories of a leaf, with a slash."""
+        names = []  # type: List[str]
+        for fanout in reversed(self.fanouts):
+            leaf, index = divmod(leaf, fanout)
+            names.append('d{:0{}d}'.format(index, len(str(fanout - 1))))
+        return ''.join(name + '/' for name in reversed(names[-level:])) \
+            if level else ''
+
+    def parse_directory(self, directory: str) -> Optional[int]:
+        """Leaf of a path of `format_directory`, if it fits this shape."""
+        names = directory.rstrip('/').split('/') if directory else []
+        if len(names) != self.depth:
+            return None
+        leaf = 0
+        for name, fanout in zip(names, self.fanouts):
+            index = int(name[1:]) if name[1:].isdigit() else -1
+            if not name.startswith('d') or not 0 <= index < fanout:
+                return None
+            leaf = leaf * fanout + index
+        return leaf
@@ -4,20 +4,63 @@
 import logging
 import os
 import random
+import re
+import shutil
 import subprocess
+import tempfile
 import time
+from bisect import bisect
+from concurrent.futures import ThreadPoolExecutor
 from functools import partial
 from subprocess import CompletedProcess
-from typing import List, Union, Tuple, Type, Any  # noqa
-from uuid import uuid4
+from typing import List, Optional, Sequence, Union, Tuple, Type, Any  # noqa
 
-from sxrumble.config import Config, ENTROPY_FILE_PATH
+from sxrumble import capture, spawner
+from sxrumble.capture import CommandResult
+from sxrumble.churn import new_name
+from sxrumble.config import Config, Options, ENTROPY_FILE_PATH
 from sxrumble.logs import prepare_process_error_message
+from sxrumble.phases import Phases, PAYLOAD_READY, SPAWNED, EXITED
+
+
+# Outcome of an operation, the first one means success. New classes go at
+# the end, results files refer to them by index.
+ERROR_CLASSES = (
+    'ok', 'exit', 'timeout', 'signal', 'not_found', 'permission', 'quota',
+    'network', 'server',
+)
+RETRYABLE_ERROR_CLASSES = frozenset(['timeout', 'network', 'server'])
+
+# Checked against stderr in order, the first match wins.
+ERROR_PATTERNS = [
+    ('not_found', rb'not found|no such'),
+    ('permission', rb'permission denied|not enough privileges|'
+                   rb'invalid credentials|unauthori[sz]ed|forbidden'),
+    ('quota', rb'quota|not enough space|no space left'),
+    ('network', rb'connect|resolve host|timed out|network|reset by peer'),
+    ('server', rb'internal server error|service unavailable|bad gateway|'
+               rb'try again later'),
+]
+ERROR_REGEXES = [
+    (error_class, re.compile(pattern, re.IGNORECASE))
+    for error_class, pattern in ERROR_PATTERNS
+]
+
+
+# Payloads of batches are written here, tmpfs if there is one.
+STAGING_DIR = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+# Created volumes belong to the admin, the users of the run get grants.
+CHURN_VOLUME_OWNER = 'admin'
+CHURN_VOLUME_SIZE = '1G'
+CHURN_PRIVILEGES = 'read,write'
 
 
 CommandArgs = List[str]
 CommandInput = Union[str, bytes, None]
 RunCommandArgs = Tuple[CommandArgs, CommandInput]
+# (name, size, offset)
+FileInfo = Tuple[str, int, int]
 
 
 logger = logging.getLogger(__name__)
@@ -25,8 +68,21 @@ logger = logging.getLogger(__name__)
 
 class Operation:
 
+    # Whether every line of the output is an entry of a listing.
+    lists_entries = False
+
     def __init__(self, config: Config, **kwargs: Any) -> None:
         self.config = config
+        # Assigned by an `EndpointSelector`, the first endpoint otherwise.
+        self.endpoint = 0
+        self.sx_url = config.sx_url
+        self.phases = Phases()
+        self.duration = 0.0
+        self.returncode = None  # type: Optional[int]
+        self.error_class = ERROR_CLASSES[0]
+        self.bytes = 0
+        self.entries = 0
+        self.retries = 0
 
     @classmethod
     def randomize(cls, config: Config) -> 'Operation':
@@ -39,10 +95,35 @@ class Operation:
     def serialize(self) -> dict:
         return {}
 
-    def run(self) -> None:
+    def run(self, options: Options = None) -> None:
+        """Run the command, retrying it on transient errors.
+
+        The duration and the phases span all the attempts, the way a client
+        retrying on its own would see them.
+        """
+        options = options or Options()
+        timeout = options.get_timeout(self.get_name())
         args, stdin = self.prepare_command()
-        duration, proc = measure_command(args, stdin)
-        if proc.returncode == 0:
+        self.phases.mark(PAYLOAD_READY)
+        start = time.monotonic()
+        proc = run_command(args, stdin, self.phases, timeout)
+        self.error_class = classify_error(proc)
+        while self.error_class in RETRYABLE_ERROR_CLASSES and \
+                self.retries < options.retries:
+            self.retries += 1
+            backoff = get_backoff(options.retry_backoff, self.retries)
+            self.report_retry(proc, backoff)
+            time.sleep(backoff)
+            proc = run_command(args, stdin, None, timeout)
+            self.error_class = classify_error(proc)
+        if self.retries:
+            self.phases.mark(EXITED)
+        self.duration = duration = time.monotonic() - start
+        self.returncode = proc.returncode
+        self.bytes = len(stdin or b'') + proc.stdout_size
+        if self.lists_entries:
+            self.entries = proc.stdout_lines
+        if self.error_class == 'ok':
             self.report_success(duration)
         else:
             self.report_error(proc)
@@ -51,6 +132,14 @@ class Operation:
         raise NotImplementedError()
 
     def report_success(self, duration: float) -> None:
+        if self.lists_entries:
+            logger.debug(
+                "%s finished in %.3fs, listed %d entries",
+                self.get_name(),
+                duration,
+                self.entries,
+            )
+            return
         logger.debug(
             "%s finished in %.3fs",
             self.get_name(),
@@ -58,45 +147,107 @@ class Operation:
         )
 
     def report_error(self, proc: CompletedProcess) -> None:
+        if self.error_class == 'timeout':
+            logger.error(
+                "%s timed out after %.3fs", self.get_name(), self.duration,
+            )
+            return
         message = prepare_process_error_message(
             self.get_name(),
             proc,
         )
         logger.error(message)
 
+    def report_retry(self, proc: CompletedProcess, backoff: float) -> None:
+        logger.warning(
+            "%s failed (%s), retrying in %.3fs",
+            self.get_name(),
+            self.error_class,
+            backoff,
+        )
+
 
 class ListUsers(Operation):
 
     def prepare_command(self) -> RunCommandArgs:
-        args = ['sxacl', 'userlist', self.config.sx_url]
+        args = ['sxacl', 'userlist', self.sx_url]
         return args, None
 
 
 class ListVolumes(Operation):
 
+    lists_entries = True
+
     def prepare_command(self) -> RunCommandArgs:
-        args = ['sxls', self.config.sx_url]
+        args = ['sxls', self.sx_url]
         return args, None
 
 
 class ListFiles(Operation):
 
-    def __init__(self, config: Config, *, volume: str) -> None:
+    lists_entries = True
+
+    def __init__(
+            self, config: Config, *, volume: str, prefix: str = '',
+            recursive: bool = False) -> None:
         super().__init__(config)
         self.volume = volume
+        # A directory of the volume, with a trailing slash.
+        self.prefix = prefix
+        self.recursive = recursive
 
     @classmethod
     def randomize(cls, config: Config) -> 'ListFiles':
+        volume = pick_volume(config)
         return cls(
             config,
-            volume=pick_volume(config),
+            volume=volume,
+            prefix=config.tree.pick_prefix(volume),
+            recursive=config.tree.pick_recursive(),
         )
 
     def serialize(self) -> dict:
-        return {'volume': self.volume}
+        serialized = {'volume': self.volume}  # type: dict
+        # Listings of the whole volume are saved the way they always were.
+        if self.prefix:
+            serialized['prefix'] = self.prefix
+        if self.recursive:
+            serialized['recursive'] = True
+        return serialized
+
+    def prepare_command(self) -> RunCommandArgs:
+        path = os.path.join(self.sx_url, self.volume)
+        if self.prefix:
+            path = os.path.join(path, self.prefix)
+        args = ['sxls', path]
+        if self.recursive:
+            args.insert(1, '--recursive')
+        return args, None
+
+
+class GlobFiles(Operation):
+
+    lists_entries = True
+
+    def __init__(self, config: Config, *, volume: str, pattern: str) -> None:
+        super().__init__(config)
+        self.volume = volume
+        self.pattern = pattern
+
+    @classmethod
+    def randomize(cls, config: Config) -> 'GlobFiles':
+        volume = pick_volume(config)
+        return cls(
+            config,
+            volume=volume,
+            pattern=config.tree.pick_pattern(volume),
+        )
+
+    def serialize(self) -> dict:
+        return {'volume': self.volume, 'pattern': self.pattern}
 
     def prepare_command(self) -> RunCommandArgs:
-        path = os.path.join(self.config.sx_url, self.volume)
+        path = os.path.join(self.sx_url, self.volume, self.pattern)
         args = ['sxls', path]
         return args, None
 
@@ -118,7 +269,7 @@ class ShowVolumeAcl(Operation):
         return {'volume': self.volume}
 
     def prepare_command(self) -> RunCommandArgs:
-        path = os.path.join(self.config.sx_url, self.volume)
+        path = os.path.join(self.sx_url, self.volume)
         args = ['sxacl', 'volshow', path]
         return args, None
 
@@ -137,10 +288,11 @@ class UploadNewFile(Operation):
     @classmethod
     def randomize(cls, config: Config) -> 'UploadNewFile':
         size, offset = pick_size_and_offset(config)
+        volume = pick_volume(config)
         return cls(
             config,
-            volume=pick_volume(config),
-            filename=pick_filename(config),
+            volume=volume,
+            filename=pick_filename(config, volume),
             size=size,
             offset=offset,
         )
@@ -156,7 +308,7 @@ class UploadNewFile(Operation):
     def prepare_command(self) -> RunCommandArgs:
         stdin = get_file_content(self.size, self.offset)
         sx_path = os.path.join(
-            self.config.sx_url,
+            self.sx_url,
             self.volume,
             self.filename,
         )
@@ -164,40 +316,397 @@ class UploadNewFile(Operation):
         return args, stdin
 
 
-def measure_command(args: CommandArgs, stdin: CommandInput) \
-        -> Tuple[float, CompletedProcess]:
-    start = time.monotonic()
-    proc = run_command(args, stdin)
-    duration = time.monotonic() - start
-    return duration, proc
+class UploadBatch(Operation):
+    """Upload files of the entropy to a directory with a single `sxcp`.
+
+    Not part of the mix, batches are made by `populate` and out of
+    `UploadNewFile` operations by `UploadBatcher`.
+    """
+
+    def __init__(
+            self, config: Config, *, volume: str, directory: str,
+            files: List[FileInfo]) -> None:
+        super().__init__(config)
+        self.volume = volume
+        self.directory = directory
+        self.files = files
+        self.temporary = None  # type: Optional[str]
+
+    @classmethod
+    def randomize_batch(cls, config: Config, size: int) -> 'UploadBatch':
+        volume = pick_volume(config)
+        files = []  # type: List[FileInfo]
+        for _ in range(size):
+            file_size, offset = pick_size_and_offset(config)
+            files.append((config.tree.pick_name(), file_size, offset))
+        return cls(
+            config,
+            volume=volume,
+            directory=config.tree.pick_directory(volume),
+            files=files,
+        )
+
+    def serialize(self) -> dict:
+        return {
+            'volume': self.volume,
+            'directory': self.directory,
+            'files': self.files,
+        }
+
+    def prepare_command(self) -> RunCommandArgs:
+        self.temporary = tempfile.mkdtemp(prefix='sxrumble-', dir=STAGING_DIR)
+        paths = []
+        for name, size, offset in self.files:
+            path = os.path.join(self.temporary, name)
+            with open(path, 'wb') as f:
+                f.write(get_file_content(size, offset))
+            paths.append(path)
+        # The trailing slash makes `sxcp` copy into the directory.
+        destination = os.path.join(
+            self.sx_url, self.volume, self.directory, '',
+        )
+        args = ['sxcp', '--no-progress'] + paths + [destination]
+        return args, None
+
+    def run(self, options: Options = None) -> None:
+        try:
+            super().run(options)
+        finally:
+            if self.temporary is not None:
+                shutil.rmtree(self.temporary, ignore_errors=True)
+        self.bytes = sum(size for _, size, _ in self.files)
+
+
+class ChurnOperation(Operation):
+    """Creates or deletes an object of the cluster, see `sxrumble.churn`.
+
+    The state of the run follows the outcome: created objects are added to
+    it, objects which could not be deleted are put back.
+    """
+
+    # Kind of the object in the state.
+    kind = ''
+    creates = True
+
+    def get_object(self) -> Any:
+        raise NotImplementedError()
+
+    def run(self, options: Options = None) -> None:
+        super().run(options)
+        ok = self.error_class == 'ok'
+        if ok == self.creates:
+            self.config.churn.add(self.kind, self.get_object())
+        else:
+            self.config.churn.discard(self.kind, self.get_object())
+
+
+class CreateVolume(ChurnOperation):
+
+    kind = 'volumes'
+
+    def __init__(self, config: Config, *, volume: str, owner: str) -> None:
+        super().__init__(config)
+        self.volume = volume
+        self.owner = owner
+
+    @classmethod
+    def randomize(cls, config: Config) -> 'CreateVolume':
+        return cls(config, volume=new_name(), owner=CHURN_VOLUME_OWNER)
+
+    def serialize(self) -> dict:
+        return {'volume': self.volume, 'owner': self.owner}
+
+    def get_object(self) -> str:
+        return self.volume
+
+    def prepare_command(self) -> RunCommandArgs:
+        args = [
+            'sxvol', 'create',
+            '--owner', self.owner,
+            '--replica', '1',
+            '--size', CHURN_VOLUME_SIZE,
+            os.path.join(self.sx_url, self.volume),
+        ]
+        return args, None
 
 
-def run_command(args: CommandArgs, input: CommandInput = '') \
-        -> CompletedProcess:
-    return subprocess.run(
+class DeleteVolume(ChurnOperation):
+
+    kind = 'volumes'
+    creates = False
+
+    def __init__(self, config: Config, *, volume: str) -> None:
+        super().__init__(config)
+        self.volume = volume
+
+    @classmethod
+    def randomize(cls, config: Config) -> Operation:
+        volume = config.churn.take('volumes')
+        if volume is None:
+            return CreateVolume.randomize(config)
+        return cls(config, volume=volume)
+
+    def serialize(self) -> dict:
+        return {'volume': self.volume}
+
+    def get_object(self) -> str:
+        return self.volume
+
+    def prepare_command(self) -> RunCommandArgs:
+        args = ['sxvol', 'remove', os.path.join(self.sx_url, self.volume)]
+        return args, None
+
+
+class CreateUser(ChurnOperation):
+
+    kind = 'users'
+
+    def __init__(self, config: Config, *, user: str) -> None:
+        super().__init__(config)
+        self.user = user
+
+    @classmethod
+    def randomize(cls, config: Config) -> 'CreateUser':
+        return cls(config, user=new_name())
+
+    def serialize(self) -> dict:
+        return {'user': self.user}
+
+    def get_object(self) -> str:
+        return self.user
+
+    def prepare_command(self) -> RunCommandArgs:
+        args = ['sxacl', 'useradd', '--role', 'normal', self.user, self.sx_url]
+        return args, None
+
+
+class DeleteUser(ChurnOperation):
+
+    kind = 'users'
+    creates = False
+
+    def __init__(self, config: Config, *, user: str) -> None:
+        super().__init__(config)
+        self.user = user
+
+    @classmethod
+    def randomize(cls, config: Config) -> Operation:
+        user = config.churn.take('users')
+        if user is None:
+            return CreateUser.randomize(config)
+        return cls(config, user=user)
+
+    def serialize(self) -> dict:
+        return {'user': self.user}
+
+    def get_object(self) -> str:
+        return self.user
+
+    def run(self, options: Options = None) -> None:
+        super().run(options)
+        if self.error_class == 'ok':
+            self.config.churn.discard_grants(self.user)
+
+    def prepare_command(self) -> RunCommandArgs:
+        args = ['sxacl', 'userdel', self.user, self.sx_url]
+        return args, None
+
+
+class GrantAcl(ChurnOperation):
+    """Grant a user of the run access to one of the volumes of the run."""
+
+    kind = 'grants'
+    option = '--grant'
+
+    def __init__(self, config: Config, *, volume: str, user: str) -> None:
+        super().__init__(config)
+        self.volume = volume
+        self.user = user
+
+    @classmethod
+    def randomize(cls, config: Config) -> Operation:
+        user = config.churn.pick('users')
+        if user is None:
+            return CreateUser.randomize(config)
+        return cls(config, volume=pick_volume(config), user=user)
+
+    def serialize(self) -> dict:
+        return {'volume': self.volume, 'user': self.user}
+
+    def get_object(self) -> Tuple[str, str]:
+        return self.user, self.volume
+
+    def prepare_command(self) -> RunCommandArgs:
+        args = [
+            'sxacl', 'volperm', self.option, CHURN_PRIVILEGES, self.user,
+            os.path.join(self.sx_url, self.volume),
+        ]
+        return args, None
+
+
+class RevokeAcl(GrantAcl):
+
+    creates = False
+    option = '--revoke'
+
+    @classmethod
+    def randomize(cls, config: Config) -> Operation:
+        grant = config.churn.take('grants')
+        if grant is None:
+            return GrantAcl.randomize(config)
+        user, volume = grant
+        return cls(config, volume=volume, user=user)
+
+
+def classify_error(proc: CommandResult) -> str:
+    if proc.timed_out:
+        return 'timeout'
+    if proc.returncode == 0:
+        return 'ok'
+    if proc.returncode < 0:
+        return 'signal'
+    for error_class, regex in ERROR_REGEXES:
+        if regex.search(proc.stderr):
+            return error_class
+    return 'exit'
+
+
+def get_backoff(base: float, attempt: int) -> float:
+    """Exponential backoff with full jitter."""
+    return random.random() * base * 2 ** (attempt - 1)
+
+
+def run_command(
+        args: CommandArgs, input: CommandInput = '',
+        phases: Phases = None, timeout: float = None) -> CommandResult:
+    """Run a command, keeping only a bounded part of its output.
+
+    The process group of the command is killed after `timeout` seconds.
+    """
+    client = spawner.get_client()
+    if client is not None:
+        result, spawned, exited = client.run(args, input or None, timeout)
+        if phases is not None:
+            phases.mark(SPAWNED, spawned)
+            phases.mark(EXITED, exited)
+        return result
+
+    deadline = capture.get_deadline(timeout)
+    child_fds, parent_fds = capture.make_pipes()
+    try:
+        process = subprocess.Popen(
+            args,
+            stdin=child_fds[0],
+            stdout=child_fds[1],
+            stderr=child_fds[2],
+            preexec_fn=os.setpgrp,
+        )
+    except:  # noqa
+        capture.close_all(parent_fds)
+        raise
+    finally:
+        capture.close_all(child_fds)
+    if phases is not None:
+        phases.mark(SPAWNED)
+    killed = False
+    try:
+        output = capture.communicate(
+            *parent_fds, data=input or b'', deadline=deadline,
+        )
+        if output.timed_out:
+            capture.kill_group(process.pid)
+        process.wait(None if deadline is None else
+                     max(deadline - time.monotonic(), 0))
+    except subprocess.TimeoutExpired:
+        killed = True
+        capture.kill_group(process.pid)
+        process.wait()
+    except:  # noqa
+        capture.kill_group(process.pid)
+        process.wait()
+        raise
+    if phases is not None:
+        phases.mark(EXITED)
+    return CommandResult(
         args,
-        input=input or '',
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setpgrp,
+        process.returncode,
+        output.get_stdout(),
+        output.get_stderr(),
+        output.stdout_size,
+        output.stdout_lines,
+        output.timed_out or killed,
     )
 
 
-ALL_OPERATIONS = [
+# Picked alike when there is no mix.
+MIX_OPERATIONS = [
     ListUsers,
     ListVolumes,
     ListFiles,
     ShowVolumeAcl,
     UploadNewFile,
+    GlobFiles,
+]  # type: List[Type[Operation]]
+CHURN_OPERATIONS = [
+    CreateVolume,
+    DeleteVolume,
+    CreateUser,
+    DeleteUser,
+    GrantAcl,
+    RevokeAcl,
 ]  # type: List[Type[Operation]]
+# New types go at the end, results files refer to them by index.
+ALL_OPERATIONS = MIX_OPERATIONS + CHURN_OPERATIONS
 OPERATIONS_BY_NAME = {o.get_name(): o for o in ALL_OPERATIONS}
 
 
-def pick_operation(config: Config) -> Operation:
-    cls = random.choice(ALL_OPERATIONS)
+def pick_operation(
+        config: Config, weights: Sequence[float] = None) -> Operation:
+    """Pick a type at random, by cumulative `weights` if given.
+
+    The weights are in the order of `ALL_OPERATIONS`, without them the
+    control-plane churn is left out.
+    """
+    if weights is None:
+        cls = random.choice(get_mix_operations(config))
+    else:
+        cls = ALL_OPERATIONS[bisect(weights, random.random() * weights[-1])]
     return cls.randomize(config)
 
 
+def get_mix_operations(config: Config) -> List[Type[Operation]]:
+    """Return the types picked alike when there is no mix.
+
+    Globs only go with directory trees, so that runs without a namespace
+    keep the operations they always had.
+    """
+    if config.tree.depth:
+        return MIX_OPERATIONS
+    return [o for o in MIX_OPERATIONS if o is not GlobFiles]
+
+
+def remove_churn(config: Config, options: Options) -> None:
+    """Delete the volumes and users left by control-plane operations.
+
+    Grants go with their users.
+    """
+    objects = config.churn.objects
+    operations = [
+        DeleteVolume(config, volume=v) for v in objects['volumes']
+    ] + [
+        DeleteUser(config, user=u) for u in objects['users']
+    ]  # type: List[Operation]
+    if not operations:
+        return
+    logger.info(
+        'Removing %s volumes and %s users created by the run...',
+        len(objects['volumes']),
+        len(objects['users']),
+    )
+    with ThreadPoolExecutor(config.threads) as e:
+        list(e.map(lambda o: o.run(options), operations))
+
+
 def pick_volume(config: Config) -> str:
     return random.choice(config.volumes)
 
@@ -223,8 +732,8 @@ def read_slice(filename: str, size: int, offset: int) -> bytes:
 get_file_content = partial(read_slice, ENTROPY_FILE_PATH)
 
 
-def pick_filename(config: Config) -> str:
-    return 'sxrumble-' + str(uuid4())
+def pick_filename(config: Config, volume: str) -> str:
+    return config.tree.pick_filename(volume)
 
 
 def get_random_bytes(size: int, seed: str) -> bytes:
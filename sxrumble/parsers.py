@@ -1,20 +1,51 @@
 # Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
 # License: Apache 2.0, see LICENSE for more details.
 
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
 
 import humanfriendly
 
+from sxrumble.config import DEFAULT_TIMEOUT_KEY
 from sxrumble.exceptions import ValidationError
 
 
 def parse_args(args: Dict[str, str]) -> Dict[str, Any]:
     parsed_args = {}  # type: Dict[str, Any]
     parsed_args.update(args)
+    parsed_args['endpoints'] = parse_endpoints(args['sx_url'])
+    if parsed_args['endpoints']:
+        parsed_args['sx_url'] = parsed_args['endpoints'][0]['url']
+    parsed_args['namespace'] = parse_namespace(args['namespace'])
     parsed_args['threads'] = parse_threads(args['threads'])
     parsed_args['min_size'] = parse_size(args['min_size'])
     parsed_args['max_size'] = parse_size(args['max_size'])
     parsed_args['entropy_size'] = parse_entropy_size(args['entropy_size'])
+    parsed_args['shards'] = parse_count(args['shards'])
+    if args['count'] is not None:
+        parsed_args['count'] = parse_count(args['count'])
+    if args['users'] is not None:
+        parsed_args['users'] = parse_count(args['users'])
+    parsed_args['batch'] = parse_count(args['batch'])
+    parsed_args['upload_batch'] = parse_count(args['upload_batch'])
+    parsed_args['upload_linger'] = parse_seconds(args['upload_linger'])
+    parsed_args['log_rate'] = parse_count(args['log_rate'])
+    parsed_args['rate'] = parse_rate(args['rate'])
+    parsed_args['slo'] = parse_slo(args['slo'])
+    parsed_args['metrics_address'] = parse_address(args['metrics_address'])
+    parsed_args['metrics_interval'] = parse_seconds(args['metrics_interval'])
+    parsed_args['host_interval'] = parse_seconds(args['host_interval'])
+    parsed_args['timeout'] = parse_timeouts(args['timeout'])
+    parsed_args['retries'] = parse_count(args['retries'])
+    parsed_args['retry_backoff'] = parse_seconds(args['retry_backoff'])
+    parsed_args['from'] = parse_time_offset(args['from'])
+    parsed_args['to'] = parse_time_offset(args['to'])
+    parsed_args['warm_up'] = parse_time_offset(args['warm_up'])
+    parsed_args['cool_down'] = parse_time_offset(args['cool_down'])
+    parsed_args['p99_threshold'] = parse_percentage(args['p99_threshold'])
+    parsed_args['throughput_threshold'] = parse_percentage(
+        args['throughput_threshold'],
+    )
+    parsed_args['alpha'] = parse_probability(args['alpha'])
     return parsed_args
 
 
@@ -25,6 +56,13 @@ def parse_threads(threads: str) -> int:
         raise ValidationError("Invalid number of threads")
 
 
+def parse_count(count: str) -> int:
+    try:
+        return int(count)
+    except ValueError:
+        raise ValidationError("Invalid number: " + count)
+
+
 def parse_entropy_size(size: Optional[str]) -> Optional[int]:
     if size is not None:
         return parse_size(size)
@@ -36,3 +74,146 @@ def parse_size(size: str) -> int:
         return humanfriendly.parse_size(size, binary=True)
     except humanfriendly.InvalidSize:
         raise ValidationError("Invalid size: " + size)
+
+
+def parse_percentage(percentage: str) -> float:
+    try:
+        value = float(percentage.rstrip('%'))
+    except ValueError:
+        raise ValidationError("Invalid percentage: " + percentage)
+    if value < 0:
+        raise ValidationError("Percentage must not be negative")
+    return value
+
+
+def parse_probability(probability: str) -> float:
+    try:
+        value = float(probability)
+    except ValueError:
+        raise ValidationError("Invalid probability: " + probability)
+    if not 0 < value < 1:
+        raise ValidationError("Probability must be between 0 and 1")
+    return value
+
+
+def parse_fraction(fraction: str) -> float:
+    try:
+        return float(fraction)
+    except ValueError:
+        raise ValidationError("Invalid fraction: " + fraction)
+
+
+def parse_address(address: Optional[str]) -> Optional[Tuple[str, int]]:
+    """Parse an address such as `:9464` or `127.0.0.1:9464`.
+
+    Without a host, every interface is listened on.
+    """
+    if address is None:
+        return None
+    host, _, port = address.rpartition(':')
+    try:
+        return host.strip('[]'), int(port)
+    except ValueError:
+        raise ValidationError("Invalid address: " + address)
+
+
+def parse_rate(rate: Optional[str]) -> Optional[float]:
+    if rate is None:
+        return None
+    try:
+        return float(rate)
+    except ValueError:
+        raise ValidationError("Invalid rate: " + rate)
+
+
+def parse_seconds(seconds: str) -> float:
+    try:
+        return float(seconds.rstrip('s'))
+    except ValueError:
+        raise ValidationError("Invalid number of seconds: " + seconds)
+
+
+def parse_timeouts(spec: Optional[str]) -> Dict[str, float]:
+    """Parse timeouts such as `60` or `30,UploadNewFile=120`.
+
+    A timeout without an operation name applies to all the other types.
+    """
+    timeouts = {}  # type: Dict[str, float]
+    if spec is None:
+        return timeouts
+    for item in spec.split(','):
+        name, _, seconds = item.rpartition('=')
+        timeouts[name.strip() or DEFAULT_TIMEOUT_KEY] = parse_seconds(
+            seconds.strip(),
+        )
+    return timeouts
+
+
+def parse_slo(spec: Optional[str]) -> Optional[Dict[str, float]]:
+    """Parse a target such as `p99=0.5` or `p95=0.2,errors=1`."""
+    if spec is None:
+        return None
+    slo = {}  # type: Dict[str, float]
+    for item in spec.split(','):
+        key, _, value = item.partition('=')
+        key, value = key.strip(), value.strip()
+        if key == 'errors':
+            slo['errors'] = parse_percentage(value)
+        elif key.startswith('p'):
+            slo['percentile'] = parse_percentage(key[1:])
+            slo['latency'] = parse_seconds(value)
+        else:
+            raise ValidationError("Unknown SLO setting: " + key)
+    return slo
+
+
+def parse_time_offset(offset: Optional[str]) -> Optional[float]:
+    """Parse a time into a session, such as `90`, `30m` or `1h`."""
+    if offset is None:
+        return None
+    try:
+        return humanfriendly.parse_timespan(offset)
+    except humanfriendly.InvalidTimespan:
+        raise ValidationError("Invalid time: " + offset)
+
+
+def parse_endpoints(spec: Optional[str]) -> Optional[List[dict]]:
+    """Parse SX URLs such as `@admin` or `sx://a@node1=3,sx://b@node2`.
+
+    A URL without a weight has a weight of 1.
+    """
+    if spec is None:
+        return None
+    endpoints = []
+    for item in spec.split(','):
+        url, _, weight = item.strip().partition('=')
+        endpoints.append({
+            'url': url,
+            'weight': parse_count(weight) if weight else 1,
+        })
+    return endpoints
+
+
+def parse_namespace(spec: Optional[str]) -> Dict[str, Any]:
+    """Parse a shape such as `depth=3,fanout=4:16,name-length=12-64`."""
+    shape = {}  # type: Dict[str, Any]
+    if spec is None:
+        return shape
+    for item in spec.split(','):
+        key, _, value = item.partition('=')
+        key = key.strip().replace('-', '_')
+        value = value.strip()
+        if key == 'depth':
+            shape[key] = parse_count(value)
+        elif key == 'fanout':
+            shape[key] = [parse_count(v) for v in value.split(':')]
+        elif key == 'name_length':
+            shortest, _, longest = value.partition('-')
+            shape[key] = [
+                parse_count(shortest), parse_count(longest or shortest),
+            ]
+        elif key == 'recursive':
+            shape[key] = parse_fraction(value)
+        else:
+            shape[key] = value
+    return shape
@@ -0,0 +1,207 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Sessions split into shards and merged together, as streams of operations.
+
+import heapq
+import logging
+import math
+import os.path
+import zlib
+from itertools import count
+from typing import Callable, Iterator, List, Tuple  # noqa
+
+from sxrumble.config import Config, Session, get_session_filename
+from sxrumble.exceptions import ValidationError
+from sxrumble.operations import ALL_OPERATIONS
+from sxrumble.sessions import SessionReader, SessionWriter
+from sxrumble.validators import validate_choice
+
+
+SPLIT_KEYS = ('round-robin', 'volume', 'type', 'time')
+
+# Returns the shard of an operation and its time in that shard.
+Assigner = Callable[[dict], Tuple[int, float]]
+
+
+logger = logging.getLogger(__name__)
+
+
+def split_session(filename: str, shards: int, by: str) -> List[str]:
+    validate_choice(by, SPLIT_KEYS, 'split key')
+    if shards < 2:
+        raise ValidationError("Number of shards should be at least 2")
+
+    with SessionReader(filename) as reader:
+        config = reader.config
+        volumes = split_volumes(config.volumes, shards, by)
+        assign = get_assigner(filename, shards, by, config)
+
+    stem = os.path.splitext(filename)[0]
+    filenames = [
+        '{}-shard{}of{}.yaml'.format(stem, i + 1, shards)
+        for i in range(shards)
+    ]
+    writers = [
+        SessionWriter(name, make_shard_config(config, shards, by, v))
+        for name, v in zip(filenames, volumes)
+    ]
+    try:
+        with SessionReader(filename) as reader:
+            for operation in reader:
+                shard, time = assign(operation)
+                writers[shard].write_operation(
+                    time,
+                    operation['type'],
+                    operation['params'],
+                )
+    finally:
+        for writer in writers:
+            writer.close()
+    for name in filenames:
+        logger.info('Saved a shard to %s', name)
+    return filenames
+
+
+def split_volumes(volumes: List[str], shards: int, by: str) \
+        -> List[List[str]]:
+    if by != 'volume':
+        return [volumes] * shards
+    if len(volumes) < shards:
+        raise ValidationError(
+            "Cannot split {} volumes into {} shards"
+            .format(len(volumes), shards),
+        )
+    return [volumes[i::shards] for i in range(shards)]
+
+
+def make_shard_config(
+        config: Config, shards: int, by: str, volumes: List[str]) -> Config:
+    payload = config.serialize()
+    payload['volumes'] = volumes
+    if by != 'time':
+        # Shards are replayed side by side, each gets a part of the load.
+        payload['threads'] = int(math.ceil(config.threads / shards))
+    return Config(**payload)
+
+
+def get_assigner(filename: str, shards: int, by: str, config: Config) \
+        -> Assigner:
+    counter = count()
+
+    def round_robin(operation: dict) -> Tuple[int, float]:
+        return next(counter) % shards, operation['time']
+
+    if by == 'round-robin':
+        return round_robin
+
+    if by == 'volume':
+        volume_shards = {v: i % shards for i, v in enumerate(config.volumes)}
+
+        def by_volume(operation: dict) -> Tuple[int, float]:
+            volume = operation['params'].get('volume')
+            if volume is None:
+                return round_robin(operation)
+            if volume not in volume_shards:
+                # Created by the session, all of its operations go to the
+                # same shard. Not `hash`, which differs between runs.
+                return zlib.crc32(volume.encode()) % shards, operation['time']
+            return volume_shards[volume], operation['time']
+        return by_volume
+
+    if by == 'type':
+        type_shards = {
+            o.get_name(): i % shards for i, o in enumerate(ALL_OPERATIONS)
+        }
+        return lambda o: (type_shards[o['type']], o['time'])
+
+    # Every shard covers an equal window of the session, starting at 0.
+    window = get_last_time(filename) / shards or 1.0
+
+    def by_time(operation: dict) -> Tuple[int, float]:
+        shard = min(int(operation['time'] / window), shards - 1)
+        return shard, operation['time'] - shard * window
+    return by_time
+
+
+def get_last_time(filename: str) -> float:
+    with SessionReader(filename) as reader:
+        last = reader.read_end()
+        if last is not None:
+            return last
+        # Sessions written before the index are read through.
+        last = 0.0
+        for _, operation in reader.read_window():
+            last = operation['time']
+    return last
+
+
+def merge_sessions(filenames: List[str], output: str = None) -> None:
+    readers = [SessionReader(f) for f in filenames]
+    try:
+        config = merge_configs([r.config for r in readers])
+        if output is None:
+            output = get_session_filename(Session(config), 'yaml')
+        streams = [
+            remap_filenames(reader, i) for i, reader in enumerate(readers)
+        ]
+        writer = SessionWriter(output, config)
+        try:
+            for operation in heapq.merge(*streams, key=get_time):
+                writer.write_operation(
+                    operation['time'],
+                    operation['type'],
+                    operation['params'],
+                )
+        finally:
+            writer.close()
+    finally:
+        for reader in readers:
+            reader.close()
+    logger.info('Saved the merged session to %s', output)
+
+
+def merge_configs(configs: List[Config]) -> Config:
+    first = configs[0]
+    for config in configs[1:]:
+        if config.sx_url != first.sx_url:
+            raise ValidationError(
+                "Cannot merge sessions of different clusters: {} and {}"
+                .format(first.sx_url, config.sx_url),
+            )
+    if any(c.entropy_seed != first.entropy_seed for c in configs):
+        logger.warning(
+            'Sessions use different entropy seeds, uploads will use %s',
+            first.entropy_seed,
+        )
+
+    volumes = []  # type: List[str]
+    for config in configs:
+        volumes.extend(v for v in config.volumes if v not in volumes)
+    payload = first.serialize()
+    payload.update({
+        'volumes': volumes,
+        'threads': sum(c.threads for c in configs),
+        'min_size': min(c.min_size for c in configs),
+        'max_size': max(c.max_size for c in configs),
+        'entropy_size': max(c.entropy_size for c in configs),
+    })
+    return Config(**payload)
+
+
+def remap_filenames(operations: Iterator[dict], index: int) \
+        -> Iterator[dict]:
+    """Make the filenames of the n-th merged session unique."""
+    if index == 0:
+        yield from operations
+        return
+    suffix = '-{}'.format(index)
+    for operation in operations:
+        params = operation['params']
+        if 'filename' in params:
+            params['filename'] += suffix
+        yield operation
+
+
+def get_time(operation: dict) -> float:
+    return operation['time']
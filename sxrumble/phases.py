@@ -0,0 +1,124 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import json
+import logging
+import threading
+from array import array
+from time import monotonic
+from typing import Dict, List, Optional, TextIO  # noqa
+
+from sxrumble.stats import format_percentiles
+
+
+QUEUED, DEQUEUED, PAYLOAD_READY, SPAWNED, EXITED, REPORTED = range(6)
+PHASE_NAMES = (
+    'queued', 'dequeued', 'payload_ready', 'spawned', 'exited', 'reported',
+)
+# Name of the interval ending at the phase with the same index + 1.
+INTERVAL_NAMES = ('queue wait', 'prepare', 'spawn', 'run', 'reap')
+
+
+logger = logging.getLogger(__name__)
+
+
+class Phases:
+    """Timestamps of the stages an operation goes through in the harness."""
+
+    __slots__ = ('stamps', 'thread')
+
+    def __init__(self) -> None:
+        self.stamps = [0.0] * len(PHASE_NAMES)
+        self.thread = 0
+
+    def mark(self, phase: int, at: float = None) -> None:
+        self.stamps[phase] = monotonic() if at is None else at
+        if phase == DEQUEUED:
+            self.thread = threading.get_ident()
+
+    def response_time(self) -> float:
+        """Time from the intended start to the exit, queue wait included."""
+        return self.stamps[EXITED] - self.stamps[QUEUED]
+
+    def intervals(self) -> List[float]:
+        stamps = self.stamps
+        return [stamps[i + 1] - stamps[i] for i in range(len(INTERVAL_NAMES))]
+
+
+class PhaseReport:
+
+    def __init__(self, start_time: float, trace_file: str = None) -> None:
+        self.start_time = start_time
+        self.durations = [array('d') for _ in INTERVAL_NAMES]
+        self.trace = None  # type: Optional[TraceWriter]
+        if trace_file is not None:
+            self.trace = TraceWriter(trace_file, start_time)
+
+    def add(self, name: str, phases: Phases) -> None:
+        for durations, interval in zip(self.durations, phases.intervals()):
+            durations.append(interval)
+        if self.trace is not None:
+            self.trace.add(name, phases)
+
+    def close(self) -> None:
+        if self.trace is not None:
+            self.trace.close()
+            logger.info('Saved the harness trace to %s', self.trace.filename)
+
+    def log(self) -> None:
+        if not self.durations[0]:
+            return
+        logger.info('Harness overhead per operation phase:')
+        for name, durations in zip(INTERVAL_NAMES, self.durations):
+            logger.info(' - %-10s %s', name, format_percentiles(durations))
+
+
+class TraceWriter:
+    """Streams phases as Chrome trace events (chrome://tracing, Perfetto)."""
+
+    def __init__(self, filename: str, start_time: float) -> None:
+        self.filename = filename
+        self.start_time = start_time
+        self.file = open(filename, 'w')  # type: TextIO
+        self.file.write('{"traceEvents": [\n')
+        self.separator = ''
+
+    def add(self, name: str, phases: Phases) -> None:
+        stamps = phases.stamps
+        self.write_event(name, 'operation', stamps[0], stamps[-1], phases)
+        for i, interval in enumerate(INTERVAL_NAMES):
+            self.write_event(
+                interval, 'phase', stamps[i], stamps[i + 1], phases,
+            )
+
+    def write_event(
+            self, name: str, category: str, start: float, end: float,
+            phases: Phases) -> None:
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((start - self.start_time) * 1e6, 1),
+            'dur': round((end - start) * 1e6, 1),
+            'pid': 1,
+            'tid': phases.thread,
+        }
+        self.file.write(self.separator + json.dumps(event))
+        self.separator = ',\n'
+
+    def add_counters(
+            self, name: str, time: float, values: Dict[str, float]) -> None:
+        """Add a sample of counters, `time` seconds into the run."""
+        event = {
+            'name': name,
+            'ph': 'C',
+            'ts': round(time * 1e6, 1),
+            'pid': 1,
+            'args': values,
+        }
+        self.file.write(self.separator + json.dumps(event))
+        self.separator = ',\n'
+
+    def close(self) -> None:
+        self.file.write('\n]}\n')
+        self.file.close()
@@ -0,0 +1,226 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Datasets uploaded to the volumes before a run, batch by batch, each one
+# appended to a manifest so that an interrupted populate can be resumed.
+
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import Future  # noqa
+from time import monotonic
+from typing import Iterator, List, Set, TextIO  # noqa
+
+import humanfriendly
+
+from sxrumble.config import Config, Options, Session, get_session_filename
+from sxrumble.endpoints import EndpointSelector
+from sxrumble.operations import UploadBatch
+from sxrumble.stats import format_percentiles
+
+
+MANIFEST_VERSION = 1
+# Seconds between progress reports.
+PROGRESS_INTERVAL = 5.0
+# Batches submitted but not started yet, per thread.
+PENDING_PER_THREAD = 2
+
+logger = logging.getLogger(__name__)
+
+
+class Manifest:
+    """Batches uploaded by `populate`, read back from a manifest file."""
+
+    def __init__(self, config: dict, batches: List[dict]) -> None:
+        self.config = config
+        self.batches = batches
+
+    @property
+    def count(self) -> int:
+        return sum(len(batch['files']) for batch in self.batches)
+
+
+class ManifestWriter:
+
+    def __init__(
+            self, filename: str, config: Config, append: bool = False) \
+            -> None:
+        self.filename = filename
+        if append:
+            self.file = open(filename, 'a')  # type: TextIO
+            return
+        self.file = open(filename, 'w')
+        self.write({'version': MANIFEST_VERSION, 'config': config.serialize()})
+
+    def add(self, batch: UploadBatch) -> None:
+        self.write(batch.serialize())
+
+    def write(self, payload: dict) -> None:
+        # A line per batch, so a crash loses at most the last one.
+        self.file.write(json.dumps(payload, sort_keys=True) + '\n')
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def load_manifest(filename: str) -> Manifest:
+    try:
+        with open(filename) as f:
+            header = json.loads(f.readline())
+            batches = []
+            for line in f:
+                if not line.endswith('\n'):
+                    # Cut off by a crash.
+                    break
+                batches.append(json.loads(line))
+    except FileNotFoundError:
+        raise SystemExit("No manifest: " + filename)
+    except ValueError:
+        raise SystemExit("Invalid manifest: " + filename)
+    if header.get('version') != MANIFEST_VERSION:
+        raise SystemExit("Invalid manifest: " + filename)
+    return Manifest(header['config'], batches)
+
+
+def seed_namespace(config: Config, manifest: Manifest) -> None:
+    """Make listings target the directories of the manifest."""
+    seeded = 0
+    for batch in manifest.batches:
+        if batch['volume'] not in config.volumes:
+            continue
+        leaf = config.tree.parse_directory(batch['directory'])
+        if leaf is not None:
+            config.tree.add(batch['volume'], leaf)
+            seeded += 1
+    if manifest.batches and not seeded:
+        logger.warning(
+            'The manifest does not match the namespace or the volumes, '
+            'listings will not target its files',
+        )
+
+
+def populate(session: Session) -> None:
+    config, options = session.config, session.options
+    filename = options.manifest or get_session_filename(session, 'manifest')
+    done = 0
+    if options.resume:
+        manifest = load_manifest(filename)
+        seed_namespace(config, manifest)
+        done = manifest.count
+        logger.info('Resuming after %s uploaded files', done)
+    writer = ManifestWriter(filename, config, append=options.resume)
+    logger.info(
+        'Uploading %s files in batches of %s...',
+        max(options.populate_count - done, 0),
+        options.batch_size,
+    )
+    try:
+        progress = populate_batches(config, options, writer, done)
+    finally:
+        writer.close()
+    progress.log_summary()
+    logger.info('Saved the manifest to %s', filename)
+
+
+class Progress:
+
+    def __init__(self, total: int, done: int) -> None:
+        self.total = total
+        self.done = done
+        self.uploaded = 0
+        self.bytes = 0
+        self.failed = 0
+        self.durations = []  # type: List[float]
+        self.start = self.last_report = monotonic()
+
+    def add(self, batch: UploadBatch) -> None:
+        if batch.error_class != 'ok':
+            self.failed += 1
+            return
+        self.done += len(batch.files)
+        self.uploaded += len(batch.files)
+        self.bytes += batch.bytes
+        self.durations.append(batch.duration)
+        if monotonic() - self.last_report > PROGRESS_INTERVAL:
+            self.last_report = monotonic()
+            self.log()
+
+    def log(self) -> None:
+        elapsed = max(monotonic() - self.start, 1e-9)
+        logger.info(
+            'Uploaded %s of %s files (%.1f%%), %.1f files/s, %s/s',
+            self.done,
+            self.total,
+            100.0 * self.done / max(self.total, 1),
+            self.uploaded / elapsed,
+            humanfriendly.format_size(
+                int(self.bytes / elapsed), binary=True,
+            ),
+        )
+
+    def log_summary(self) -> None:
+        self.log()
+        if self.durations:
+            logger.info(
+                'Batches took %s', format_percentiles(self.durations),
+            )
+        if self.failed:
+            logger.warning(
+                '%s batches failed, continue with --resume to upload the '
+                'rest',
+                self.failed,
+            )
+
+
+def populate_batches(
+        config: Config, options: Options, writer: ManifestWriter,
+        done: int) -> Progress:
+    progress = Progress(options.populate_count, done)
+    pending = set()  # type: Set[Future]
+
+    def collect() -> None:
+        nonlocal pending
+        finished, pending = wait(  # type: ignore
+            pending, return_when=FIRST_COMPLETED,
+        )
+        for f in finished:
+            batch = f.result()
+            if batch.error_class == 'ok':
+                writer.add(batch)
+            progress.add(batch)
+
+    selector = EndpointSelector(config)
+    e = ThreadPoolExecutor(config.threads)
+    try:
+        for size in get_batch_sizes(
+                options.populate_count - done, options.batch_size):
+            while len(pending) >= config.threads * PENDING_PER_THREAD:
+                collect()
+            batch = UploadBatch.randomize_batch(config, size)
+            selector.assign(batch)
+            pending.add(e.submit(run_batch, batch, options))
+        while pending:
+            collect()
+    except KeyboardInterrupt:
+        logger.warning("Keyboard interrupt!")
+        logger.warning("Waiting for jobs to finish...")
+        pending = {f for f in pending if not f.cancel()}
+        while pending:
+            collect()
+    finally:
+        for f in pending:
+            f.cancel()
+        e.shutdown()
+    return progress
+
+
+def run_batch(batch: UploadBatch, options: Options) -> UploadBatch:
+    batch.run(options)
+    return batch
+
+
+def get_batch_sizes(count: int, batch_size: int) -> Iterator[int]:
+    while count > 0:
+        yield min(count, batch_size)
+        count -= batch_size
@@ -1,35 +1,88 @@
 # Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
 # License: Apache 2.0, see LICENSE for more details.
 
+import heapq
 import logging
+import random
 from concurrent.futures import (
-    Executor, ThreadPoolExecutor, Future, CancelledError, wait,
+    ThreadPoolExecutor, Future, CancelledError, wait,
     FIRST_COMPLETED,
 )
-from time import monotonic
-from typing import Tuple, Set, Iterable  # noqa
+from itertools import count
+from time import monotonic, sleep
+from typing import Dict, List, Tuple, Set, Iterable, Optional  # noqa
 
-from sxrumble.config import Session, Config, save_session_to_file
+from sxrumble.batching import UploadBatcher
+from sxrumble.concurrency import ConcurrencyController
+from sxrumble.config import Session, Config, Options, save_session_to_file
+from sxrumble.control import (
+    Controls, Gate, POLL_INTERVAL, start_control,
+)
+from sxrumble.endpoints import EndpointSelector
+from sxrumble.metrics import Metrics
 from sxrumble.operations import Operation, pick_operation
+from sxrumble.phases import QUEUED, DEQUEUED
+from sxrumble.populate import load_manifest, seed_namespace
+from sxrumble.reporting import Reporter
+from sxrumble.users import VirtualUser, create_users, load_user_model
 
 
 OperationInfo = Tuple[float, str, dict]
+# Operations submitted but not started yet at a fixed rate, per thread.
+PENDING_PER_THREAD = 64
 
 
 logger = logging.getLogger(__name__)
 
 
 def record(session: Session) -> None:
+    if session.options.manifest:
+        seed_namespace(session.config, load_manifest(session.options.manifest))
     logger.info('Recording operations...')
     # Run and record operations
     start_time = monotonic()
-    futures = start_threads_and_yield_futures(session.config)
-    operation_infos = list(pick_results(futures, start_time))
+    reporter = Reporter(session, start_time)
+    controls = Controls.for_session(session)
+    control = start_control(session, controls, reporter.metrics)
+    controller = None  # type: Optional[ConcurrencyController]
+    if session.options.slo:
+        controller = ConcurrencyController(
+            session.config.threads, session.options.slo, start_time,
+        )
+    if session.options.users:
+        model = load_user_model(session.options.user_model)
+        logger.info('Starting %s virtual users', session.options.users)
+        futures = run_users_and_yield_futures(
+            session.config, session.options, reporter.metrics, controls,
+            create_users(session.config, model, session.options.users),
+            model.ramp_up,
+        )
+    elif session.options.rate:
+        futures = schedule_and_yield_futures(
+            session.config, session.options, reporter.metrics, controls,
+        )
+    else:
+        futures = start_threads_and_yield_futures(
+            session.config, session.options, reporter.metrics, controls,
+            controller,
+        )
+    operation_infos = []
+    try:
+        for operation in pick_results(futures, start_time):
+            reporter.add(operation)
+            operation_infos.append(get_operation_info(operation))
+    finally:
+        if control is not None:
+            control.stop()
+        reporter.close()
     logger.info(
         "Ran %s operations in %.3fs",
         len(operation_infos),
         monotonic() - start_time,
     )
+    reporter.log()
+    if controller is not None:
+        controller.log()
 
     # Save the session
     serialized_operations = [
@@ -39,48 +92,219 @@ def record(session: Session) -> None:
     session.set_operations(serialized_operations)
     filename = save_session_to_file(session)
     logger.info('Saved the session to %s', filename)
+    logger.info('Saved the results to %s', reporter.results.filename)
 
 
-def start_threads_and_yield_futures(config: Config) -> Iterable[Future]:
+def start_threads_and_yield_futures(
+        config: Config, options: Options, metrics: Metrics,
+        controls: Controls, controller: ConcurrencyController = None) \
+        -> Iterable[Future]:
+    """Start an operation whenever one finishes.
+
+    Keep `controls.threads` operations running, or as many as `controller`
+    allows, none while paused.
+    """
     running = set()  # type: Set[Future]
-    e = ThreadPoolExecutor(config.threads)
+    selector = EndpointSelector(config)
+    e = ThreadPoolExecutor(controls.max_threads)
+    batcher = UploadBatcher(e, options, controls.gate)
     try:
         while True:
-            add_jobs_to_queue(config, e, running)
+            limit = 0 if controls.paused else controls.threads
+            if controller is not None:
+                limit = min(limit, controller.limit)
+            add_jobs_to_queue(
+                config, options, controls, selector, batcher, running, limit,
+                metrics,
+            )
+            if not running:
+                sleep(POLL_INTERVAL)
+                continue
+            # Time out to pick up changes of the controls.
             done, running = wait(  # type: ignore
-                running, return_when=FIRST_COMPLETED,
+                running, POLL_INTERVAL, FIRST_COMPLETED,
             )
+            if controller is not None:
+                observe(controller, done)
             yield from done
     except KeyboardInterrupt:
         logger.warning("Keyboard interrupt!")
         logger.warning("Waiting for jobs to finish...")
+        batcher.close()
+        e.shutdown()
+        yield from running
+
+
+def schedule_and_yield_futures(
+        config: Config, options: Options, metrics: Metrics,
+        controls: Controls) -> Iterable[Future]:
+    """Start operations at random arrivals, `controls.rate` per second.
+
+    Arrivals do not wait for the previous operations to finish. Each one is
+    due at its arrival, so the time it waits for a free thread counts in
+    its response time.
+    """
+    running = set()  # type: Set[Future]
+    selector = EndpointSelector(config)
+    e = ThreadPoolExecutor(controls.max_threads)
+    batcher = UploadBatcher(e, options, controls.gate)
+    start_at = monotonic()
+    try:
+        while True:
+            start_at += random.expovariate(controls.rate)
+            while True:
+                delay = start_at - monotonic()
+                if controls.paused:
+                    # Arrivals resume from when dispatching does.
+                    start_at = monotonic() + POLL_INTERVAL
+                    timeout = POLL_INTERVAL  # type: Optional[float]
+                elif len(running) >= controls.threads * PENDING_PER_THREAD:
+                    # Submitted late, but still due at `start_at`. Threads
+                    # can change through the control socket.
+                    timeout = None
+                elif delay <= 0:
+                    break
+                else:
+                    timeout = delay
+                if not running:
+                    sleep(timeout)
+                    continue
+                done, running = wait(  # type: ignore
+                    running, timeout, FIRST_COMPLETED,
+                )
+                yield from done
+            operation = pick_operation(config, controls.weights)
+            selector.assign(operation)
+            operation.phases.mark(QUEUED, start_at)
+            running.add(batcher.submit(
+                operation, record_operation, operation, options,
+                controls.gate,
+            ))
+            metrics.dispatched += 1
+    except KeyboardInterrupt:
+        logger.warning("Keyboard interrupt!")
+        logger.warning("Waiting for jobs to finish...")
+        batcher.close()
+        e.shutdown()
+        yield from running
+
+
+def run_users_and_yield_futures(
+        config: Config, options: Options, metrics: Metrics,
+        controls: Controls, users: List[VirtualUser], ramp_up: float) \
+        -> Iterable[Future]:
+    """Start the operation of each user when it is done thinking.
+
+    Users wait in a heap ordered by when they are due, and only the
+    operations run on threads. A user is due again after its operation
+    finished and it thought for a while.
+    """
+    running = {}  # type: Dict[Future, VirtualUser]
+    e = ThreadPoolExecutor(controls.max_threads)
+    batcher = UploadBatcher(e, options, controls.gate)
+    # Breaks ties, users are not ordered.
+    order = count()
+    resumed_at = now = monotonic()
+    due = [
+        (now + random.uniform(0, ramp_up), next(order), user)
+        for user in users
+    ]  # type: List[Tuple[float, int, VirtualUser]]
+    heapq.heapify(due)
+    try:
+        while True:
+            delay = due[0][0] - monotonic() if due else POLL_INTERVAL
+            if controls.paused:
+                # Users due meanwhile are not late.
+                resumed_at = monotonic()
+            if delay > 0 or controls.paused:
+                timeout = POLL_INTERVAL if controls.paused \
+                    else min(max(delay, 0), POLL_INTERVAL)
+                if not running:
+                    sleep(timeout)
+                    continue
+                done, _ = wait(running, timeout, FIRST_COMPLETED)
+                for f in done:
+                    user = running.pop(f)
+                    think = user.advance()
+                    heapq.heappush(
+                        due, (monotonic() + think, next(order), user),
+                    )
+                yield from done
+                continue
+            start_at, _, user = heapq.heappop(due)
+            start_at = max(start_at, resumed_at)
+            operation = user.create_operation()
+            if operation is None:
+                think = user.advance()
+                heapq.heappush(due, (start_at + think, next(order), user))
+                continue
+            operation.phases.mark(QUEUED, start_at)
+            future = batcher.submit(
+                operation, record_operation, operation, options,
+                controls.gate,
+            )
+            running[future] = user
+            metrics.dispatched += 1
+    except KeyboardInterrupt:
+        logger.warning("Keyboard interrupt!")
+        logger.warning("Waiting for jobs to finish...")
+        # Thousands of users may be waiting for a thread.
+        for f in running:
+            f.cancel()
+        batcher.close()
         e.shutdown()
         yield from running
 
 
 def add_jobs_to_queue(
-        config: Config, e: Executor, running: Set[Future]) -> None:
-    while len(running) < config.threads:
-        operation = pick_operation(config)
-        future = e.submit(record_operation, operation)
+        config: Config, options: Options, controls: Controls,
+        selector: EndpointSelector, batcher: UploadBatcher,
+        running: Set[Future], limit: int, metrics: Metrics) -> None:
+    # Batched uploads share a thread.
+    while len(running) - batcher.coalesced < limit:
+        operation = pick_operation(config, controls.weights)
+        selector.assign(operation)
+        operation.phases.mark(QUEUED)
+        future = batcher.submit(
+            operation, record_operation, operation, options, controls.gate,
+        )
         running.add(future)
+        metrics.dispatched += 1
 
 
-def record_operation(operation: Operation) -> OperationInfo:
-    started_at = monotonic()
-    operation.run()
-    return started_at, operation.get_name(), operation.serialize()
+def observe(controller: ConcurrencyController, done: Set[Future]) -> None:
+    for f in done:
+        if not f.cancelled() and f.exception() is None:
+            controller.add(f.result())
+    controller.update()
+
+
+def record_operation(
+        operation: Operation, options: Options, gate: Gate) -> Operation:
+    with gate:
+        operation.phases.mark(DEQUEUED)
+        operation.run(options)
+    return operation
 
 
 def pick_results(futures: Iterable[Future], start_time: float) \
-        -> Iterable[OperationInfo]:
+        -> Iterable[Operation]:
     for f in futures:
         try:
-            yield f.result()
+            operation = f.result()
         except CancelledError:
-            pass
+            continue
         except:
             logger.error('Internal error!', exc_info=True)
+            continue
+        yield operation
+
+
+def get_operation_info(operation: Operation) -> OperationInfo:
+    # Replays start operations when they were due, not when a thread
+    # picked them up.
+    started_at = operation.phases.stamps[QUEUED]
+    return started_at, operation.get_name(), operation.serialize()
 
 
 def serialize_operation_info(time_offset: float, info: OperationInfo) -> dict:
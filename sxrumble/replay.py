@@ -2,76 +2,258 @@
 # License: Apache 2.0, see LICENSE for more details.
 
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from concurrent.futures import Future  # noqa
+from itertools import chain
 from time import monotonic, sleep
-from typing import List, Tuple
+from typing import Dict, Iterable, Iterator, Optional, Tuple  # noqa
 
-from sxrumble.config import Session, Config
+from sxrumble.batching import UploadBatcher
+from sxrumble.checkpoint import (
+    Checkpoint, CHECKPOINT_INTERVAL, get_checkpoint_filename,
+)
+from sxrumble.config import Session, Config, Options, get_session_filename
+from sxrumble.control import Controls, Gate, POLL_INTERVAL, start_control
+from sxrumble.endpoints import EndpointSelector
 from sxrumble.operations import OPERATIONS_BY_NAME, Operation
+from sxrumble.phases import QUEUED, DEQUEUED
+from sxrumble.reporting import Reporter
+from sxrumble.sessions import SessionReader
+
+
+# Operations starting later than this are reported, in seconds.
+LATE_THRESHOLD = 0.01
+# Operations submitted but not started yet, per thread.
+PENDING_PER_THREAD = 64
 
 
 logger = logging.getLogger(__name__)
-OperationAndDelay = Tuple[Operation, float]
-OperationsAndDelays = List[OperationAndDelay]
+# (index, operation, time)
+IndexedOperation = Tuple[int, Operation, float]
+
+
+class SessionClock:
+    """Maps times of the session to times of the replay.
+
+    The clock runs `speed` times as fast as the session did, and stands
+    still at speed 0. A change of speed only affects the operations due
+    after it.
+    """
+
+    def __init__(self, session: float, wall: float) -> None:
+        # Where the session was at `wall`.
+        self.session = session
+        self.wall = wall
+        self.speed = 1.0
+
+    def set_speed(self, speed: float, now: float) -> None:
+        if speed == self.speed:
+            return
+        self.session += (now - self.wall) * self.speed
+        self.wall = now
+        self.speed = speed
+
+    def due_at(self, time: float) -> float:
+        if not self.speed:
+            return float('inf')
+        return self.wall + (time - self.session) / self.speed
 
 
 def replay(session: Session) -> None:
-    if not session.operations:
+    options = session.options
+    checkpoint = get_checkpoint(session)
+    # Operations due before the checkpoint have all finished.
+    start = max(checkpoint.window_start, checkpoint.time)
+    operations = get_operations(
+        session, checkpoint, start, checkpoint.window_end,
+    )
+    first = next(operations, None)
+    if first is None:
         raise SystemExit("No operations found!")
-
-    logging.info("Preparing operations")
-    operations_and_delays = get_operations_and_delays(session)
+    if not options.resume:
+        # Operations before the window count as finished, so that the
+        # checkpoint moves on from the first one in it.
+        checkpoint.index = first[0] - 1
+        checkpoint.time = start
 
     logging.info("Replaying saved operations")
-    start_time = monotonic()
-    replay_operations(
-        session.config,
-        operations_and_delays,
-        start_time,
-    )
+    began = monotonic()
+    # The timeline is re-anchored, so that the first operation of the window
+    # or the first one after the checkpoint starts right away.
+    start_time = began - start
+    if session.options.resume:
+        logger.info(
+            "Resuming after operation %s, %.3fs into the session",
+            checkpoint.index + 1,
+            checkpoint.time,
+        )
+        reporter = Reporter(
+            session, start_time, checkpoint.results, checkpoint.results_size,
+        )
+    else:
+        reporter = Reporter(session, start_time, checkpoint.results)
+    end = get_schedule_end(session, checkpoint.window_end)
+    if end is not None:
+        reporter.metrics.schedule = start, end
+    controls = Controls.for_session(session, replay=True)
+    control = start_control(session, controls, reporter.metrics)
+    try:
+        completed = replay_operations(
+            session.config,
+            session.options,
+            chain([first], operations),
+            SessionClock(start, began),
+            reporter,
+            checkpoint,
+            controls,
+        )
+    finally:
+        if control is not None:
+            control.stop()
+        reporter.close()
+    if completed:
+        checkpoint.remove()
+    else:
+        logger.warning(
+            "Saved a checkpoint to %s, continue with --resume",
+            checkpoint.filename,
+        )
     logger.info(
         "Ran %s operations in %.3fs",
-        len(session.operations),
-        monotonic() - start_time,
+        reporter.count,
+        monotonic() - began,
+    )
+    reporter.log()
+    logger.info('Saved the results to %s', reporter.results.filename)
+
+
+def get_schedule_end(session: Session, window_end: Optional[float]) \
+        -> Optional[float]:
+    """When the last operation of the replay is due, if known."""
+    with SessionReader(session.filename) as reader:
+        end = reader.read_end()
+    if window_end is None or end is None:
+        return end if window_end is None else window_end
+    return min(end, window_end)
+
+
+def get_checkpoint(session: Session) -> Checkpoint:
+    filename = get_checkpoint_filename(session.filename)
+    options = session.options
+    if options.resume:
+        return Checkpoint.load(filename)
+    return Checkpoint(
+        filename,
+        get_session_filename(session, 'results'),
+        window_start=options.window_start,
+        window_end=options.window_end,
     )
 
 
 def replay_operations(
         config: Config,
-        operations_and_delays: OperationsAndDelays,
-        start_time: float,
-) -> None:
-    futures = []  # type: List[Future]
-    with ThreadPoolExecutor(config.threads) as e:
-        for operation, delay in operations_and_delays:
-            future = e.submit(
-                replay_operation,
-                config,
-                operation,
-                start_time + delay,
-            )  # type: Future
-            futures.append(future)
-    for f in futures:
-        f.result()  # Raise errors, if any.
-
-
-def replay_operation(config: Config, operation: Operation, start_at: float) \
-        -> None:
-    time_left = start_at - monotonic()
-    if time_left < 0:
-        logger.warning('%s starts %.3fs late', operation.get_name(), time_left)
-    else:
-        sleep(time_left)
-    operation.run()
+        options: Options,
+        operations: Iterable[IndexedOperation],
+        clock: SessionClock,
+        reporter: Reporter,
+        checkpoint: Checkpoint,
+        controls: Controls,
+) -> bool:
+    """Start every operation when due and report it when finished.
+
+    Waits are cut short to pick up changes of the speed, and of pauses.
+    Return whether all of the operations have finished.
+    """
+    pending = {}  # type: Dict[Future, Tuple[int, float]]
+    last_save = monotonic()
+
+    def collect(timeout: float = None) -> None:
+        nonlocal last_save
+        done, _ = wait(pending, timeout, FIRST_COMPLETED)
+        for f in done:
+            index, time = pending.pop(f)
+            reporter.add(f.result())  # Raise errors, if any.
+            checkpoint.complete(index, time)
+        if monotonic() - last_save > CHECKPOINT_INTERVAL:
+            save_checkpoint(checkpoint, reporter)
+            last_save = monotonic()
+
+    e = ThreadPoolExecutor(controls.max_threads)
+    batcher = UploadBatcher(e, options, controls.gate, LATE_THRESHOLD)
+    try:
+        for index, operation, time in operations:
+            while True:
+                clock.set_speed(
+                    0.0 if controls.paused else controls.speed, monotonic(),
+                )
+                start_at = clock.due_at(time)
+                delay = start_at - monotonic()
+                if len(pending) >= controls.threads * PENDING_PER_THREAD:
+                    collect(POLL_INTERVAL)
+                elif delay <= 0:
+                    break
+                elif pending:
+                    collect(min(delay, POLL_INTERVAL))
+                else:
+                    sleep(min(delay, POLL_INTERVAL))
+            # The operation is due at `start_at`, anything past that is
+            # queue wait.
+            operation.phases.mark(QUEUED, start_at)
+            future = batcher.submit(
+                operation, replay_operation, options, operation, start_at,
+                controls.gate,
+            )
+            pending[future] = index, time
+            reporter.metrics.dispatched += 1
+            reporter.metrics.due = time
+        while pending:
+            collect()
+    except KeyboardInterrupt:
+        logger.warning("Keyboard interrupt!")
+        logger.warning("Waiting for jobs to finish...")
+        for f in list(pending):
+            if f.cancel():
+                del pending[f]
+        while pending:
+            collect()
+        return False
+    finally:
+        for f in pending:
+            f.cancel()
+        batcher.close()
+        e.shutdown()
+        save_checkpoint(checkpoint, reporter)
+    return True
+
+
+def save_checkpoint(checkpoint: Checkpoint, reporter: Reporter) -> None:
+    reporter.results.flush()
+    checkpoint.save(reporter.results.tell())
+
+
+def replay_operation(
+        options: Options, operation: Operation, start_at: float,
+        gate: Gate) -> Operation:
+    with gate:
+        operation.phases.mark(DEQUEUED)
+        late = operation.phases.stamps[DEQUEUED] - start_at
+        if late > LATE_THRESHOLD:
+            logger.warning('%s starts %.3fs late', operation.get_name(), late)
+        operation.run(options)
+    return operation
 
 
-def get_operations_and_delays(session: Session) -> OperationsAndDelays:
-    results = []  # type: OperationsAndDelays
-    for info in session.operations or []:
-        operation = deserialize_operation(session.config, info)
-        results.append((operation, info['time']))
-    return results
+def get_operations(
+        session: Session, checkpoint: Checkpoint, start: float,
+        end: float = None) -> Iterator[IndexedOperation]:
+    selector = EndpointSelector(session.config)
+    with SessionReader(session.filename) as reader:
+        for index, info in reader.read_window(start, end):
+            if checkpoint.is_done(index):
+                continue
+            operation = deserialize_operation(session.config, info)
+            selector.assign(operation)
+            yield index, operation, info['time']
 
 
 def deserialize_operation(config: Config, info: dict) -> Operation:
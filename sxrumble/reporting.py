@@ -0,0 +1,264 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Everything done with an operation once it has finished.
+
+import logging
+from array import array
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional  # noqa
+
+import humanfriendly
+
+from sxrumble.config import Session, get_session_filename
+from sxrumble.dashboard import Dashboard
+from sxrumble.exposition import MetricsServer, TextfileWriter
+from sxrumble.hostmonitor import (
+    HostMonitor, get_host_filename, start_host_monitor,
+)
+from sxrumble.metrics import Metrics
+from sxrumble.operations import Operation, ALL_OPERATIONS
+from sxrumble.phases import (
+    PhaseReport, TraceWriter, DEQUEUED, EXITED, REPORTED,
+)
+from sxrumble.results import ResultsWriter, load_results
+from sxrumble.stats import format_percentiles
+from sxrumble.steady import log_steady_state
+
+
+logger = logging.getLogger(__name__)
+
+
+class TypeSummary:
+
+    def __init__(self) -> None:
+        self.errors = Counter()  # type: Counter
+        self.retries = 0
+        # Service times, from the start of the command.
+        self.durations = array('d')
+        # From the intended start, which counts the time spent waiting for
+        # a thread under overload.
+        self.response_times = array('d')
+        self.entries = array('q')
+        # Only for operations which listed something.
+        self.entry_latencies = array('d')
+
+
+class EndpointSummary:
+
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.failed = 0
+        self.bytes = 0
+        self.durations = array('d')
+        self.first_start = float('inf')
+        self.last_end = float('-inf')
+
+    def add(self, operation: Operation) -> None:
+        stamps = operation.phases.stamps
+        self.first_start = min(self.first_start, stamps[DEQUEUED])
+        self.last_end = max(self.last_end, stamps[EXITED])
+        if operation.error_class != 'ok':
+            self.failed += 1
+            return
+        self.bytes += operation.bytes
+        self.durations.append(operation.duration)
+
+    def span(self) -> float:
+        return max(self.last_end - self.first_start, 0.0)
+
+
+class RunSummary:
+    """Outcome of the operations of a run, by type and by endpoint."""
+
+    def __init__(self, endpoints: List[str] = None) -> None:
+        self.types = OrderedDict(
+            (o.get_name(), TypeSummary()) for o in ALL_OPERATIONS
+        )  # type: Dict[str, TypeSummary]
+        self.endpoints = [
+            EndpointSummary(url) for url in endpoints or []
+        ]  # type: List[EndpointSummary]
+
+    def add(self, operation: Operation) -> None:
+        if self.endpoints:
+            self.endpoints[operation.endpoint].add(operation)
+        summary = self.types[operation.get_name()]
+        summary.retries += operation.retries
+        if operation.error_class != 'ok':
+            summary.errors[operation.error_class] += 1
+            return
+        summary.durations.append(operation.duration)
+        summary.response_times.append(operation.phases.response_time())
+        if operation.lists_entries:
+            summary.entries.append(operation.entries)
+            if operation.entries:
+                summary.entry_latencies.append(
+                    operation.duration / operation.entries,
+                )
+
+    def log(self) -> None:
+        self.log_types()
+        # A single endpoint would only repeat the totals.
+        if len(self.endpoints) > 1:
+            self.log_endpoints()
+
+    def log_types(self) -> None:
+        if not any(s.durations or s.errors for s in self.types.values()):
+            return
+        logger.info('Operations by type:')
+        for name, summary in self.types.items():
+            if not summary.durations and not summary.errors:
+                continue
+            logger.info(
+                ' - %-14s %d ok, %d failed, %d retries',
+                name,
+                len(summary.durations),
+                sum(summary.errors.values()),
+                summary.retries,
+            )
+            if summary.durations:
+                logger.info(
+                    '   %-14s service  %s',
+                    '',
+                    format_percentiles(summary.durations),
+                )
+                logger.info(
+                    '   %-14s response %s',
+                    '',
+                    format_percentiles(summary.response_times),
+                )
+            if summary.errors:
+                logger.info(
+                    '   %-14s errors %s',
+                    '',
+                    ', '.join(
+                        '{}={}'.format(error_class, count)
+                        for error_class, count in sorted(
+                            summary.errors.items(),
+                        )
+                    ),
+                )
+            if summary.entries:
+                logger.info(
+                    '   %-14s entries %s',
+                    '',
+                    format_percentiles(summary.entries, '', digits=0),
+                )
+            if summary.entry_latencies:
+                logger.info(
+                    '   %-14s per entry %s',
+                    '',
+                    format_percentiles(
+                        summary.entry_latencies, 'ms', 1000, 3,
+                    ),
+                )
+
+    def log_endpoints(self) -> None:
+        logger.info('Operations by endpoint:')
+        for summary in self.endpoints:
+            span = summary.span()
+            count = len(summary.durations) + summary.failed
+            logger.info(
+                ' - %s %d ok, %d failed, %.1f ops/s, %s/s, %s',
+                summary.url,
+                len(summary.durations),
+                summary.failed,
+                count / span if span else 0.0,
+                humanfriendly.format_size(
+                    int(summary.bytes / span) if span else 0, binary=True,
+                ),
+                format_percentiles(summary.durations),
+            )
+
+
+class Reporter:
+    """Feeds finished operations to the reports and the results file."""
+
+    def __init__(
+            self, session: Session, start_time: float,
+            results_filename: str = None, resume_at: int = None) -> None:
+        self.phases = PhaseReport(start_time, session.options.trace_file)
+        self.results = ResultsWriter(
+            results_filename or get_session_filename(session, 'results'),
+            start_time,
+            session.config,
+            resume_at,
+        )
+        self.summary = RunSummary(
+            [e['url'] for e in session.config.endpoints],
+        )
+        self.options = session.options
+        self.metrics = Metrics(start_time)
+        # Read the metrics in threads of their own.
+        self.views = get_views(session, self.metrics)
+        for view in self.views:
+            view.start()
+        self.host = start_host_monitor(
+            self.metrics,
+            start_time,
+            session.options.host_interval,
+            # A resume adds to the samples of the interrupted run.
+            get_host_filename(self.results.filename),
+            append=resume_at is not None,
+        )  # type: Optional[HostMonitor]
+        self.count = 0
+
+    def add(self, operation: Operation) -> None:
+        operation.phases.mark(REPORTED)
+        self.phases.add(operation.get_name(), operation.phases)
+        self.results.add(operation)
+        self.summary.add(operation)
+        self.metrics.add(operation)
+        self.count += 1
+
+    def close(self) -> None:
+        for view in self.views:
+            view.stop()
+        if self.host is not None:
+            self.host.stop()
+            if self.phases.trace is not None:
+                add_host_counters(self.phases.trace, self.host)
+        self.phases.close()
+        self.results.close()
+
+    def log(self) -> None:
+        self.summary.log()
+        self.phases.log()
+        options = self.options
+        # The summary already covers the whole run.
+        if options.warm_up or options.cool_down or options.steady_state:
+            log_steady_state(
+                load_results(self.results.filename),
+                options.warm_up,
+                options.cool_down,
+                options.steady_state,
+            )
+        if self.host is not None:
+            self.host.log()
+
+
+def add_host_counters(trace: TraceWriter, host: HostMonitor) -> None:
+    """Show the host along the operations of the trace."""
+    for sample in host.samples:
+        trace.add_counters('host CPU', sample.time, {
+            'host': round(sample.cpu * 100, 1),
+            'sxrumble': round(sample.process_cpu * 100, 1),
+        })
+        trace.add_counters('host load', sample.time, {'load': sample.load})
+        trace.add_counters('host network', sample.time, {
+            'in': round(sample.rx_bytes), 'out': round(sample.tx_bytes),
+        })
+
+
+def get_views(session: Session, metrics: Metrics) -> List[Any]:
+    options = session.options
+    views = []  # type: List[Any]
+    if options.metrics_address is not None:
+        views.append(MetricsServer(metrics, options.metrics_address))
+    if options.metrics_file is not None:
+        views.append(TextfileWriter(
+            metrics, options.metrics_file, options.metrics_interval,
+        ))
+    if options.dashboard:
+        views.append(Dashboard(metrics))
+    return views
@@ -0,0 +1,213 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Per-operation results in a columnar file: a magic line, a JSON header
+# line, then blocks of a little-endian uint32 count and a raw array per
+# column.
+
+import json
+import struct
+import sys
+from array import array
+from itertools import compress
+from time import time
+from typing import BinaryIO, Dict, List, Tuple  # noqa
+
+from sxrumble.config import Config
+from sxrumble.operations import Operation, ALL_OPERATIONS, ERROR_CLASSES
+from sxrumble.phases import QUEUED, DEQUEUED, EXITED
+
+
+MAGIC = b'SXRUMBLE-RESULTS 1\n'
+BLOCK_SIZE = 4096
+BLOCK_HEADER = struct.Struct('<I')
+
+COLUMNS = (
+    ('intended_start', 'd'),
+    ('start', 'd'),
+    ('end', 'd'),
+    ('duration', 'd'),
+    ('type', 'B'),
+    ('volume', 'h'),
+    ('endpoint', 'H'),
+    ('bytes', 'q'),
+    ('entries', 'q'),
+    ('retries', 'H'),
+    ('exit_code', 'i'),
+    ('error_class', 'B'),
+)  # type: Tuple[Tuple[str, str], ...]
+
+NO_VOLUME = -1
+
+
+class ResultsWriter:
+    """Streams the outcome of every operation of a run to a file."""
+
+    def __init__(
+            self, filename: str, start_time: float, config: Config,
+            resume_at: int = None) -> None:
+        """Create a results file, or append to one cut at `resume_at`."""
+        self.filename = filename
+        self.start_time = start_time
+        self.types = {o.get_name(): i for i, o in enumerate(ALL_OPERATIONS)}
+        self.volumes = {v: i for i, v in enumerate(config.volumes)}
+        self.error_classes = {c: i for i, c in enumerate(ERROR_CLASSES)}
+        # Integer and float columns alike.
+        self.columns = [
+            array(code, bytes(array(code).itemsize * BLOCK_SIZE))
+            for _, code in COLUMNS
+        ]  # type: List[array]
+        self.count = 0
+        if resume_at is not None:
+            self.file = open_for_append(filename, resume_at)
+            return
+        self.file = open(filename, 'wb')
+        self.file.write(MAGIC)
+        header = {
+            'columns': COLUMNS,
+            'types': [o.get_name() for o in ALL_OPERATIONS],
+            'volumes': config.volumes,
+            'endpoints': [e['url'] for e in config.endpoints],
+            'error_classes': ERROR_CLASSES,
+            'started_at': time(),
+        }
+        self.file.write(json.dumps(header).encode() + b'\n')
+
+    def add(self, operation: Operation) -> None:
+        i = self.count
+        stamps = operation.phases.stamps
+        (intended_start, start, end, duration, type_, volume, endpoint,
+         bytes_, entries, retries, exit_code, error_class) = self.columns
+        intended_start[i] = stamps[QUEUED] - self.start_time
+        start[i] = stamps[DEQUEUED] - self.start_time
+        end[i] = stamps[EXITED] - self.start_time
+        duration[i] = operation.duration
+        type_[i] = self.types[operation.get_name()]
+        volume[i] = self.volumes.get(
+            getattr(operation, 'volume', None),
+            NO_VOLUME,
+        )
+        endpoint[i] = operation.endpoint
+        bytes_[i] = operation.bytes
+        entries[i] = operation.entries
+        retries[i] = min(operation.retries, 0xffff)
+        exit_code[i] = operation.returncode or 0
+        error_class[i] = self.error_classes[operation.error_class]
+        self.count += 1
+        if self.count == BLOCK_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        if self.count == 0:
+            return
+        self.file.write(BLOCK_HEADER.pack(self.count))
+        for column in self.columns:
+            if sys.byteorder == 'big':
+                column.byteswap()
+            self.file.write(memoryview(column)[:self.count])
+            if sys.byteorder == 'big':
+                column.byteswap()
+        self.file.flush()
+        self.count = 0
+
+    def tell(self) -> int:
+        """Size of the file, once flushed."""
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.flush()
+        self.file.close()
+
+
+def open_for_append(filename: str, size: int) -> BinaryIO:
+    f = open(filename, 'r+b')
+    if f.readline() != MAGIC:
+        f.close()
+        raise SystemExit("{} is not a results file".format(filename))
+    header = json.loads(f.readline().decode())
+    if [tuple(c) for c in header['columns']] != list(COLUMNS):
+        f.close()
+        raise SystemExit(
+            "{} was written by another version".format(filename),
+        )
+    f.truncate(size)
+    f.seek(size)
+    return f
+
+
+class Results:
+    """Outcomes of a run, one array per column."""
+
+    def __init__(self, header: dict, columns: Dict[str, array]) -> None:
+        self.header = header
+        self.columns = columns
+        self.type_names = header['types']  # type: List[str]
+        self.volume_names = header['volumes']  # type: List[str]
+        self.endpoint_names = header.get('endpoints', [])  # type: List[str]
+        self.error_class_names = header['error_classes']  # type: List[str]
+
+    def __len__(self) -> int:
+        return len(self.columns['type'])
+
+    def __getitem__(self, column: str) -> array:
+        return self.columns[column]
+
+    def span(self) -> float:
+        if not len(self):
+            return 0.0
+        return max(self['end']) - min(self['start'])
+
+    def window(self, start: float, end: float) -> 'Results':
+        """Operations which started from `start` to `end` into the run."""
+        selected = [start <= s < end for s in self['start']]
+        return Results(self.header, {
+            name: array(column.typecode, compress(column, selected))
+            for name, column in self.columns.items()
+        })
+
+    def throughput(self) -> float:
+        span = self.span()
+        return len(self) / span if span > 0 else 0.0
+
+    def durations_by_type(self) -> Dict[str, array]:
+        """Durations of the successful operations of each type."""
+        grouped = {}  # type: Dict[str, array]
+        for type_, duration, error_class in zip(
+                self['type'], self['duration'], self['error_class']):
+            if error_class != 0:
+                continue
+            name = self.type_names[type_]
+            if name not in grouped:
+                grouped[name] = array('d')
+            grouped[name].append(duration)
+        return grouped
+
+
+def load_results(filename: str) -> Results:
+    with open(filename, 'rb') as f:
+        if f.readline() != MAGIC:
+            raise SystemExit("{} is not a results file".format(filename))
+        header = json.loads(f.readline().decode())
+        columns = {name: array(code) for name, code in header['columns']}
+        read_blocks(f, [columns[name] for name, _ in header['columns']])
+    # A run that crashed may leave an incomplete block behind.
+    count = min(len(c) for c in columns.values())
+    for column in columns.values():
+        del column[count:]
+        if sys.byteorder == 'big':
+            column.byteswap()
+    return Results(header, columns)
+
+
+def read_blocks(f: BinaryIO, columns: List[array]) -> None:
+    while True:
+        block_header = f.read(BLOCK_HEADER.size)
+        if len(block_header) < BLOCK_HEADER.size:
+            return
+        count, = BLOCK_HEADER.unpack(block_header)
+        for column in columns:
+            size = column.itemsize * count
+            data = f.read(size)
+            if len(data) < size:
+                return
+            column.frombytes(data)
@@ -4,12 +4,13 @@
 import logging
 import os.path
 import subprocess
+from collections import OrderedDict
 from functools import wraps
 from typing import Callable
 
 from sxrumble import get_name_and_version
-from sxrumble import record, replay
-from sxrumble.operations import get_random_bytes
+from sxrumble import populate, record, replay, spawner
+from sxrumble.operations import get_random_bytes, remove_churn
 from sxrumble.config import (
     ENTROPY_FILE_PATH, Session,
 )
@@ -18,10 +19,10 @@ from sxrumble.config import (
 logger = logging.getLogger(__name__)
 
 
-def make_runner(func: Callable) -> Callable:
+def make_runner(func: Callable, empty_volumes: bool = True) -> Callable:
     @wraps(func)
     def run(session: Session) -> None:
-        setup(session)
+        setup(session, empty_volumes)
         try:
             func(session)
         except SystemExit:
@@ -35,25 +36,55 @@ def make_runner(func: Callable) -> Callable:
 
 record_session = make_runner(record.record)
 replay_session = make_runner(replay.replay)
+populate_session = make_runner(populate.populate, empty_volumes=False)
 
 
-def setup(session: Session) -> None:
+def setup(session: Session, empty_volumes: bool = True) -> None:
     logger.info(
         '%s, using %s threads',
         get_name_and_version(),
         session.config.threads,
     )
-    logging.info("Emptying the volumes...")
-    cleanup_volumes(session)
+    if len(session.config.endpoints) > 1:
+        logger.info(
+            'Spreading operations over %s endpoints, %s',
+            len(session.config.endpoints),
+            session.config.endpoint_policy,
+        )
+    if not empty_volumes:
+        pass
+    elif session.options.resume:
+        logger.info("Resuming, the volumes are kept")
+    elif session.options.manifest:
+        logger.info(
+            "Using the files of %s, the volumes are kept",
+            session.options.manifest,
+        )
+    else:
+        logging.info("Emptying the volumes...")
+        cleanup_volumes(session)
 
     logger.info('Preparing the entropy file...')
     prepare_entropy_file(session)
 
+    if session.options.spawn_server:
+        start_spawn_server()
+
 
 def cleanup(session: Session) -> None:
+    remove_churn(session.config, session.options)
+    spawner.stop()
     os.remove(ENTROPY_FILE_PATH)
 
 
+def start_spawn_server() -> None:
+    if not spawner.is_supported():
+        logger.warning('posix_spawn is not available, not using the spawner')
+        return
+    logger.info('Starting the spawn server...')
+    spawner.start()
+
+
 def prepare_entropy_file(session: Session) -> None:
     contents = get_random_bytes(
         session.config.entropy_size,
@@ -64,8 +95,12 @@ def prepare_entropy_file(session: Session) -> None:
 
 
 def cleanup_volumes(session: Session) -> None:
-    for volume in session.config.volumes:
-        path = os.path.join(session.config.sx_url, volume, '*')
-        output = subprocess.check_output(['sxls', path])
-        if output:
-            subprocess.check_call(['sxrm', path])
+    # Endpoints may be different clusters, or the same one more than once.
+    urls = OrderedDict((e['url'], None) for e in session.config.endpoints)
+    for url in urls:
+        for volume in session.config.volumes:
+            path = os.path.join(url, volume, '*')
+            output = subprocess.check_output(['sxls', path])
+            if output:
+                # Files of a namespace are in directories.
+                subprocess.check_call(['sxrm', '-r', path])
@@ -0,0 +1,212 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Session files, written and read one operation at a time. A sparse index
+# of `[time, offset, number]` entries follows the operations, and the last
+# line gives its offset.
+
+import json
+import os
+import re
+from bisect import bisect_left
+from typing import Any, Iterator, List, Optional, TextIO, Tuple  # noqa
+
+import yaml
+
+from sxrumble.config import Config
+from sxrumble.exceptions import ValidationError
+
+
+INDEX_STRIDE = 256 * 1024
+INDEX_TRAILER = re.compile(rb'# index: (\d+)\n$')
+TIME_PATTERN = re.compile(r'"time": ([0-9.e+-]+)')
+
+# (time, offset, number)
+IndexEntry = Tuple[float, int, int]
+
+
+class SessionWriter:
+    """Writes a session file one operation at a time.
+
+    Operations are written as one JSON flow mapping per line, which is valid
+    YAML, so the file can still be loaded with `Session.from_file`.
+    """
+
+    def __init__(self, filename: str, config: Config) -> None:
+        self.filename = filename
+        # ASCII only, so character and byte offsets are the same.
+        self.file = open(filename, 'w', encoding='ascii')  # type: TextIO
+        yaml.safe_dump(
+            {'config': config.serialize()},
+            self.file,
+            default_flow_style=False,
+        )
+        self.file.write('operations:\n')
+        self.offset = self.file.tell()
+        self.count = 0
+        self.next_entry = self.offset
+        self.index = []  # type: List[IndexEntry]
+
+    def write_operation(self, time: float, type_: str, params: dict) -> None:
+        line = format_operation(time, type_, params)
+        if self.offset >= self.next_entry:
+            self.add_entry(time, self.offset, self.count)
+        self.file.write(line)
+        self.offset += len(line)
+        self.count += 1
+
+    def write_lines(self, lines: str) -> None:
+        """Write operations already formatted with `format_operation`."""
+        count, counted = self.count, 0
+        while self.next_entry < self.offset + len(lines):
+            # Index the first operation starting at or past the stride.
+            position = max(self.next_entry - self.offset, 0)
+            if position > 0 and lines[position - 1] != '\n':
+                position = lines.find('\n', position) + 1
+                if position in (0, len(lines)):
+                    break
+            count += lines.count('\n', counted, position)
+            counted = position
+            end = lines.find('\n', position)
+            if end < 0:
+                end = len(lines)
+            match = TIME_PATTERN.search(lines, position, end)
+            if match is None:
+                raise ValueError(
+                    "Not an operation: " + lines[position:end],
+                )
+            time = float(match.group(1))
+            self.add_entry(time, self.offset + position, count)
+        self.file.write(lines)
+        self.offset += len(lines)
+        self.count += lines.count('\n')
+
+    def add_entry(self, time: float, offset: int, number: int) -> None:
+        self.index.append((time, offset, number))
+        self.next_entry = offset + INDEX_STRIDE
+
+    def close(self) -> None:
+        self.file.write('index:\n')
+        for entry in self.index:
+            self.file.write('- [{:.6f}, {}, {}]\n'.format(*entry))
+        self.file.write('# index: {}\n'.format(self.offset))
+        self.file.close()
+
+
+def format_operation(time: float, type_: str, params: dict) -> str:
+    return '- {{"params": {}, "time": {:.6f}, "type": "{}"}}\n'.format(
+        json.dumps(params, sort_keys=True),
+        time,
+        type_,
+    )
+
+
+class SessionReader:
+    """Reads a session file one operation at a time.
+
+    Both the line-per-operation format of `SessionWriter` and the block
+    format of older sessions are supported.
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.file = open(filename)  # type: TextIO
+        self.has_operations = True
+        header = []  # type: List[str]
+        while True:
+            line = self.file.readline()
+            if not line or line.startswith('operations:'):
+                self.has_operations = line.rstrip() == 'operations:'
+                break
+            header.append(line)
+        self.operations_offset = self.file.tell()
+        payload = yaml.safe_load(''.join(header))
+        if not isinstance(payload, dict) or 'config' not in payload:
+            raise ValidationError("Invalid session file: " + filename)
+        self.config = Config(**payload['config'])
+
+    def __enter__(self) -> 'SessionReader':
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[dict]:
+        if not self.has_operations:
+            return
+        item = []  # type: List[str]
+        for line in self.file:
+            if line.startswith('- {') and not item:
+                # Fast path for the line-per-operation format.
+                yield json.loads(line[2:])
+            elif line.startswith(' '):
+                item.append(line)
+            else:
+                if item:
+                    yield yaml.safe_load(''.join(item))[0]
+                    item = []
+                if not line.startswith('- '):
+                    # Another top-level key, the operations are over.
+                    return
+                item.append(line)
+        if item:
+            yield yaml.safe_load(''.join(item))[0]
+
+    def read_window(self, start: float = 0.0, end: float = None) \
+            -> Iterator[Tuple[int, dict]]:
+        """Yield operations due in `[start, end)` with their numbers.
+
+        The index is used to skip to the window, when there is one.
+        """
+        offset, first = self.operations_offset, 0
+        entry = self.find_entry(start)
+        if entry is not None:
+            _, offset, first = entry
+        self.file.seek(offset)
+        for number, operation in enumerate(self, first):
+            time = operation['time']
+            if time < start:
+                continue
+            if end is not None and time >= end:
+                return
+            yield number, operation
+
+    def find_entry(self, time: float) -> Optional[IndexEntry]:
+        """Return the last index entry before `time`, if any."""
+        index = self.read_index()
+        position = bisect_left([entry[0] for entry in index], time)
+        return index[position - 1] if position else None
+
+    def read_end(self) -> Optional[float]:
+        """Return when the last operation is due, if there is an index."""
+        offset = self.read_index_offset()
+        if offset is None:
+            return None
+        # The last operation is a single line right before the index.
+        start = max(offset - 4096, self.operations_offset)
+        self.file.seek(start)
+        times = TIME_PATTERN.findall(self.file.read(offset - start))
+        return float(times[-1]) if times else None
+
+    def read_index_offset(self) -> Optional[int]:
+        with open(self.filename, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            f.seek(max(f.tell() - 64, 0))
+            match = INDEX_TRAILER.search(f.read())
+        return None if match is None else int(match.group(1))
+
+    def read_index(self) -> List[IndexEntry]:
+        offset = self.read_index_offset()
+        if offset is None:
+            return []
+        self.file.seek(offset)
+        if self.file.readline() != 'index:\n':
+            return []
+        return [
+            tuple(json.loads(line[2:]))  # type: ignore
+            for line in self.file
+            if line.startswith('- [')
+        ]
+
+    def close(self) -> None:
+        self.file.close()
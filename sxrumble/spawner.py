@@ -0,0 +1,255 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Spawn server launching the sx tools with `posix_spawn` for the workers,
+# as forking the main process gets slower as it grows. Run as
+# `python -m sxrumble.spawner SOCKET_PATH`, it exits once its stdin closes.
+
+import json
+import os
+import shutil
+import signal
+import socket
+import socketserver
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+from time import monotonic
+from typing import List, Optional, Tuple  # noqa
+
+from sxrumble.capture import (
+    CHUNK_SIZE,
+    CommandResult,
+    close_all,
+    communicate,
+    get_deadline,
+    kill_group,
+    make_pipes,
+    wait,
+)
+
+
+REQUEST_HEADER = struct.Struct('<II')
+RESPONSE_HEADER = struct.Struct('<III')
+
+# (output, spawned, exited)
+SpawnResult = Tuple[CommandResult, float, float]
+
+
+def is_supported() -> bool:
+    return hasattr(os, 'posix_spawnp')
+
+
+def spawn(args: List[str], stdin: bytes, timeout: float = None) \
+        -> SpawnResult:
+    """Run a command in a new process group and collect its output.
+
+    The process group is killed if the command takes longer than `timeout`
+    seconds.
+    """
+    deadline = get_deadline(timeout)
+    child_fds, parent_fds = make_pipes()
+    try:
+        pid = os.posix_spawnp(  # type: ignore
+            args[0],
+            args,
+            os.environ,
+            file_actions=[
+                (os.POSIX_SPAWN_DUP2, fd, i)  # type: ignore
+                for i, fd in enumerate(child_fds)
+            ],
+            setpgroup=0,
+            setsigdef=(signal.SIGINT,),
+        )
+    except OSError:
+        close_all(child_fds + parent_fds)
+        raise
+    spawned = monotonic()
+    close_all(child_fds)
+    output = communicate(*parent_fds, data=stdin, deadline=deadline)
+    if output.timed_out:
+        kill_group(pid)
+    status, killed = wait(pid, deadline)
+    exited = monotonic()
+    result = CommandResult(
+        args,
+        get_returncode(status),
+        output.get_stdout(),
+        output.get_stderr(),
+        output.stdout_size,
+        output.stdout_lines,
+        output.timed_out or killed,
+    )
+    return result, spawned, exited
+
+
+def get_returncode(status: int) -> int:
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+class SpawnHandler(socketserver.BaseRequestHandler):
+    """Serves the commands of a single worker thread."""
+
+    def handle(self) -> None:
+        while True:
+            header = receive(self.request, REQUEST_HEADER.size)
+            if not header:
+                return
+            header_size, stdin_size = REQUEST_HEADER.unpack(header)
+            request = json.loads(receive(self.request, header_size).decode())
+            stdin = receive(self.request, stdin_size)
+            try:
+                result, spawned, exited = spawn(
+                    request['args'], stdin, request.get('timeout'),
+                )
+                stdout, stderr = result.stdout, result.stderr
+                response = {
+                    'returncode': result.returncode,
+                    'stdout_size': result.stdout_size,
+                    'stdout_lines': result.stdout_lines,
+                    'timed_out': result.timed_out,
+                    'spawned': spawned,
+                    'exited': exited,
+                }  # type: dict
+            except OSError as e:
+                stdout = stderr = b''
+                response = {'errno': e.errno, 'error': e.strerror}
+            payload = json.dumps(response).encode()
+            header = RESPONSE_HEADER.pack(
+                len(payload), len(stdout), len(stderr),
+            )
+            self.request.sendall(header + payload)
+            self.request.sendall(stdout)
+            self.request.sendall(stderr)
+
+
+class SpawnServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def receive(sock: socket.socket, size: int) -> bytes:
+    chunks = []  # type: List[bytes]
+    while size > 0:
+        chunk = sock.recv(min(size, CHUNK_SIZE))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def serve(path: str) -> None:
+    # Ctrl-C reaches the whole process group, but in-flight commands should
+    # finish as sxrumble waits for them.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = SpawnServer(path, SpawnHandler)
+    # The parent closes our stdin when it's done or when it dies.
+    watcher = threading.Thread(target=wait_for_parent, daemon=True)
+    watcher.start()
+    sys.stdout.write('ready\n')
+    sys.stdout.flush()
+    server.serve_forever()
+
+
+def wait_for_parent() -> None:
+    sys.stdin.buffer.read()
+    os._exit(0)
+
+
+class SpawnClient:
+    """Sends commands to the spawn server, one connection per thread."""
+
+    def __init__(self) -> None:
+        self.directory = tempfile.mkdtemp(prefix='sxrumble-')
+        self.path = os.path.join(self.directory, 'spawner.sock')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'sxrumble.spawner', self.path],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        if self.process.stdout.readline() != b'ready\n':
+            raise RuntimeError('Spawn server failed to start')
+        self.local = threading.local()
+        self.connections = []  # type: List[socket.socket]
+        self.lock = threading.Lock()
+
+    def run(
+            self, args: List[str], stdin: Optional[bytes],
+            timeout: float = None) -> SpawnResult:
+        connection = self.get_connection()
+        stdin = stdin or b''
+        header = json.dumps({'args': args, 'timeout': timeout}).encode()
+        connection.sendall(
+            REQUEST_HEADER.pack(len(header), len(stdin)) + header,
+        )
+        connection.sendall(stdin)
+
+        response_header = receive(connection, RESPONSE_HEADER.size)
+        if len(response_header) < RESPONSE_HEADER.size:
+            raise RuntimeError('Spawn server has died')
+        sizes = RESPONSE_HEADER.unpack(response_header)
+        response = json.loads(receive(connection, sizes[0]).decode())
+        stdout = receive(connection, sizes[1])
+        stderr = receive(connection, sizes[2])
+        if 'error' in response:
+            raise OSError(response['errno'], response['error'], args[0])
+        result = CommandResult(
+            args,
+            response['returncode'],
+            stdout,
+            stderr,
+            response['stdout_size'],
+            response['stdout_lines'],
+            response['timed_out'],
+        )
+        return result, response['spawned'], response['exited']
+
+    def get_connection(self) -> socket.socket:
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            connection.connect(self.path)
+            self.local.connection = connection
+            with self.lock:
+                self.connections.append(connection)
+        return connection
+
+    def close(self) -> None:
+        for connection in self.connections:
+            connection.close()
+        self.process.stdin.close()
+        self.process.wait()
+        self.process.stdout.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_client = None  # type: Optional[SpawnClient]
+
+
+def start() -> None:
+    global _client
+    if _client is None:
+        _client = SpawnClient()
+
+
+def stop() -> None:
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+def get_client() -> Optional[SpawnClient]:
+    return _client
+
+
+def main(argv: List[str]) -> None:
+    serve(argv[1])
+
+
+if __name__ == '__main__':
+    main(sys.argv)
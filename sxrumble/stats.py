@@ -0,0 +1,139 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import math
+from typing import List, Sequence, Tuple  # noqa
+
+
+PERCENTILES = (50, 90, 99)
+# Two-sided 95% quantiles of Student's t distribution, by degrees of
+# freedom from 1, and of the normal distribution past those.
+T_95 = (
+    12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+    2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+    2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042,
+)
+Z_95 = 1.96
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Return the q-th percentile of already sorted values.
+
+    Linear interpolation between the closest ranks is used.
+    """
+    if not sorted_values:
+        return float('nan')
+    rank = (len(sorted_values) - 1) * q / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = rank - lower
+    return sorted_values[lower] + \
+        (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def format_percentiles(
+        values: Sequence[float], unit: str = 's', scale: float = 1.0,
+        digits: int = 3) -> str:
+    """Format the percentiles of values, multiplied by `scale`."""
+    ordered = sorted(values)
+    template = '{}={:.%df}%s' % (digits, unit)
+    parts = [
+        template.format('p{}'.format(q), percentile(ordered, q) * scale)
+        for q in PERCENTILES
+    ]
+    parts.append(
+        template.format('max', (ordered[-1] if ordered else 0.0) * scale),
+    )
+    return ' '.join(parts)
+
+
+def mean_interval(values: Sequence[float]) -> Tuple[float, float]:
+    """Return the mean of values and the half width of its 95% interval.
+
+    The values should be independent, such as means of batches long enough
+    for consecutive ones not to be correlated.
+    """
+    n = len(values)
+    if n == 0:
+        return float('nan'), float('nan')
+    mean = sum(values) / n
+    if n == 1:
+        return mean, float('nan')
+    variance = sum((v - mean) ** 2 for v in values) / (n - 1)
+    t = T_95[n - 2] if n - 2 < len(T_95) else Z_95
+    return mean, t * math.sqrt(variance / n)
+
+
+def percentile_interval(sorted_values: Sequence[float], q: float) \
+        -> Tuple[float, float]:
+    """Return a 95% interval of the q-th percentile of sorted values.
+
+    Distribution-free: the ranks around the percentile are taken from the
+    normal approximation of the binomial distribution of the values below
+    it.
+    """
+    n = len(sorted_values)
+    if n == 0:
+        return float('nan'), float('nan')
+    p = q / 100
+    half_width = Z_95 * math.sqrt(n * p * (1 - p))
+    low = max(int(math.floor(n * p - half_width)), 0)
+    high = min(int(math.ceil(n * p + half_width)), n - 1)
+    return sorted_values[low], sorted_values[high]
+
+
+def batch_means(values: Sequence[float], count: int) -> List[float]:
+    """Return the means of about `count` batches of consecutive values.
+
+    Batches are of the same size, values past the last whole one are left
+    out.
+    """
+    size = max(len(values) // count, 1)
+    return [
+        sum(values[i:i + size]) / size
+        for i in range(0, len(values) - size + 1, size)
+    ]
+
+
+def mann_whitney_u(a: Sequence[float], b: Sequence[float]) -> float:
+    """Return the one-sided p-value of `b` being greater than `a`.
+
+    Uses the normal approximation of the Mann-Whitney U statistic with tie
+    and continuity corrections, which is accurate for samples of more than
+    a handful of values. Ranks are computed by merging the sorted samples,
+    so large samples cost a sort and a single pass.
+    """
+    a, b = sorted(a), sorted(b)
+    n1, n2 = len(a), len(b)
+    if n1 == 0 or n2 == 0:
+        return 1.0
+
+    i = j = 0
+    rank_sum_b = 0.0
+    ties = 0.0
+    while i < n1 or j < n2:
+        if j == n2 or (i < n1 and a[i] <= b[j]):
+            value = a[i]
+        else:
+            value = b[j]
+        count_a = 0
+        while i < n1 and a[i] == value:
+            i += 1
+            count_a += 1
+        count_b = 0
+        while j < n2 and b[j] == value:
+            j += 1
+            count_b += 1
+        tied = count_a + count_b
+        # Ranks i + j - tied + 1 .. i + j share their average.
+        rank_sum_b += count_b * (i + j - (tied - 1) / 2)
+        ties += tied ** 3 - tied
+
+    n = n1 + n2
+    u = rank_sum_b - n2 * (n2 + 1) / 2
+    mean = n1 * n2 / 2
+    variance = n1 * n2 / 12 * ((n + 1) - ties / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0
+    z = (u - mean - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2))
@@ -0,0 +1,185 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# The steady part of a run, past a warm-up and a cool-down cut by the MSER-5
+# rule, reported with 95% confidence intervals.
+
+import logging
+import math
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple  # noqa
+
+from sxrumble.results import Results
+from sxrumble.stats import (
+    batch_means, mean_interval, percentile, percentile_interval,
+)
+
+
+MSER_BATCH = 5
+# Seconds a window needs for its steady state to be detected.
+MIN_DETECTION = 30
+# Batches of seconds the interval of the throughput is computed from.
+THROUGHPUT_BATCHES = 20
+REPORTED_PERCENTILES = (50, 99)
+
+# Seconds into the run, and how the window was found.
+Window = NamedTuple('Window', [
+    ('start', float),
+    ('end', float),
+    ('description', str),
+])
+
+
+logger = logging.getLogger(__name__)
+
+
+def find_window(
+        results: Results, warm_up: float = 0.0, cool_down: float = 0.0,
+        detect: bool = False) -> Optional[Window]:
+    """Return the window of the run to report, if anything is left of it."""
+    if not len(results):
+        return None
+    start = min(results['start']) + warm_up
+    end = max(results['end']) - cool_down
+    if end <= start:
+        return None
+    description = describe(warm_up, cool_down)
+    if not detect:
+        return Window(start, end, description)
+    throughput, latency = per_second(results, start, end)
+    if len(throughput) < MIN_DETECTION:
+        return Window(
+            start, end, description + ', too short for a steady state',
+        )
+    head = max(mser(throughput), mser(latency))
+    tail = max(mser(throughput[head:][::-1]), mser(latency[head:][::-1]))
+    return Window(
+        start + head,
+        start + len(throughput) - tail,
+        'steady state, {}s of warm-up and {}s of cool-down detected'.format(
+            head, tail,
+        ) + (', ' + description if warm_up or cool_down else ''),
+    )
+
+
+def describe(warm_up: float, cool_down: float) -> str:
+    parts = []  # type: List[str]
+    if warm_up:
+        parts.append('first {:g}s'.format(warm_up))
+    if cool_down:
+        parts.append('last {:g}s'.format(cool_down))
+    if not parts:
+        return 'the whole run'
+    return ' and '.join(parts) + ' left out'
+
+
+def per_second(results: Results, start: float, end: float) \
+        -> Tuple[List[float], List[float]]:
+    """Return the operations finished, and their mean service time, in
+    every whole second from `start` to `end`.
+
+    Seconds without successful operations take the service time of the
+    previous one.
+    """
+    seconds = int(end - start)
+    counts = [0.0] * seconds
+    durations = [0.0] * seconds
+    successes = [0] * seconds
+    for finished, duration, error_class in zip(
+            results['end'], results['duration'], results['error_class']):
+        second = int(math.floor(finished - start))
+        if not 0 <= second < seconds:
+            continue
+        counts[second] += 1
+        if error_class == 0:
+            durations[second] += duration
+            successes[second] += 1
+    latency = []  # type: List[float]
+    last = next((d / n for d, n in zip(durations, successes) if n), 0.0)
+    for duration, count in zip(durations, successes):
+        if count:
+            last = duration / count
+        latency.append(last)
+    return counts, latency
+
+
+def mser(series: Sequence[float], batch: int = MSER_BATCH) -> int:
+    """Return how many leading values are a transient, by the MSER rule.
+
+    Values are averaged in batches, and the leading batches dropped are
+    those minimizing the variance of the remaining ones divided by their
+    count, at most half of them. Ties drop the fewest.
+    """
+    means = [
+        sum(series[i:i + batch]) / batch
+        for i in range(0, len(series) - batch + 1, batch)
+    ]
+    count = len(means)
+    best, dropped = float('inf'), 0
+    # Sums from the end, so that every truncation takes a single step.
+    total = squares = 0.0
+    for d in range(count - 1, -1, -1):
+        total += means[d]
+        squares += means[d] ** 2
+        if d > count // 2:
+            continue
+        remaining = count - d
+        value = (squares - total * total / remaining) / remaining ** 2
+        if value <= best:
+            best, dropped = value, d
+    return dropped * batch
+
+
+def log_window(results: Results, window: Window) -> None:
+    selected = results.window(window.start, window.end)
+    # Operations finished within the window, whenever they started.
+    counts, _ = per_second(results, window.start, window.end)
+    if counts:
+        throughput, half_width = mean_interval(
+            batch_means(counts, THROUGHPUT_BATCHES),
+        )
+    else:
+        # Not a whole second.
+        throughput = len(selected) / (window.end - window.start)
+        half_width = float('nan')
+    logger.info(
+        'From %.0fs to %.0fs into the run, %s, with 95%% confidence '
+        'intervals:',
+        window.start,
+        window.end,
+        window.description,
+    )
+    failed = sum(1 for e in selected['error_class'] if e != 0)
+    logger.info(
+        ' - throughput %s ops/s, %d ok, %d failed',
+        format_interval(throughput, half_width, '{:.2f}'),
+        len(selected) - failed,
+        failed,
+    )
+    for name, durations in sorted(selected.durations_by_type().items()):
+        ordered = sorted(durations)
+        parts = []  # type: List[str]
+        for q in REPORTED_PERCENTILES:
+            low, high = percentile_interval(ordered, q)
+            parts.append('p{}={:.3f}s [{:.3f}, {:.3f}]'.format(
+                q, percentile(ordered, q), low, high,
+            ))
+        logger.info(' - %-14s %s', name, ' '.join(parts))
+
+
+def format_interval(value: float, half_width: float, template: str) -> str:
+    if math.isnan(half_width):
+        return template.format(value)
+    return (template + ' ±' + template).format(value, half_width)
+
+
+def log_steady_state(
+        results: Results, warm_up: float, cool_down: float,
+        detect: bool) -> None:
+    window = find_window(results, warm_up, cool_down, detect)
+    if window is None:
+        if len(results):
+            logger.warning(
+                'Nothing is left of the run past its warm-up and cool-down',
+            )
+        return
+    log_window(results, window)
@@ -0,0 +1,256 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Sessions generated from a YAML workload model, without a cluster: the
+# same model and seed always produce the same session.
+
+import json
+import logging
+import math
+import multiprocessing
+import os
+import random
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple  # noqa
+
+import yaml
+
+from sxrumble.config import Config, Session, get_session_filename
+from sxrumble.exceptions import ValidationError
+from sxrumble.operations import (
+    MIX_OPERATIONS, OPERATIONS_BY_NAME, get_mix_operations,
+)
+from sxrumble.parsers import parse_endpoints, parse_size
+from sxrumble.sessions import SessionWriter
+from sxrumble.validators import validate_choice
+
+
+# Operations generated by a single task, on average.
+WINDOW_OPERATIONS = 100000
+ARRIVALS = ('poisson', 'uniform')
+SIZE_DISTRIBUTIONS = ('uniform', 'lognormal')
+
+OperationFormatter = Callable[[float], str]
+WindowTask = Tuple['WorkloadModel', float, float, int]
+
+
+logger = logging.getLogger(__name__)
+
+
+class WorkloadModel:
+
+    def __init__(self, payload: Dict[str, Any]) -> None:
+        if not isinstance(payload, dict):
+            raise ValidationError("Workload model should be a mapping")
+        self.seed = payload.get('seed', 0)
+        sizes = payload.get('sizes') or {}
+        sx_url = get_required(payload, 'sx_url')
+        self.config = Config(
+            sx_url=sx_url,
+            endpoints=parse_endpoints(sx_url),
+            endpoint_policy=payload.get('endpoint_policy'),
+            volumes=get_required(payload, 'volumes'),
+            threads=payload.get('threads', 8),
+            min_size=parse_model_size(sizes.get('min', '1K')),
+            max_size=parse_model_size(sizes.get('max', '1M')),
+            entropy_size=None,
+            entropy_seed='{:012x}'.format(hash_seed(self.seed)),
+        )
+        self.duration = validate_positive(
+            get_required(payload, 'duration'), 'duration',
+        )
+        self.rate = validate_positive(get_required(payload, 'rate'), 'rate')
+        self.arrival = validate_choice(
+            payload.get('arrival', 'poisson'), ARRIVALS, 'arrival',
+        )
+        self.mix = validate_mix(payload.get('mix'), self.config)
+        self.size_distribution = validate_choice(
+            sizes.get('distribution', 'uniform'),
+            SIZE_DISTRIBUTIONS,
+            'size distribution',
+        )
+        self.median_size = parse_model_size(
+            sizes.get('median', self.config.min_size),
+        )
+        self.size_sigma = validate_positive(sizes.get('sigma', 1.0), 'sigma')
+
+
+def load_model(filename: str) -> WorkloadModel:
+    with open(filename) as f:
+        return WorkloadModel(yaml.safe_load(f))
+
+
+def synthesize_session(
+        model_filename: str, session_filename: str = None) -> None:
+    model = load_model(model_filename)
+    if session_filename is None:
+        session_filename = get_session_filename(Session(model.config), 'yaml')
+    logger.info('Synthesizing operations...')
+    writer = SessionWriter(session_filename, model.config)
+    count = 0
+    try:
+        for window in generate_windows(model):
+            writer.write_lines(window)
+            count += window.count('\n')
+    finally:
+        writer.close()
+    logger.info('Saved %s operations to %s', count, session_filename)
+
+
+def generate_windows(model: WorkloadModel) -> Iterable[str]:
+    """Yield formatted operations, ordered by time, a window at a time.
+
+    Every window has its own generator seeded from the model seed and the
+    window number, so windows can be generated in parallel and the session
+    does not depend on the number of processes.
+    """
+    window = max(WINDOW_OPERATIONS / model.rate, 1.0)
+    count = int(math.ceil(model.duration / window))
+    tasks = [
+        (model, i * window, min((i + 1) * window, model.duration), i)
+        for i in range(count)
+    ]
+    processes = os.cpu_count() or 1
+    if processes == 1 or count == 1:
+        yield from map(generate_window, tasks)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(generate_window, tasks)
+
+
+def generate_window(task: WindowTask) -> str:
+    model, start, end, index = task
+    rng = random.Random('{}-{}'.format(model.seed, index))
+    cumulative = list(accumulate(weight for _, weight in model.mix))
+    total = cumulative[-1]
+    formatters = [
+        get_formatter(name, model, rng) for name, _ in model.mix
+    ]  # type: List[OperationFormatter]
+
+    # Bind everything used per operation to locals, this is the hot loop.
+    uniform = rng.random
+    return ''.join([
+        formatters[bisect(cumulative, uniform() * total)](time)
+        for time in generate_times(model, start, end, rng)
+    ])
+
+
+def generate_times(
+        model: WorkloadModel, start: float, end: float,
+        rng: random.Random) -> Iterable[float]:
+    rate = model.rate
+    if model.arrival == 'uniform':
+        first, last = math.ceil(start * rate), math.ceil(end * rate)
+        return (i / rate for i in range(first, last))
+    return generate_poisson_times(start, end, rate, rng)
+
+
+def generate_poisson_times(
+        start: float, end: float, rate: float,
+        rng: random.Random) -> Iterable[float]:
+    # Same as `rng.expovariate`, without the call overhead.
+    uniform, log = rng.random, math.log
+    time = start - log(1.0 - uniform()) / rate
+    while time < end:
+        yield time
+        time -= log(1.0 - uniform()) / rate
+
+
+def get_formatter(
+        name: str, model: WorkloadModel, rng: random.Random) \
+        -> OperationFormatter:
+    # Random integers are drawn by scaling `rng.random()`, which is several
+    # times faster than `randint` and `choice`.
+    uniform = rng.random
+    volumes = [json.dumps(v) for v in model.config.volumes]
+    count = len(volumes)
+
+    if name in ('ListFiles', 'ShowVolumeAcl'):
+        template = \
+            '- {"params": {"volume": %s}, "time": %.6f, "type": "' + \
+            name + '"}\n'
+        return lambda time: template % (volumes[int(uniform() * count)], time)
+
+    if name == 'GlobFiles':
+        # Sessions are synthesized for flat volumes, about a sixteenth of
+        # the files match.
+        template = \
+            '- {"params": {"pattern": "sxrumble-%x*", "volume": %s}, ' \
+            '"time": %.6f, "type": "GlobFiles"}\n'
+        return lambda time: template % (
+            int(uniform() * 16), volumes[int(uniform() * count)], time,
+        )
+
+    if name == 'UploadNewFile':
+        template = \
+            '- {"params": {"filename": "sxrumble-%032x", "offset": %d, ' \
+            '"size": %d, "volume": %s}, "time": %.6f, ' \
+            '"type": "UploadNewFile"}\n'
+        pick_size = get_size_sampler(model, rng)
+        getrandbits = rng.getrandbits
+        offsets = model.config.entropy_size + 1
+
+        def format_upload(time: float) -> str:
+            size = pick_size()
+            return template % (
+                getrandbits(128),
+                int(uniform() * (offsets - size)),
+                size,
+                volumes[int(uniform() * count)],
+                time,
+            )
+        return format_upload
+
+    template = '- {"params": {}, "time": %.6f, "type": "' + name + '"}\n'
+    return lambda time: template % time
+
+
+def get_size_sampler(model: WorkloadModel, rng: random.Random) \
+        -> Callable[[], int]:
+    min_size, max_size = model.config.min_size, model.config.max_size
+    if model.size_distribution == 'lognormal':
+        mu, sigma = math.log(model.median_size), model.size_sigma
+        gauss, exp = rng.gauss, math.exp
+        return lambda: min(max(int(exp(gauss(mu, sigma))), min_size), max_size)
+    uniform, sizes = rng.random, max_size - min_size + 1
+    return lambda: min_size + int(uniform() * sizes)
+
+
+def get_required(payload: Dict[str, Any], name: str) -> Any:
+    if name not in payload:
+        raise ValidationError("Workload model is missing " + name)
+    return payload[name]
+
+
+def parse_model_size(size: Any) -> int:
+    if isinstance(size, int):
+        return size
+    return parse_size(str(size))
+
+
+def validate_positive(value: Any, name: str) -> float:
+    if not isinstance(value, (int, float)) or value <= 0:
+        raise ValidationError("{} must be a positive number".format(name))
+    return float(value)
+
+
+def validate_mix(mix: Optional[Dict[str, Any]], config: Config) \
+        -> List[tuple]:
+    if not mix:
+        return sorted(
+            (o.get_name(), 1.0) for o in get_mix_operations(config)
+        )
+    names = [o.get_name() for o in MIX_OPERATIONS]
+    for name, weight in mix.items():
+        if name not in OPERATIONS_BY_NAME:
+            raise ValidationError("Unknown operation: " + name)
+        # Churn needs objects created by earlier operations of the run.
+        if name not in names:
+            raise ValidationError("Cannot synthesize " + name)
+        validate_positive(weight, "Weight of " + name)
+    return sorted((name, float(weight)) for name, weight in mix.items())
+
+
+def hash_seed(seed: Any) -> int:
+    return random.Random(seed).getrandbits(48)
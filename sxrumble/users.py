@@ -0,0 +1,197 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+# Virtual users walk a state machine read from a YAML model: every state
+# has an optional operation, a think time and weighted next states. Users
+# are only data, their operations run on the threads of the run.
+
+import copy
+import random
+from bisect import bisect
+from itertools import accumulate
+from typing import Any, Callable, Dict, List, Optional, Type  # noqa
+
+import yaml
+
+from sxrumble.config import Config
+from sxrumble.endpoints import EndpointSelector
+from sxrumble.exceptions import ValidationError
+from sxrumble.operations import Operation, OPERATIONS_BY_NAME, pick_volume
+from sxrumble.validators import validate_choice
+
+
+THINK_DISTRIBUTIONS = ('exponential', 'uniform', 'constant')
+
+# Draws a think time.
+Think = Callable[[], float]
+
+
+DEFAULT_USER_MODEL = {
+    'start': 'browse',
+    'ramp_up': 10,
+    'states': {
+        'browse': {
+            'operation': 'ListFiles',
+            'think': 1,
+            'next': {'read': 1, 'upload': 1},
+        },
+        'read': {
+            'operation': 'GlobFiles',
+            'think': 0.5,
+            'next': {'read': 2, 'upload': 1, 'pause': 1},
+        },
+        'upload': {
+            'operation': 'UploadNewFile',
+            'think': 0.5,
+            'next': {'upload': 2, 'read': 1, 'pause': 1},
+        },
+        'pause': {
+            'think': 10,
+            'next': {'browse': 1},
+        },
+    },
+}  # type: Dict[str, Any]
+
+
+class State:
+
+    def __init__(self, name: str, payload: Any) -> None:
+        if not isinstance(payload, dict):
+            raise ValidationError("State {} should be a mapping".format(name))
+        self.name = name
+        operation = payload.get('operation')
+        # Only thinking, if none.
+        self.operation = None  # type: Optional[Type[Operation]]
+        if operation is not None:
+            if operation not in OPERATIONS_BY_NAME:
+                raise ValidationError("Unknown operation: " + operation)
+            self.operation = OPERATIONS_BY_NAME[operation]
+        self.think = parse_think(payload.get('think', 0))
+        next_states = payload.get('next')
+        if not isinstance(next_states, dict) or not next_states:
+            raise ValidationError(
+                "State {} needs next states".format(name),
+            )
+        self.next_names = sorted(next_states)
+        weights = [next_states[n] for n in self.next_names]
+        if any(not validate_non_negative(w) for w in weights) or \
+                not sum(weights):
+            raise ValidationError(
+                "Weights of the next states of {} must not be negative, "
+                "nor all 0".format(name),
+            )
+        self.weights = list(accumulate(weights))
+        # Resolved by the model.
+        self.next_states = []  # type: List[State]
+
+    def pick_next(self) -> 'State':
+        point = random.random() * self.weights[-1]
+        return self.next_states[bisect(self.weights, point)]
+
+
+class UserModel:
+
+    def __init__(self, payload: Any) -> None:
+        if not isinstance(payload, dict):
+            raise ValidationError("User model should be a mapping")
+        states = payload.get('states')
+        if not isinstance(states, dict) or not states:
+            raise ValidationError("User model needs states")
+        self.states = {
+            name: State(name, state) for name, state in states.items()
+        }  # type: Dict[str, State]
+        for state in self.states.values():
+            for name in state.next_names:
+                if name not in self.states:
+                    raise ValidationError("Unknown state: {}".format(name))
+            state.next_states = [self.states[n] for n in state.next_names]
+        start = payload.get('start')
+        if start not in self.states:
+            raise ValidationError("Unknown start state: {}".format(start))
+        self.start = self.states[start]
+        self.ramp_up = payload.get('ramp_up', 0)
+        if not validate_non_negative(self.ramp_up):
+            raise ValidationError("Ramp-up must not be negative")
+        if not any(s.operation for s in self.states.values()):
+            raise ValidationError("User model runs no operations")
+
+
+def load_user_model(filename: Optional[str]) -> UserModel:
+    """Load the model in `filename`, the default one if not given."""
+    if filename is None:
+        return UserModel(DEFAULT_USER_MODEL)
+    with open(filename) as f:
+        return UserModel(yaml.safe_load(f))
+
+
+def parse_think(think: Any) -> Think:
+    if validate_non_negative(think):
+        return lambda: random.expovariate(1 / think) if think else 0.0
+    if not isinstance(think, dict):
+        raise ValidationError("Invalid think time: {}".format(think))
+    distribution = validate_choice(
+        think.get('distribution', 'exponential'),
+        THINK_DISTRIBUTIONS,
+        'think time distribution',
+    )
+    keys = {
+        'exponential': ('mean',),
+        'uniform': ('min', 'max'),
+        'constant': ('value',),
+    }[distribution]
+    values = [think.get(k) for k in keys]
+    if not all(validate_non_negative(v) for v in values):
+        raise ValidationError(
+            "Think time {} needs {}, not negative".format(
+                distribution, ' and '.join(keys),
+            ),
+        )
+    if distribution == 'uniform':
+        return lambda: random.uniform(*values)
+    if distribution == 'constant':
+        return lambda: values[0]
+    return parse_think(values[0])
+
+
+def validate_non_negative(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) \
+        and value >= 0
+
+
+class VirtualUser:
+    """A user with a volume and an endpoint, in a state of the model."""
+
+    __slots__ = ('config', 'endpoint', 'sx_url', 'state')
+
+    def __init__(
+            self, config: Config, selector: EndpointSelector,
+            model: UserModel) -> None:
+        volume = pick_volume(config)
+        # Operations pick their volume from the config, so every user has
+        # one listing only its own.
+        self.config = copy.copy(config)
+        self.config.volumes = [volume]
+        self.endpoint = selector.pick(volume)
+        self.sx_url = selector.urls[self.endpoint]
+        self.state = model.start
+
+    def create_operation(self) -> Optional[Operation]:
+        """Return the operation of the current state, if it has one."""
+        if self.state.operation is None:
+            return None
+        operation = self.state.operation.randomize(self.config)
+        operation.endpoint = self.endpoint
+        operation.sx_url = self.sx_url
+        return operation
+
+    def advance(self) -> float:
+        """Move to the next state, return the think time before it."""
+        think = self.state.think()
+        self.state = self.state.pick_next()
+        return think
+
+
+def create_users(
+        config: Config, model: UserModel, count: int) -> List[VirtualUser]:
+    selector = EndpointSelector(config)
+    return [VirtualUser(config, selector, model) for _ in range(count)]
@@ -2,10 +2,14 @@
 # License: Apache 2.0, see LICENSE for more details.
 
 from random import choice
-from typing import Tuple, Dict, Any, Optional
+from typing import Tuple, Dict, Any, List, Optional
 
-from sxrumble.config import ENTROPY_SEED_LENGTH, ENTROPY_SEED_CHARACTERS
+from sxrumble.config import (
+    ENTROPY_SEED_LENGTH, ENTROPY_SEED_CHARACTERS, DEFAULT_TIMEOUT_KEY,
+    ENDPOINT_POLICIES,
+)
 from sxrumble.exceptions import ValidationError
+from sxrumble.namespace import Namespace
 
 
 Args = Dict[str, Any]
@@ -13,10 +17,18 @@ Args = Dict[str, Any]
 
 def validate_args(args: Args) -> Args:
     valid = {}  # type: Args
-    valid['sx_url'] = validate_sx_url(args['sx_url'])
+    # Sessions recorded before endpoints have a single SX_URL.
+    valid['endpoints'] = validate_endpoints(
+        args.get('endpoints') or [{'url': args['sx_url'], 'weight': 1}],
+    )
+    valid['sx_url'] = valid['endpoints'][0]['url']
+    valid['endpoint_policy'] = validate_endpoint_policy(
+        args.get('endpoint_policy') or ENDPOINT_POLICIES[0],
+    )
     valid['volumes'] = [
         validate_volume(v) for v in args['volumes']
     ]
+    valid['namespace'] = validate_namespace(args.get('namespace') or {})
     valid['threads'] = validate_threads(args['threads'])
     valid['min_size'], valid['max_size'] = validate_sizes(
         args['min_size'],
@@ -30,6 +42,169 @@ def validate_args(args: Args) -> Args:
     return valid
 
 
+def validate_options(args: Args) -> Args:
+    # Options are optional in every command, hence `get`.
+    valid = {}  # type: Args
+    valid['trace_file'] = args.get('trace')
+    valid['spawn_server'] = not args.get('no_spawn_server', False)
+    valid['timeouts'] = validate_timeouts(args.get('timeout') or {})
+    valid['retries'] = validate_retries(args.get('retries') or 0)
+    valid['retry_backoff'] = validate_retry_backoff(
+        args.get('retry_backoff', 1.0),
+    )
+    valid['resume'] = args.get('resume', False)
+    valid['window_start'], valid['window_end'] = validate_window(
+        args.get('from') or 0.0,
+        args.get('to'),
+    )
+    valid['manifest'] = args.get('manifest')
+    valid['populate_count'] = validate_populate_count(args.get('count') or 0)
+    valid['batch_size'] = validate_batch_size(args.get('batch', 1))
+    valid['upload_batch'] = validate_batch_size(args.get('upload_batch', 1))
+    valid['upload_linger'] = validate_upload_linger(
+        args.get('upload_linger', 0.01),
+    )
+    valid['rate'] = validate_rate(args.get('rate'))
+    valid['slo'] = validate_slo(args.get('slo'))
+    valid['dashboard'] = args.get('dashboard', False)
+    valid['metrics_address'] = validate_address(args.get('metrics_address'))
+    valid['metrics_file'] = args.get('metrics_file')
+    valid['metrics_interval'] = validate_metrics_interval(
+        args.get('metrics_interval', 15.0),
+    )
+    valid['control_socket'] = args.get('control_socket')
+    valid['host_interval'] = validate_host_interval(
+        args.get('host_interval', 0.0),
+    )
+    valid['users'] = validate_users(args.get('users'))
+    valid['user_model'] = args.get('user_model')
+    valid['mix'] = validate_mix(args.get('mix'))
+    valid['warm_up'] = args.get('warm_up') or 0.0
+    valid['cool_down'] = args.get('cool_down') or 0.0
+    valid['steady_state'] = args.get('steady_state', False)
+    if valid['resume'] and valid['populate_count'] and \
+            valid['manifest'] is None:
+        # Manifests are named after the date of the run otherwise.
+        raise ValidationError("Resuming a populate needs its --manifest")
+    if valid['rate'] is not None and valid['slo'] is not None:
+        raise ValidationError(
+            "The concurrency is not adapted to the SLO at a fixed rate",
+        )
+    if valid['users'] and (valid['rate'] or valid['slo']):
+        raise ValidationError("Virtual users run at their own pace")
+    if valid['user_model'] is not None and not valid['users']:
+        raise ValidationError("A user model needs virtual users")
+    if valid['users'] and valid['mix'] is not None:
+        raise ValidationError("Virtual users follow their user model")
+    return valid
+
+
+def validate_slo(slo: Optional[Args]) -> Optional[Args]:
+    if slo is None:
+        return None
+    if 'latency' not in slo:
+        raise ValidationError("SLO needs a latency target, such as p99=0.5")
+    valid = {
+        'percentile': slo['percentile'],
+        'latency': slo['latency'],
+        'errors': slo.get('errors', 1.0),
+    }
+    if not 0 < valid['percentile'] < 100:
+        raise ValidationError("SLO percentile must be between 0 and 100")
+    if valid['latency'] <= 0:
+        raise ValidationError("SLO latency must be greater than 0")
+    if valid['errors'] > 100:
+        raise ValidationError("SLO errors must not exceed 100%")
+    return valid
+
+
+def validate_users(users: Optional[int]) -> Optional[int]:
+    if users is not None and users < 1:
+        raise ValidationError("Number of users must be greater than 0")
+    return users
+
+
+def validate_mix(spec: Optional[str]) -> Optional[List[float]]:
+    from sxrumble.control import parse_weights
+    if spec is None:
+        return None
+    return parse_weights(spec)
+
+
+def validate_rate(rate: Optional[float]) -> Optional[float]:
+    if rate is not None and rate <= 0:
+        raise ValidationError("Rate must be greater than 0")
+    return rate
+
+
+def validate_address(address: Optional[Tuple[str, int]]) \
+        -> Optional[Tuple[str, int]]:
+    if address is not None and not 0 <= address[1] < 2 ** 16:
+        raise ValidationError("Invalid port: {}".format(address[1]))
+    return address
+
+
+def validate_metrics_interval(interval: float) -> float:
+    if interval <= 0:
+        raise ValidationError("Metrics interval must be greater than 0")
+    return interval
+
+
+def validate_host_interval(interval: float) -> float:
+    if interval < 0:
+        raise ValidationError("Host interval must not be negative")
+    return interval
+
+
+def validate_populate_count(count: int) -> int:
+    if count < 0:
+        raise ValidationError("Invalid number of files")
+    return count
+
+
+def validate_batch_size(size: int) -> int:
+    if size < 1:
+        raise ValidationError("Batch size must be greater than 0")
+    return size
+
+
+def validate_upload_linger(linger: float) -> float:
+    if linger < 0:
+        raise ValidationError("Upload linger must not be negative")
+    return linger
+
+
+def validate_window(start: float, end: Optional[float]) \
+        -> Tuple[float, Optional[float]]:
+    if start < 0:
+        raise ValidationError("Start of the window must not be negative")
+    if end is not None and end <= start:
+        raise ValidationError("End of the window must be after its start")
+    return start, end
+
+
+def validate_timeouts(timeouts: Dict[str, float]) -> Dict[str, float]:
+    from sxrumble.operations import OPERATIONS_BY_NAME
+    for name, timeout in timeouts.items():
+        if name != DEFAULT_TIMEOUT_KEY and name not in OPERATIONS_BY_NAME:
+            raise ValidationError("Unknown operation: " + name)
+        if timeout <= 0:
+            raise ValidationError("Timeout must be greater than 0")
+    return timeouts
+
+
+def validate_retries(retries: int) -> int:
+    if retries < 0:
+        raise ValidationError("Invalid number of retries")
+    return retries
+
+
+def validate_retry_backoff(backoff: float) -> float:
+    if backoff < 0:
+        raise ValidationError("Retry backoff must not be negative")
+    return backoff
+
+
 def validate_sx_url(url: str) -> str:
     error = ValidationError(
         "SX_URL should have one of following formats:\n" +
@@ -47,6 +222,68 @@ def validate_sx_url(url: str) -> str:
     raise error
 
 
+def validate_endpoints(endpoints: List[dict]) -> List[dict]:
+    if not endpoints:
+        raise ValidationError("At least one SX_URL is required")
+    for endpoint in endpoints:
+        validate_sx_url(endpoint['url'])
+        if endpoint['weight'] <= 0:
+            raise ValidationError(
+                "Weight of {} must be greater than 0".format(endpoint['url']),
+            )
+    return endpoints
+
+
+def validate_endpoint_policy(policy: str) -> str:
+    if policy not in ENDPOINT_POLICIES:
+        raise ValidationError(
+            "Unknown endpoint policy: {}, use one of {}"
+            .format(policy, ', '.join(ENDPOINT_POLICIES)),
+        )
+    return policy
+
+
+def validate_choice(value: str, choices: tuple, name: str) -> str:
+    if value not in choices:
+        raise ValidationError(
+            "Invalid {}: {} (expected one of: {})"
+            .format(name, value, ', '.join(choices)),
+        )
+    return value
+
+
+def validate_namespace(shape: Args) -> Args:
+    valid = {
+        'depth': shape.get('depth', 0),
+        'fanout': shape.get('fanout') or [10],
+        'name_length': shape.get('name_length'),
+        'prefix': shape.get('prefix', 'sxrumble-'),
+        'recursive': shape.get('recursive', 0.1),
+    }  # type: Args
+    unknown = set(shape) - set(valid)
+    if unknown:
+        raise ValidationError(
+            "Unknown namespace setting: " + ', '.join(sorted(unknown)),
+        )
+    if valid['depth'] < 0:
+        raise ValidationError("Namespace depth must not be negative")
+    if any(fanout < 1 for fanout in valid['fanout']):
+        raise ValidationError("Namespace fanout must be greater than 0")
+    if Namespace(valid['depth'], valid['fanout']).leaves >= 2 ** 63:
+        raise ValidationError("Namespace has too many directories")
+    if '/' in valid['prefix'] or ' ' in valid['prefix']:
+        raise ValidationError("Invalid name prefix: " + valid['prefix'])
+    if valid['name_length'] is not None:
+        shortest, longest = valid['name_length']
+        if shortest <= len(valid['prefix']) or longest < shortest:
+            raise ValidationError(
+                "Name lengths must be longer than the prefix and ordered",
+            )
+    if not 0 <= valid['recursive'] <= 1:
+        raise ValidationError("Share of recursive listings must be 0 to 1")
+    return valid
+
+
 def validate_volume(volume: str) -> str:
     if '/' in volume or ' ' in volume:
         raise ValidationError("Invalid volume name: " + volume)
@@ -0,0 +1,165 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from sxrumble import accesslog
+from sxrumble.accesslog import (
+    CHUNKS_AHEAD, LogParser, get_chunks, import_log, parse_chunk,
+    parse_chunks, parse_log_time,
+)
+from sxrumble.config import Config
+from sxrumble.exceptions import ValidationError
+from sxrumble.sessions import SessionReader
+
+
+LOG = '''\
+10.0.0.1 - - [10/Oct/2016:13:55:36 +0000] "GET /.users HTTP/1.1" 200 512
+10.0.0.1 - - [10/Oct/2016:13:55:37 +0000] "GET /?volumeList HTTP/1.1" 200 9
+garbage
+10.0.0.2 - - [10/Oct/2016:13:55:37 +0000] "GET /.data/abc HTTP/1.1" 200 4096
+10.0.0.2 - - [10/Oct/2016:13:55:39 +0000] "PUT /v1/a/b.txt HTTP/1.1" 200 2000
+10.0.0.2 - - [10/Oct/2016:13:55:38 +0000] "GET /v2?o=acl HTTP/1.1" 200 64
+10.0.0.3 - - [10/Oct/2016:13:55:40 +0000] "GET /logs?filter=a/&recursive \
+HTTP/1.1" 200 10 "-" "sxls"
+10.0.0.3 - - [10/Oct/2016:13:55:41 +0000] "GET /v1?filter=a/*.txt HTTP/1.1" \
+200 10
+10.0.0.3 - - [10/Oct/2016:13:55:42 +0000] "GET /v1/a/b.txt HTTP/1.1" 200 10
+'''
+
+
+@pytest.fixture
+def config():
+    return Config(
+        sx_url='@sx',
+        volumes=['v1', 'v2'],
+        threads=2,
+        min_size=1024,
+        max_size=4096,
+        entropy_size=8192,
+        entropy_seed='c0ffee',
+    )
+
+
+def test_log_parser(config):
+    parser = LogParser(config, 'combined', keep_names=True)
+    parser.origin = parse_log_time('10/Oct/2016:13:55:36 +0000')
+    operations = [parser.parse_line(line) for line in LOG.splitlines()]
+    assert operations[0] == (0.0, 'ListUsers', {})
+    assert operations[1] == (1.0, 'ListVolumes', {})
+    assert operations[2:4] == [None, None]
+    time, type_, params = operations[4]
+    assert (time, type_) == (3.0, 'UploadNewFile')
+    assert (params['volume'], params['filename'], params['size']) == \
+        ('v1', 'a/b.txt', 2000)
+    assert 0 <= params['offset'] <= 8192 - 2000
+    assert operations[5] == (2.0, 'ShowVolumeAcl', {'volume': 'v2'})
+    time, type_, params = operations[6]
+    assert type_ == 'ListFiles'
+    assert params['volume'] in config.volumes
+    assert (params['prefix'], params['recursive']) == ('a/', True)
+    assert operations[7] == (
+        5.0, 'GlobFiles', {'volume': 'v1', 'pattern': 'a/*.txt'},
+    )
+    assert operations[8] is None
+
+
+def test_log_parser_anonymize(config):
+    parser = LogParser(config, 'combined', keep_names=False)
+    upload = parser.parse_line(LOG.splitlines()[4])
+    glob = parser.parse_line(LOG.splitlines()[7])
+    directory, name = upload[2]['filename'].split('/')
+    assert directory.startswith('sxrumble-') and 'b.txt' not in name
+    assert glob[2]['pattern'] == directory + '/*'
+
+
+def test_log_parser_custom_format(config):
+    parser = LogParser(
+        config, r'(?P<time>\S+) (?P<method>\S+) (?P<path>\S+)', True,
+    )
+    assert parser.parse_line('1476107736.5 GET /.users') == \
+        (1476107736.5, 'ListUsers', {})
+    assert parser.parse_line('2016-10-10T13:55:36 GET /.users')[0] == \
+        1476107736.0
+
+
+@pytest.mark.parametrize('log_format', ['(', r'(?P<time>\S+) (?P<path>\S+)'])
+def test_log_parser_invalid_format(config, log_format):
+    with pytest.raises(ValidationError):
+        LogParser(config, log_format, False)
+
+
+def test_get_chunks(tmpdir):
+    path = tmpdir.join('log')
+    path.write('a' * 9 + '\n' + 'b' * 4 + '\n' + 'c' * 9 + '\n')
+    assert get_chunks(str(path), 8) == [(0, 10), (10, 25)]
+    assert get_chunks(str(path), 100) == [(0, 25)]
+
+
+def test_parse_chunks_in_order(tmpdir, config):
+    log = tmpdir.join('access.log')
+    log.write(LOG)
+    parser = LogParser(config, 'combined', False)
+    tasks = [(str(log), parser, s, e) for s, e in get_chunks(str(log), 100)]
+    with patch.object(accesslog, 'CHUNK_SIZE', 100), \
+            patch.object(accesslog.os, 'cpu_count', return_value=2):
+        parsed = list(parse_chunks(str(log), parser))
+    assert parsed == [parse_chunk(task) for task in tasks]
+
+
+def test_parse_chunks_ahead(tmpdir, config):
+    log = tmpdir.join('access.log')
+    log.write(LOG * 10)
+    submitted = []
+
+    def apply_async(function, args):
+        submitted.append(args)
+        return Mock(get=Mock(return_value=([], len(submitted))))
+
+    pool = MagicMock()
+    pool.__enter__.return_value.apply_async.side_effect = apply_async
+    parser = LogParser(config, 'combined', False)
+    with patch.object(accesslog, 'CHUNK_SIZE', 100), \
+            patch.object(accesslog.os, 'cpu_count', return_value=2), \
+            patch.object(accesslog.multiprocessing, 'Pool',
+                         return_value=pool):
+        chunks = parse_chunks(str(log), parser)
+        next(chunks)
+        # Only a few chunks are parsed ahead of the one written.
+        assert len(submitted) == 2 * CHUNKS_AHEAD
+        rest = list(chunks)
+    assert len(rest) + 1 == len(submitted) > 2 * CHUNKS_AHEAD
+
+
+@pytest.mark.parametrize('chunk_size', [100, 2 ** 20])
+def test_import_log(tmpdir, config, chunk_size):
+    log = tmpdir.join('access.log')
+    log.write(LOG)
+    session = str(tmpdir.join('session.yaml'))
+    with patch.object(accesslog, 'CHUNK_SIZE', chunk_size):
+        import_log(str(log), config, 'combined', False, session)
+    with SessionReader(session) as reader:
+        assert reader.config.volumes == ['v1', 'v2']
+        operations = list(reader)
+    types = [o['type'] for o in operations]
+    # Lines out of order are only sorted within a chunk.
+    if chunk_size > len(LOG):
+        assert types == [
+            'ListUsers', 'ListVolumes', 'ShowVolumeAcl', 'UploadNewFile',
+            'ListFiles', 'GlobFiles',
+        ]
+    assert sorted(types) == [
+        'GlobFiles', 'ListFiles', 'ListUsers', 'ListVolumes',
+        'ShowVolumeAcl', 'UploadNewFile',
+    ]
+    times = [o['time'] for o in operations]
+    assert times == sorted(times)
+
+
+def test_import_log_empty(tmpdir, config):
+    log = tmpdir.join('access.log')
+    log.write('garbage\n')
+    with pytest.raises(ValidationError):
+        import_log(str(log), config, 'combined')
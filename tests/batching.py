@@ -0,0 +1,164 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble import batching
+from sxrumble.batching import UploadBatcher
+from sxrumble.capture import CommandResult
+from sxrumble.config import Options
+from sxrumble.control import Gate
+from sxrumble.operations import ListUsers, UploadNewFile
+from sxrumble.phases import QUEUED
+
+
+@pytest.fixture
+def config():
+    return Mock(sx_url='@sx', volumes=['v1'])
+
+
+@pytest.fixture
+def commands():
+    commands = []
+
+    def run_command(args, input, phases, timeout):
+        commands.append(args)
+        return CommandResult(args, 0, b'', b'')
+
+    with patch('sxrumble.operations.get_file_content', return_value=b'x'), \
+            patch('sxrumble.operations.run_command', run_command):
+        yield commands
+
+
+def make_upload(config, filename, size=1):
+    return UploadNewFile(
+        config, volume='v1', filename=filename, size=size, offset=0,
+    )
+
+
+def run_operation(operation, options):
+    operation.run(options)
+    return operation
+
+
+def test_upload_batcher_batches(config, commands):
+    options = Options(upload_batch=2, upload_linger=60.0)
+    uploads = [
+        make_upload(config, 'd0/a', 1),
+        make_upload(config, 'd1/b', 2),
+        make_upload(config, 'd0/c', 3),
+    ]
+    with ThreadPoolExecutor(2) as e:
+        batcher = UploadBatcher(e, options, Gate(2))
+        futures = [
+            batcher.submit(upload, run_operation, upload, options)
+            for upload in uploads
+        ]
+        # The first and the last are batched, the second waits for more.
+        assert wait(futures[::2], timeout=5).not_done == set()
+        assert not futures[1].done()
+        assert batcher.coalesced == 1
+        batcher.close()
+        assert futures[1].result(timeout=5) is uploads[1]
+    assert batcher.coalesced == 0
+    assert sorted(len(args) for args in commands) == [4, 5]
+    assert commands[0][-1] == '@sx/v1/d0/'
+    for upload in uploads:
+        assert upload.error_class == 'ok'
+        assert upload.bytes == upload.size
+        assert upload.duration is not None
+
+
+def test_upload_batcher_linger(config, commands):
+    options = Options(upload_batch=10, upload_linger=0.01)
+    upload = make_upload(config, 'a')
+    with ThreadPoolExecutor(1) as e:
+        batcher = UploadBatcher(e, options, Gate(2))
+        future = batcher.submit(upload, run_operation, upload, options)
+        assert future.result(timeout=5) is upload
+    assert commands[0][-1] == '@sx/v1/'
+
+
+def test_upload_batcher_cancelled(config, commands):
+    options = Options(upload_batch=10, upload_linger=60.0)
+    uploads = [make_upload(config, 'a'), make_upload(config, 'b')]
+    with ThreadPoolExecutor(1) as e:
+        batcher = UploadBatcher(e, options, Gate(2))
+        futures = [
+            batcher.submit(upload, run_operation, upload, options)
+            for upload in uploads
+        ]
+        futures[0].cancel()
+        batcher.close()
+        assert futures[1].result(timeout=5) is uploads[1]
+    assert len(commands) == 1
+    assert commands[0][2:-1][0].endswith('/b')
+    assert len(commands[0]) == 4
+
+
+def test_upload_batcher_single_timer(config, commands):
+    options = Options(upload_batch=10, upload_linger=0.01)
+    uploads = [make_upload(config, '{}/a'.format(i)) for i in range(5)]
+    with ThreadPoolExecutor(2) as e:
+        batcher = UploadBatcher(e, options, Gate(2))
+        threads = threading.active_count()
+        futures = [
+            batcher.submit(upload, run_operation, upload, options)
+            for upload in uploads
+        ]
+        assert threading.active_count() <= threads + 1
+        assert wait(futures, timeout=5).not_done == set()
+        batcher.close()
+        assert not batcher.timer.is_alive()
+    assert len(commands) == 5
+
+
+def test_upload_batcher_gate(config, commands):
+    options = Options(upload_batch=2, upload_linger=60.0)
+    uploads = [make_upload(config, 'a'), make_upload(config, 'b')]
+    gate = Gate(0)
+    with ThreadPoolExecutor(2) as e:
+        batcher = UploadBatcher(e, options, gate)
+        futures = [
+            batcher.submit(upload, run_operation, upload, options)
+            for upload in uploads
+        ]
+        # No place in the gate, the full batch waits for one.
+        assert wait(futures, timeout=0.1).done == set()
+        gate.set_limit(1)
+        assert wait(futures, timeout=5).not_done == set()
+    assert len(commands) == 1
+
+
+def test_upload_batcher_late(config, commands):
+    options = Options(upload_batch=2, upload_linger=60.0)
+    uploads = [make_upload(config, 'a'), make_upload(config, 'b')]
+    with ThreadPoolExecutor(1) as e, \
+            patch.object(batching.logger, 'warning') as warning:
+        batcher = UploadBatcher(e, options, Gate(1), late_threshold=0.01)
+        for upload in uploads:
+            upload.phases.mark(QUEUED, 0.0)
+            batcher.submit(upload, run_operation, upload, options)
+        batcher.close()
+    assert warning.call_args[0][:2] == (
+        'Batch of %d uploads starts %.3fs late', 2,
+    )
+
+
+@pytest.mark.parametrize('operation_class, upload_batch', [
+    (ListUsers, 10),
+    (UploadNewFile, 1),
+])
+def test_upload_batcher_passthrough(config, operation_class, upload_batch):
+    options = Options(upload_batch=upload_batch)
+    operation = Mock(spec=operation_class)
+    executor = Mock()
+    batcher = UploadBatcher(executor, options, Gate(1))
+    assert batcher.submit(operation, run_operation, operation, options) is \
+        executor.submit.return_value
+    executor.submit.assert_called_once_with(run_operation, operation, options)
+    assert batcher.coalesced == 0
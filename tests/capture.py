@@ -0,0 +1,43 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import subprocess
+from unittest.mock import patch
+
+from sxrumble import capture
+from sxrumble.capture import Output, communicate
+
+
+def test_output_keeps_stdout_tail():
+    output = Output()
+    with patch.object(capture, 'OUTPUT_LIMIT', 4):
+        for chunk in (b'ab\n', b'cd\n', b'ef\n', b'gh'):
+            output.add_stdout(chunk)
+        assert output.get_stdout() == b'f\ngh'
+    assert output.stdout_size == 11
+    assert output.stdout_lines == 3
+
+
+def test_output_caps_stderr():
+    output = Output()
+    with patch.object(capture, 'OUTPUT_LIMIT', 4):
+        output.add_stderr(b'abc')
+        output.add_stderr(b'def')
+        output.add_stderr(b'ghi')
+    assert output.get_stderr() == b'abcd'
+
+
+def test_communicate():
+    child_fds, parent_fds = capture.make_pipes()
+    # The child stops reading early, the rest of stdin is dropped.
+    process = subprocess.Popen(
+        ['head', '-c', '10'],
+        stdin=child_fds[0],
+        stdout=child_fds[1],
+        stderr=child_fds[2],
+    )
+    capture.close_all(child_fds)
+    output = communicate(*parent_fds, data=b'x' * 200000)
+    assert process.wait() == 0
+    assert output.get_stdout() == b'x' * 10
+    assert output.get_stderr() == b''
@@ -0,0 +1,73 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import os
+
+import pytest
+
+from sxrumble.checkpoint import Checkpoint, get_checkpoint_filename
+
+
+def test_checkpoint_complete():
+    checkpoint = Checkpoint('s.checkpoint', 's.results')
+    checkpoint.complete(1, 1.5)
+    assert (checkpoint.index, checkpoint.time) == (-1, 0.0)
+    checkpoint.complete(0, 0.5)
+    assert (checkpoint.index, checkpoint.time) == (1, 1.5)
+    checkpoint.complete(3, 3.5)
+    assert checkpoint.done == {3: 3.5}
+    assert checkpoint.is_done(1)
+    assert not checkpoint.is_done(2)
+    assert checkpoint.is_done(3)
+
+
+def test_checkpoint_save_and_load(tmpdir):
+    filename = str(tmpdir.join('s.yaml.checkpoint'))
+    checkpoint = Checkpoint(filename, 's.results')
+    for index in (0, 1, 3):
+        checkpoint.complete(index, index + 0.5)
+    checkpoint.save(1234)
+    assert not os.path.exists(filename + '.tmp')
+
+    loaded = Checkpoint.load(filename)
+    assert loaded.results == 's.results'
+    assert (loaded.index, loaded.time) == (1, 1.5)
+    assert loaded.done == {3: 3.5}
+    assert loaded.results_size == 1234
+
+    loaded.remove()
+    assert not os.path.exists(filename)
+    loaded.remove()
+
+
+def test_checkpoint_window(tmpdir):
+    filename = str(tmpdir.join('s.yaml.checkpoint'))
+    # Replaying from the operation 10 on.
+    checkpoint = Checkpoint(
+        filename, 's.results', 9, 30.0, window_start=30.0, window_end=60.0,
+    )
+    checkpoint.complete(10, 30.5)
+    assert (checkpoint.index, checkpoint.done) == (10, {})
+    checkpoint.save(0)
+    loaded = Checkpoint.load(filename)
+    assert (loaded.window_start, loaded.window_end) == (30.0, 60.0)
+    assert (loaded.index, loaded.time) == (10, 30.5)
+
+
+def test_checkpoint_load_without_window(tmpdir):
+    filename = tmpdir.join('s.yaml.checkpoint')
+    filename.write(
+        '{"results": "s.results", "index": 3, "time": 1.0, "done": [], '
+        '"results_size": 10}',
+    )
+    loaded = Checkpoint.load(str(filename))
+    assert (loaded.window_start, loaded.window_end) == (0.0, None)
+
+
+def test_checkpoint_load_missing(tmpdir):
+    with pytest.raises(SystemExit):
+        Checkpoint.load(str(tmpdir.join('missing.checkpoint')))
+
+
+def test_get_checkpoint_filename():
+    assert get_checkpoint_filename('s.yaml') == 's.yaml.checkpoint'
@@ -0,0 +1,42 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import pickle
+
+from sxrumble.churn import ChurnState, new_name
+
+
+def test_churn_state():
+    state = ChurnState()
+    assert state.pick('volumes') is None
+    assert state.take('volumes') is None
+    state.add('volumes', 'a')
+    state.add('volumes', 'a')
+    state.add('volumes', 'b')
+    assert state.objects['volumes'] == ['a', 'b']
+    assert state.pick('volumes') in ('a', 'b')
+    assert sorted([state.take('volumes'), state.take('volumes')]) == \
+        ['a', 'b']
+    state.discard('volumes', 'a')
+    assert state.objects['volumes'] == []
+
+
+def test_churn_state_discard_grants():
+    state = ChurnState()
+    state.add('grants', ('u1', 'v1'))
+    state.add('grants', ('u2', 'v1'))
+    state.discard_grants('u1')
+    assert state.objects['grants'] == [('u2', 'v1')]
+
+
+def test_churn_state_pickle():
+    state = ChurnState()
+    state.add('users', 'u')
+    copy = pickle.loads(pickle.dumps(state))
+    copy.add('users', 'v')
+    assert copy.objects['users'] == ['u', 'v']
+
+
+def test_new_name():
+    assert new_name().startswith('sxrumble-churn-')
+    assert new_name() != new_name()
@@ -55,6 +55,59 @@ def test_parse_argv_record_defaults():
         'entropy_seed': None,
         'replay': False,
         'session_file': None,
+        'trace': None,
+        'no_spawn_server': False,
+        'synthesize': False,
+        'model_file': None,
+        'output': None,
+        'split': False,
+        'shards': '2',
+        'log_rate': '100',
+        'log_json': None,
+        'timeout': None,
+        'retries': '0',
+        'retry_backoff': '1',
+        'resume': False,
+        'from': None,
+        'to': None,
+        'endpoint_policy': 'round-robin',
+        'namespace': None,
+        'populate': False,
+        'count': None,
+        'batch': '100',
+        'upload_batch': '1',
+        'upload_linger': '0.01',
+        'rate': None,
+        'slo': None,
+        'dashboard': False,
+        'metrics_address': None,
+        'metrics_file': None,
+        'metrics_interval': '15',
+        'control_socket': None,
+        'host_interval': '1',
+        'warm_up': None,
+        'cool_down': None,
+        'steady_state': False,
+        'users': None,
+        'user_model': None,
+        'mix': None,
+        'manifest': None,
+        'by': 'round-robin',
+        'merge': False,
+        'session_files': [],
+        'compare': False,
+        'results_a': None,
+        'results_b': None,
+        'p99_threshold': '10',
+        'throughput_threshold': '10',
+        'alpha': '0.01',
+        'control': False,
+        'socket': None,
+        'command': [],
+        'import': False,
+        'log_file': None,
+        'format': 'combined',
+        'keep_names': False,
     }
     assert actual == expected
 
@@ -70,6 +123,10 @@ def test_parse_argv_record_defaults():
     'record @indian v --entropy-size',
     'record @indian v --entropy-seed',
     'replay',
+    'compare a',
+    'synthesize',
+    'split',
+    'merge',
 ])
 def test_parse_argv_invalid(argv):
     with pytest.raises(DocoptExit):
@@ -119,6 +176,12 @@ def test_parse_argv_invalid(argv):
     ), (
         '@indian v --entropy-seed abcdefabcdef',
         {'entropy_seed': 'abcdefabcdef'},
+    ), (
+        '@indian v --trace trace.json',
+        {'trace': 'trace.json'},
+    ), (
+        '@indian v --no-spawn-server',
+        {'no_spawn_server': True},
     ),
 ])
 def test_parse_argv_record(argv, expected):
@@ -131,6 +194,12 @@ def test_parse_argv_record(argv, expected):
     (
         'config.yaml',
         {'session_file': 'config.yaml'},
+    ), (
+        'config.yaml --trace trace.json',
+        {
+            'session_file': 'config.yaml',
+            'trace': 'trace.json',
+        },
     ),
 ])
 def test_parse_argv_replay(argv, expected):
@@ -166,3 +235,105 @@ def test_rename_args():
 ])
 def test_rename_key(key, expected):
     assert rename_key(key) == expected
+
+
+@pytest.mark.parametrize('argv, expected', [
+    (
+        'a.results b.results',
+        {
+            'results_a': 'a.results',
+            'results_b': 'b.results',
+            'p99_threshold': '10',
+        },
+    ), (
+        'a b --p99-threshold 5 --throughput-threshold 3 --alpha 0.05',
+        {
+            'p99_threshold': '5',
+            'throughput_threshold': '3',
+            'alpha': '0.05',
+        },
+    ), (
+        'a b --warm-up 30s --steady-state',
+        {
+            'warm_up': '30s',
+            'cool_down': None,
+            'steady_state': True,
+        },
+    ),
+])
+def test_parse_argv_compare(argv, expected):
+    args = parse_argv('compare ' + argv)
+    assert args['compare'] is True
+    for name in expected:
+        assert args[name] == expected[name]
+
+
+@pytest.mark.parametrize('argv, expected', [
+    (
+        'model.yaml',
+        {
+            'model_file': 'model.yaml',
+            'output': None,
+        },
+    ), (
+        'model.yaml -o session.yaml',
+        {'output': 'session.yaml'},
+    ),
+])
+def test_parse_argv_synthesize(argv, expected):
+    args = parse_argv('synthesize ' + argv)
+    assert args['synthesize'] is True
+    for name in expected:
+        assert args[name] == expected[name]
+
+
+@pytest.mark.parametrize('command', ['replay s.yaml', 'record @sx v'])
+def test_parse_argv_logging(command):
+    args = parse_argv(command + ' --log-rate 0 --log-json log.jsonl')
+    assert args['log_rate'] == '0'
+    assert args['log_json'] == 'log.jsonl'
+
+
+def test_parse_argv_retries():
+    args = parse_argv(
+        'replay s.yaml --timeout 30,UploadNewFile=120 --retries 2 '
+        '--retry-backoff 0.5',
+    )
+    assert args['timeout'] == '30,UploadNewFile=120'
+    assert args['retries'] == '2'
+    assert args['retry_backoff'] == '0.5'
+    assert args['resume'] is False
+    assert parse_argv('replay s.yaml --resume')['resume'] is True
+
+
+def test_parse_argv_window():
+    args = parse_argv('replay s.yaml --from 1h --to 90m')
+    assert (args['from'], args['to']) == ('1h', '90m')
+
+
+def test_parse_argv_split():
+    args = parse_argv('split s.yaml --shards 4 --by volume')
+    assert args['split'] is True
+    assert args['session_file'] == 's.yaml'
+    assert args['shards'] == '4'
+    assert args['by'] == 'volume'
+
+
+def test_parse_argv_merge():
+    args = parse_argv('merge a.yaml b.yaml -o c.yaml')
+    assert args['merge'] is True
+    assert args['session_files'] == ['a.yaml', 'b.yaml']
+    assert args['output'] == 'c.yaml'
+
+
+def test_parse_argv_populate():
+    args = parse_argv(
+        'populate @indian v1 v2 --count 1000 --batch 50 --manifest m --resume',
+    )
+    assert args['populate'] is True
+    assert (args['count'], args['batch'], args['manifest']) == \
+        ('1000', '50', 'm')
+    assert args['resume'] is True
+    assert parse_argv('record @indian v --manifest m')['manifest'] == 'm'
+    with pytest.raises(SystemExit):
+        parse_argv('populate @indian v1')
@@ -0,0 +1,73 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from array import array
+
+import pytest
+
+from sxrumble.compare import compare, relative_change, select_window
+from sxrumble.results import Results
+
+
+def make_results(durations, span):
+    n = len(durations)
+    starts = [span * i / (n - 1) - d for i, d in enumerate(durations)]
+    header = {'types': ['ListUsers'], 'volumes': [], 'error_classes': []}
+    return Results(header, {
+        'type': array('B', [0] * n),
+        'start': array('d', starts),
+        'end': array('d', [s + d for s, d in zip(starts, durations)]),
+        'duration': array('d', durations),
+        'error_class': array('B', [0] * n),
+    })
+
+
+THRESHOLDS = {
+    'p99_threshold': 10,
+    'throughput_threshold': 10,
+    'alpha': 0.01,
+}
+
+
+def test_compare_same():
+    durations = [0.1 + i / 1000 for i in range(200)]
+    a = make_results(durations, 100)
+    assert compare(a, a, **THRESHOLDS) == []
+
+
+def test_compare_latency_regression():
+    durations = [0.1 + i / 1000 for i in range(200)]
+    a = make_results(durations, 100)
+    b = make_results([d * 2 for d in durations], 100)
+    regressions = compare(a, b, **THRESHOLDS)
+    assert len(regressions) == 1
+    assert regressions[0].startswith('ListUsers p99 latency is +100.0%')
+    # Faster is not a regression.
+    assert compare(b, a, **THRESHOLDS) == []
+
+
+def test_compare_throughput_regression():
+    durations = [0.1] * 100
+    a = make_results(durations, 10)
+    b = make_results(durations, 20)
+    assert compare(a, b, **THRESHOLDS) == ['Throughput is -49.8%']
+
+
+def test_select_window():
+    results = make_results([0.1] * 101, 100)
+    selected = select_window(results, 'a.results', 10.0, 20.0, False)
+    # From 10s after the first start, until 20s before the last end.
+    assert min(selected['start']) == pytest.approx(9.9)
+    assert max(selected['start']) == pytest.approx(79.9)
+    assert len(selected) == 71
+    with pytest.raises(SystemExit):
+        select_window(results, 'a.results', 60.0, 60.0, False)
+
+
+@pytest.mark.parametrize('before, after, expected', [
+    (1, 2, 100),
+    (2, 1, -50),
+    (0, 1, 0),
+])
+def test_relative_change(before, after, expected):
+    assert relative_change(before, after) == expected
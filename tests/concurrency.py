@@ -0,0 +1,51 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import Mock
+
+from sxrumble.concurrency import (
+    ConcurrencyController, CONTROL_INTERVAL, MIN_SAMPLES,
+)
+
+
+SLO = {'percentile': 99.0, 'latency': 0.5, 'errors': 10.0}
+
+
+def run_window(controller, now, duration, failed=0):
+    for i in range(MIN_SAMPLES):
+        controller.add(Mock(
+            duration=duration,
+            error_class='exit' if i < failed else 'ok',
+        ))
+    controller.update(now)
+
+
+def test_concurrency_controller():
+    controller = ConcurrencyController(16, SLO, 0.0)
+    # Too early for a window.
+    run_window(controller, CONTROL_INTERVAL / 2, 0.1)
+    assert controller.limit == 1
+
+    # Slow start, up to the maximum.
+    for i, limit in enumerate([2, 4, 8, 16, 16]):
+        run_window(controller, CONTROL_INTERVAL * (i + 1), 0.1)
+        assert controller.limit == limit
+
+    # Multiplicative decrease, then additive increase.
+    run_window(controller, 10.0, 0.6)
+    assert controller.limit == 12
+    run_window(controller, 11.0, 0.1, failed=MIN_SAMPLES // 2)
+    assert controller.limit == 9
+    run_window(controller, 12.0, 0.1)
+    assert controller.limit == 10
+
+    assert controller.best == 16
+    assert [t[1] for t in controller.trajectory] == \
+        [1, 2, 4, 8, 16, 16, 12, 9]
+    assert controller.trajectory[5][2] == 0.6
+
+
+def test_concurrency_controller_floor():
+    controller = ConcurrencyController(8, SLO, 0.0)
+    run_window(controller, 1.0, 1.0)
+    assert (controller.limit, controller.best) == (1, 0)
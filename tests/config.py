@@ -6,7 +6,7 @@ from unittest.mock import patch, mock_open
 import pytest
 import yaml
 
-from sxrumble.config import Session, Config
+from sxrumble.config import Session, Config, Options, save_session_to_file
 
 
 @pytest.fixture
@@ -48,6 +48,54 @@ def test_session_serialize(args):
     config = Config(**args)
     session = Session(config, [])
     assert session.serialize() == {
-        'config': args,
+        'config': dict(
+            args,
+            endpoints=[{'url': '@indian', 'weight': 1}],
+            endpoint_policy='round-robin',
+            namespace={
+                'depth': 0,
+                'fanout': [10],
+                'name_length': None,
+                'prefix': 'sxrumble-',
+                'recursive': 0.1,
+            },
+        ),
         'operations': [],
     }
+
+
+def test_session_default_options(args):
+    session = Session(Config(**args))
+    assert session.options.trace_file is None
+    assert session.options.spawn_server is True
+    assert session.options.get_timeout('ListFiles') is None
+    assert session.options.retries == 0
+
+
+def test_session_options_from_args(args):
+    args['trace'] = 'trace.json'
+    args['no_spawn_server'] = True
+    session = Session.from_cli(args)
+    assert session.options.trace_file == 'trace.json'
+    assert session.options.spawn_server is False
+
+
+def test_options_get_timeout():
+    options = Options(timeout={'*': 60.0, 'UploadNewFile': 120.0})
+    assert options.get_timeout('UploadNewFile') == 120.0
+    assert options.get_timeout('ListFiles') == 60.0
+    assert Options(timeout={'ListFiles': 5.0}).get_timeout('ListUsers') \
+        is None
+
+
+def test_session_for_replay(tmpdir, args):
+    filename = str(tmpdir.join('session.yaml'))
+    save = Session(Config(**args), [
+        {'time': 0.5, 'type': 'ListUsers', 'params': {}},
+    ])
+    with patch('sxrumble.config.get_session_filename', return_value=filename):
+        save_session_to_file(save)
+    session = Session.for_replay(filename)
+    assert session.filename == filename
+    assert session.config.threads == args['threads'] * 2
+    assert session.operations is None
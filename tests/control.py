@@ -0,0 +1,121 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import os
+import socket
+import threading
+from unittest.mock import Mock
+
+import pytest
+
+from sxrumble.control import (
+    Controls, ControlServer, Gate, parse_weights, send_command,
+    remove_stale_socket,
+)
+from sxrumble.exceptions import ValidationError
+from sxrumble.metrics import Metrics, TYPE_NAMES
+
+
+def test_gate():
+    gate = Gate(1)
+    entered = threading.Event()
+
+    def enter():
+        with gate:
+            entered.set()
+
+    with gate:
+        thread = threading.Thread(target=enter)
+        thread.start()
+        assert not entered.wait(0.05)
+        gate.set_limit(2)
+        assert entered.wait(1)
+    thread.join()
+    assert gate.inside == 0
+
+
+def test_controls_execute():
+    controls = Controls(4, 16, rate=10.0)
+    assert controls.execute('status') == 'ok threads=4 rate=10'
+    assert controls.execute('threads 16') == 'ok threads=16 rate=10'
+    assert controls.threads == 16
+    assert controls.execute('rate 2.5') == 'ok threads=16 rate=2.5'
+    assert controls.execute('weights UploadNewFile=3,ListFiles') == \
+        'ok threads=16 rate=2.5 weights=ListFiles=1,UploadNewFile=3'
+    assert controls.execute('pause').endswith(' paused')
+    assert controls.paused
+    controls.execute('resume')
+    assert not controls.paused
+    assert controls.execute('weights') == 'ok threads=16 rate=2.5'
+
+
+def test_controls_execute_replay():
+    controls = Controls(4, replay=True)
+    assert controls.execute('speed 2') == 'ok threads=4 speed=2'
+    assert controls.speed == 2.0
+
+
+@pytest.mark.parametrize('controls, command', [
+    (Controls(4, 16), 'threads 17'),
+    (Controls(4, 16), 'threads 0'),
+    (Controls(4, 16), 'threads many'),
+    (Controls(4), 'rate 10'),
+    (Controls(4, rate=1.0), 'rate 0'),
+    (Controls(4), 'speed 2'),
+    (Controls(4, replay=True), 'speed -1'),
+    (Controls(4, replay=True), 'weights ListUsers=1'),
+    (Controls(4), 'weights Nonexistent=1'),
+    (Controls(4), 'weights ListUsers=-1'),
+    (Controls(4), 'weights ListUsers=0'),
+    (Controls(4), 'stop'),
+])
+def test_controls_execute_invalid(controls, command):
+    with pytest.raises(ValidationError):
+        controls.execute(command)
+
+
+def test_parse_weights():
+    weights = parse_weights('ListUsers=1, UploadNewFile=3')
+    assert len(weights) == len(TYPE_NAMES)
+    assert weights[TYPE_NAMES.index('ListUsers')] == 1.0
+    assert weights[-1] == 4.0
+    assert parse_weights('') is None
+
+
+def test_control_server(tmpdir):
+    path = str(tmpdir.join('control'))
+    controls = Controls(4, 16)
+    server = ControlServer(path, controls, Metrics(0.0))
+    server.start()
+    try:
+        assert send_command(path, 'threads 8') == 'ok threads=8'
+        assert controls.threads == 8
+        assert send_command(path, 'threads 0').startswith('error ')
+        assert send_command(path, 'snapshot').startswith('ok\n')
+        with pytest.raises(SystemExit):
+            ControlServer(path, controls, Metrics(0.0))
+    finally:
+        server.stop()
+    assert not os.path.exists(path)
+    with pytest.raises(SystemExit):
+        send_command(path, 'status')
+
+
+def test_remove_stale_socket(tmpdir):
+    path = str(tmpdir.join('control'))
+    stale = socket.socket(socket.AF_UNIX)
+    stale.bind(path)
+    stale.close()
+    remove_stale_socket(path)
+    assert not os.path.exists(path)
+
+
+def test_controls_for_session():
+    session = Mock()
+    session.config.threads = 4
+    session.options.control_socket = None
+    assert Controls.for_session(session).max_threads == 4
+    session.options.control_socket = 'control'
+    controls = Controls.for_session(session, replay=True)
+    assert (controls.threads, controls.max_threads) == (4, 256)
+    assert controls.replay
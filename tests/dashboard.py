@@ -0,0 +1,83 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import io
+import logging
+from unittest.mock import Mock
+
+from sxrumble.dashboard import REDRAW, Dashboard, render
+from sxrumble.logs import ConsoleHandler, console_diversion, console_filter
+from sxrumble.metrics import TypeSnapshot
+
+
+def make_snapshot(**kwargs):
+    snapshot = Mock(
+        elapsed=12.3, in_flight=8, rate=52.25, bytes_rate=2048.0, errors=0.5,
+        lag_p99=None, progress=None,
+        types={'ListUsers': TypeSnapshot(52.25, 0.01, 0.2, 0.5)},
+    )
+    snapshot.configure_mock(**kwargs)
+    return snapshot
+
+
+def test_render():
+    lines = render(make_snapshot())
+    assert lines[0] == \
+        '12s | 8 in flight | 52.2 ops/s | 2 KiB/s | 0.5% errors'
+    assert lines[2].split() == \
+        ['ListUsers', '52.2', '0.010s', '0.200s', '0.5%']
+    status = render(make_snapshot(lag_p99=0.25, progress=0.5))[0]
+    assert status.endswith('| lag p99=0.250s | 50.0% done')
+
+
+def test_dashboard():
+    stream = io.StringIO()
+    metrics = Mock()
+    metrics.snapshot.return_value = make_snapshot()
+    dashboard = Dashboard(metrics, stream)
+    dashboard.start()
+    assert console_filter.level == logging.WARNING
+    assert console_diversion.write == dashboard.write_log
+    dashboard.stop()
+    assert console_filter.level == logging.NOTSET
+    assert console_diversion.write is None
+    # Not a terminal, so frames follow each other.
+    assert stream.getvalue().count('in flight') >= 1
+    assert '\033[' not in stream.getvalue()
+
+
+class Terminal(io.StringIO):
+
+    def isatty(self):
+        return True
+
+
+def test_dashboard_logs_above_frame():
+    stream = Terminal()
+    metrics = Mock()
+    metrics.snapshot.return_value = make_snapshot()
+    dashboard = Dashboard(metrics, stream)
+    dashboard.draw()
+    frame = stream.getvalue()
+    height = frame.count('\n')
+    dashboard.write_log('[WARNING] slow\n')
+    # The frame is cleared, the record written, and the frame drawn below.
+    assert stream.getvalue() == \
+        frame + REDRAW.format(height) + '[WARNING] slow\n' + frame
+    dashboard.draw()
+    assert stream.getvalue().endswith(REDRAW.format(height) + frame)
+
+
+def test_console_handler_diverted():
+    stream = io.StringIO()
+    handler = ConsoleHandler(stream)
+    written = []
+    record = logging.makeLogRecord({'msg': 'slow', 'levelno': 30})
+    console_diversion.write = written.append
+    try:
+        handler.emit(record)
+    finally:
+        console_diversion.write = None
+    assert written == ['slow\n']
+    handler.emit(record)
+    assert stream.getvalue() == 'slow\n'
@@ -0,0 +1,61 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from collections import Counter
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble.endpoints import EndpointSelector
+from sxrumble.operations import ListFiles, ListUsers
+
+
+def make_config(policy, weights=(1, 1)):
+    return Mock(
+        sx_url='@n0',
+        endpoints=[
+            {'url': '@n{}'.format(i), 'weight': weight}
+            for i, weight in enumerate(weights)
+        ],
+        endpoint_policy=policy,
+    )
+
+
+@pytest.mark.parametrize('policy', ['round-robin', 'weighted', 'sticky'])
+def test_endpoint_selector_single(policy):
+    selector = EndpointSelector(make_config(policy, [1]))
+    assert {selector.pick('v{}'.format(i)) for i in range(10)} == {0}
+
+
+def test_endpoint_selector_round_robin():
+    selector = EndpointSelector(make_config('round-robin', [5, 1, 1]))
+    assert [selector.pick('v') for _ in range(6)] == [0, 1, 2, 0, 1, 2]
+
+
+def test_endpoint_selector_weighted():
+    selector = EndpointSelector(make_config('weighted', [3, 1]))
+    with patch('random.random', side_effect=[0.0, 0.74, 0.75, 0.99]):
+        assert [selector.pick() for _ in range(4)] == [0, 0, 1, 1]
+
+
+def test_endpoint_selector_sticky():
+    selector = EndpointSelector(make_config('sticky', [1, 1, 1]))
+    volumes = ['v{}'.format(i) for i in range(300)]
+    picks = [selector.pick(v) for v in volumes]
+    assert picks == [selector.pick(v) for v in volumes]
+    assert all(count > 50 for count in Counter(picks).values())
+    # Operations without a volume go round-robin.
+    assert [selector.pick() for _ in range(3)] == [0, 1, 2]
+
+
+def test_endpoint_selector_assign():
+    config = make_config('sticky')
+    selector = EndpointSelector(config)
+    listing = ListFiles(config, volume='v1')
+    selector.assign(listing)
+    assert listing.endpoint == selector.pick('v1')
+    assert listing.prepare_command()[0] == [
+        'sxls', '@n{}/v1'.format(listing.endpoint),
+    ]
+    users = ListUsers(config)
+    assert (users.endpoint, users.sx_url) == (0, '@n0')
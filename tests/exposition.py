@@ -0,0 +1,104 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import Mock, patch
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import pytest
+
+from sxrumble import metrics as metrics_module
+from sxrumble.exposition import (
+    MetricsServer, TextfileWriter, format_metrics,
+)
+from sxrumble.metrics import Metrics
+from sxrumble.operations import ListUsers
+from sxrumble.phases import QUEUED, DEQUEUED, REPORTED
+
+
+def make_operation(duration, error_class='ok'):
+    operation = ListUsers(Mock())
+    operation.duration = duration
+    operation.error_class = error_class
+    operation.bytes = 100
+    operation.phases.mark(QUEUED, 10.0)
+    operation.phases.mark(DEQUEUED, 10.5)
+    operation.phases.mark(REPORTED, 10.5 + duration)
+    return operation
+
+
+@pytest.fixture
+def metrics():
+    with patch.object(metrics_module, 'monotonic', return_value=10.0):
+        metrics = Metrics(10.0)
+    for duration in [0.003, 0.04, 0.04]:
+        metrics.add(make_operation(duration))
+    metrics.add(make_operation(0.2, 'timeout'))
+    metrics.dispatched = 6
+    return metrics
+
+
+def test_format_metrics(metrics):
+    lines = format_metrics(metrics).splitlines()
+    assert '# TYPE sxrumble_operations counter' in lines
+    assert 'sxrumble_operations_total{type="ListUsers",result="ok"} 3' \
+        in lines
+    assert 'sxrumble_operations_total{type="ListUsers",result="timeout"} 1' \
+        in lines
+    assert not any('UploadNewFile' in line for line in lines)
+    assert 'sxrumble_bytes_total{type="ListUsers"} 400' in lines
+    family = 'sxrumble_operation_duration_seconds'
+    assert family + '_bucket{type="ListUsers",le="0.005"} 1' in lines
+    assert family + '_bucket{type="ListUsers",le="0.025"} 1' in lines
+    assert family + '_bucket{type="ListUsers",le="0.05"} 3' in lines
+    assert family + '_bucket{type="ListUsers",le="+Inf"} 3' in lines
+    assert family + '_count{type="ListUsers"} 3' in lines
+    assert family + '_sum{type="ListUsers"} 0.083000' in lines
+    assert 'sxrumble_operation_response_seconds_bucket' \
+        '{type="ListUsers",le="1.0"} 3' in lines
+    assert 'sxrumble_in_flight 2' in lines
+    assert 'sxrumble_schedule_lag_seconds 0.500000' in lines
+    assert not any('progress' in line for line in lines)
+    assert lines[-1] == '# EOF'
+
+
+def test_format_metrics_text(metrics):
+    metrics.schedule = 0.0, 10.0
+    metrics.due = 2.5
+    lines = format_metrics(metrics, openmetrics=False).splitlines()
+    assert '# TYPE sxrumble_operations_total counter' in lines
+    assert 'sxrumble_replay_progress_ratio 0.250000' in lines
+    assert '# EOF' not in lines
+
+
+def test_metrics_server(metrics):
+    server = MetricsServer(metrics, ('127.0.0.1', 0))
+    server.start()
+    try:
+        url = 'http://127.0.0.1:{}/metrics'.format(
+            server.httpd.server_address[1],
+        )
+        with urlopen(Request(url, headers={
+                'Accept': 'application/openmetrics-text'})) as response:
+            assert response.headers['Content-Type'].startswith(
+                'application/openmetrics-text',
+            )
+            assert response.read().decode().endswith('# EOF\n')
+        with urlopen(url) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+        with pytest.raises(HTTPError):
+            urlopen(url + 'x')
+    finally:
+        server.stop()
+    with pytest.raises(SystemExit):
+        MetricsServer(metrics, ('256.0.0.0', 0))
+
+
+def test_textfile_writer(tmpdir, metrics):
+    filename = str(tmpdir.join('sxrumble.prom'))
+    writer = TextfileWriter(metrics, filename, 60.0)
+    writer.start()
+    writer.stop()
+    with open(filename) as f:
+        assert 'sxrumble_in_flight 2\n' in f.read()
+    assert tmpdir.listdir() == [tmpdir.join('sxrumble.prom')]
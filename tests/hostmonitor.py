@@ -0,0 +1,113 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import csv
+import os
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble import hostmonitor
+from sxrumble.hostmonitor import (
+    HostMonitor, Sample, SUSTAINED, get_host_filename, read_meminfo, read_net,
+    read_stat, start_host_monitor,
+)
+
+
+NET_DEV = """\
+Inter-|   Receive                                                |  Transmit
+ face |bytes    packets errs drop fifo frame compressed multicast|bytes
+    lo: 5000 10 0 0 0 0 0 0 5000 10 0 0 0 0 0 0
+  eth0: {} 10 0 0 0 0 0 0 {} 10 0 0 0 0 0 0
+"""
+
+
+def write_proc(proc, busy, idle, context_switches, rx_bytes, tx_bytes):
+    with open(os.path.join(proc, 'stat'), 'w') as f:
+        f.write('cpu  {} 0 0 {} 0 0 0 0 0 0\n'.format(busy, idle))
+        f.write('cpu0 {} 0 0 {} 0 0 0 0 0 0\n'.format(busy, idle))
+        f.write('ctxt {}\n'.format(context_switches))
+    with open(os.path.join(proc, 'net', 'dev'), 'w') as f:
+        f.write(NET_DEV.format(rx_bytes, tx_bytes))
+
+
+@pytest.fixture
+def proc(tmpdir):
+    proc = str(tmpdir.mkdir('proc'))
+    os.makedirs(os.path.join(proc, 'net'))
+    os.makedirs(os.path.join(proc, 'self', 'fd'))
+    for fd in range(3):
+        open(os.path.join(proc, 'self', 'fd', str(fd)), 'w').close()
+    with open(os.path.join(proc, 'loadavg'), 'w') as f:
+        f.write('0.50 0.40 0.30 2/72 25473\n')
+    with open(os.path.join(proc, 'meminfo'), 'w') as f:
+        f.write('MemTotal:  1000 kB\nMemFree:  100 kB\n')
+        f.write('MemAvailable:  400 kB\n')
+    write_proc(proc, 100, 100, 1000, 0, 0)
+    return proc
+
+
+def test_read_proc(proc):
+    assert read_stat(proc) == (100, 200, 1000)
+    assert read_meminfo(proc) == (1000 * 1024, 400 * 1024)
+    assert read_net(proc) == (0, 0)
+
+
+def make_monitor(proc, tmpdir):
+    metrics = Mock(finished=0)
+    filename = str(tmpdir.join('run.host.csv'))
+    with patch.object(hostmonitor, 'monotonic', return_value=10.0):
+        return HostMonitor(metrics, 10.0, 1.0, filename, proc=proc)
+
+
+def test_host_monitor_sample(proc, tmpdir):
+    monitor = make_monitor(proc, tmpdir)
+    monitor.metrics.finished = 42
+    write_proc(proc, 190, 110, 3000, 2048, 1024)
+    with patch.object(hostmonitor, 'monotonic', return_value=12.0):
+        monitor.sample()
+    sample = monitor.samples[-1]
+    assert sample.time == 2.0
+    assert sample.finished == 42
+    assert sample.cpu == 0.9
+    assert sample.load == 0.5
+    assert sample.memory_available == 400 * 1024
+    assert sample.fds == 3
+    assert sample.context_switches == 1000.0
+    assert (sample.rx_bytes, sample.tx_bytes) == (1024.0, 512.0)
+    monitor.file.close()
+    with open(monitor.filename) as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == list(Sample._fields)
+    assert rows[1][:3] == ['2.000', '42', '0.900']
+
+
+def test_host_monitor_saturation(proc, tmpdir):
+    monitor = make_monitor(proc, tmpdir)
+    busy = Sample(
+        0.0, 0, 0.95, 0.1, 0.5, 400, 1000, 3, 1024, 0.0, 0.0, 0.0,
+    )
+    for i in range(SUSTAINED - 1):
+        monitor.samples.append(busy._replace(time=i + 1.0))
+        monitor.check(monitor.samples[-1])
+    assert not monitor.saturated_since
+    monitor.samples.append(busy._replace(time=float(SUSTAINED)))
+    monitor.check(monitor.samples[-1])
+    assert monitor.saturated_since == {'cpu': 0.0}
+    monitor.check(busy._replace(time=10.0, cpu=0.5, fds=1000))
+    assert monitor.saturations == [('cpu', 0.0, 10.0)]
+    assert monitor.streaks['fds'] == 1
+    monitor.file.close()
+
+
+def test_start_host_monitor_without_proc(tmpdir):
+    filename = str(tmpdir.join('run.host.csv'))
+    assert start_host_monitor(Mock(), 0.0, 0.0, filename) is None
+    with patch.object(hostmonitor, 'read_stat', side_effect=OSError):
+        assert start_host_monitor(Mock(), 0.0, 1.0, filename) is None
+
+
+def test_get_host_filename():
+    assert get_host_filename('sxrumble-2016-10-10-13:55:36.results') == \
+        'sxrumble-2016-10-10-13:55:36.host.csv'
+    assert get_host_filename('runs/a.results') == 'runs/a.host.csv'
@@ -1,16 +1,26 @@
 # Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
 # License: Apache 2.0, see LICENSE for more details.
 
+import json
 import logging
 
-from unittest.mock import Mock
+from unittest.mock import Mock, patch
 
+from sxrumble import logs
 from sxrumble.logs import (
     get_formatter, ColoredFormatter, prepare_process_error_message,
-    maybe_decode, format_line,
+    maybe_decode, format_line, JsonFormatter, RateLimitFilter,
+    configure_logging,
 )
 
 
+def make_record(level, msg, args=None):
+    return logging.LogRecord(
+        level=level, msg=msg,
+        name='test', pathname=None, lineno=None, args=args, exc_info=None,
+    )
+
+
 def test_get_formatter():
     formatter = get_formatter(use_colors=False)
     assert type(formatter) == logging.Formatter
@@ -38,6 +48,50 @@ def test_colored_formatter():
     assert color_format(logging.CRITICAL, 'foo') == '\033[31;1mfoo\033[0m'
 
 
+def test_json_formatter():
+    record = make_record(logging.INFO, 'foo %s', ('bar',))
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload['level'] == 'INFO'
+    assert payload['logger'] == 'test'
+    assert payload['message'] == 'foo bar'
+    assert 'exception' not in payload
+
+
+def test_rate_limit_filter():
+    log_filter = RateLimitFilter({logging.DEBUG: 2})
+    with patch.object(logs, 'monotonic', return_value=1.5):
+        passed = [
+            log_filter.filter(make_record(logging.DEBUG, 'op %d', (i,)))
+            for i in range(5)
+        ]
+        assert log_filter.filter(make_record(logging.ERROR, 'error'))
+    assert passed == [True, True, False, False, False]
+
+    record = make_record(logging.DEBUG, 'op %d', (5,))
+    with patch.object(logs, 'monotonic', return_value=2.1):
+        assert log_filter.filter(record)
+    assert record.getMessage() == 'op 5 (3 similar messages suppressed)'
+
+
+def test_configure_logging(tmpdir):
+    filename = str(tmpdir.join('log.jsonl'))
+    root = logging.getLogger()
+    handlers = root.handlers[:]
+    try:
+        listener = configure_logging(
+            use_colors=False, debug_rate=1, json_file=filename,
+        )
+        logging.getLogger('test').debug('first')
+        logging.getLogger('test').debug('second')
+        logging.getLogger('test').info('third')
+        listener.stop()
+    finally:
+        root.handlers = handlers
+    with open(filename) as f:
+        messages = [json.loads(line)['message'] for line in f]
+    assert messages == ['first', 'third']
+
+
 def test_prepare_process_error_message():
     proc = Mock(returncode=1, args=['ls'], stdout='', stderr='')
     assert prepare_process_error_message('test', proc) == \
@@ -0,0 +1,79 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from array import array
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble import metrics
+from sxrumble.metrics import Metrics, WINDOW, sample
+from sxrumble.operations import ListUsers, UploadNewFile
+from sxrumble.phases import QUEUED, DEQUEUED, REPORTED
+
+
+def make_operation(cls, reported, duration=0.1, error_class='ok', lag=0.0):
+    operation = cls(Mock(), volume='v', filename='f', size=1, offset=0) \
+        if cls is UploadNewFile else cls(Mock())
+    operation.duration = duration
+    operation.error_class = error_class
+    operation.bytes = 1024
+    operation.phases.mark(QUEUED, reported - duration - lag)
+    operation.phases.mark(DEQUEUED, reported - duration)
+    operation.phases.mark(REPORTED, reported)
+    return operation
+
+
+@pytest.fixture
+def run():
+    with patch.object(metrics, 'monotonic', return_value=100.0):
+        run = Metrics(100.0)
+    for second in range(100, 120):
+        run.add(make_operation(ListUsers, second + 0.5))
+        run.add(make_operation(
+            UploadNewFile, second + 0.5, 0.2, lag=0.5,
+            error_class='exit' if second % 2 else 'ok',
+        ))
+    run.dispatched = run.finished + 3
+    return run
+
+
+def test_metrics_buckets(run):
+    assert len(run.buckets) == WINDOW + 2
+    assert run.buckets[-1].second == 119
+
+
+def test_metrics_snapshot(run):
+    snapshot = run.snapshot(120.5)
+    assert snapshot.elapsed == 20.5
+    assert snapshot.in_flight == 3
+    assert snapshot.rate == 2.0
+    assert snapshot.bytes_rate == 2048.0
+    assert snapshot.errors == 25.0
+    assert snapshot.lag_p99 == pytest.approx(0.5)
+    assert snapshot.progress is None
+    assert list(snapshot.types) == ['ListUsers', 'UploadNewFile']
+    upload = snapshot.types['UploadNewFile']
+    assert (upload.rate, upload.errors) == (1.0, 50.0)
+    assert upload.p99 == pytest.approx(0.2)
+
+
+def test_metrics_snapshot_start():
+    with patch.object(metrics, 'monotonic', return_value=100.0):
+        run = Metrics(100.0)
+    assert run.snapshot(100.2).rate == 0.0
+    run.add(make_operation(ListUsers, 100.5))
+    run.schedule = 30.0, 50.0
+    run.due = 35.0
+    snapshot = run.snapshot(102.1)
+    assert snapshot.rate == 1.0
+    assert snapshot.progress == 0.25
+
+
+def test_sample():
+    values = array('d')
+    with patch.object(metrics, 'MAX_SAMPLES', 4):
+        for i in range(100):
+            sample(values, i, i + 1)
+    assert len(values) == 4
+    assert len(set(values)) == 4
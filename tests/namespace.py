@@ -0,0 +1,60 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+from sxrumble.namespace import Namespace
+
+
+def test_namespace_flat():
+    namespace = Namespace()
+    name = namespace.pick_filename('v1')
+    assert name.startswith('sxrumble-') and len(name) == 45
+    assert '/' not in name
+    assert namespace.pick_prefix('v1') == ''
+    assert namespace.pick_recursive() is False
+    assert namespace.populated == {}
+
+
+def test_namespace_format_directory():
+    namespace = Namespace(depth=3, fanout=[2, 12])
+    assert namespace.fanouts == [2, 12, 12]
+    assert namespace.leaves == 288
+    leaf = 1 * 144 + 3 * 12 + 11
+    assert namespace.format_directory(leaf, 3) == 'd1/d03/d11/'
+    assert namespace.format_directory(leaf, 1) == 'd1/'
+    assert namespace.format_directory(leaf, 0) == ''
+
+
+def test_namespace_populated():
+    namespace = Namespace(depth=2, fanout=[100])
+    with patch('random.randrange', return_value=4207):
+        name = namespace.pick_filename('v1')
+    assert name.startswith('d42/d07/sxrumble-')
+    assert namespace.pick_filename('v1') != name
+    known, leaves = namespace.populated['v1']
+    assert len(leaves) == len(known) == 2
+    for _ in range(20):
+        prefix = namespace.pick_prefix('v1')
+        assert prefix.count('/') <= 2
+        pattern = namespace.pick_pattern('v1')
+        assert pattern.count('/') == 2 and pattern.endswith('*')
+    assert namespace.pick_prefix('v2') == ''
+
+
+def test_namespace_name_length():
+    namespace = Namespace(name_length=[12, 16], prefix='f-')
+    for _ in range(20):
+        name = namespace.pick_name()
+        assert name.startswith('f-') and 12 <= len(name) <= 16
+
+
+def test_namespace_parse_directory():
+    namespace = Namespace(depth=3, fanout=[2, 12])
+    for leaf in (0, 47, 287):
+        directory = namespace.format_directory(leaf, 3)
+        assert namespace.parse_directory(directory) == leaf
+    assert namespace.parse_directory('d1/d03/') is None
+    assert namespace.parse_directory('d1/d03/d12/') is None
+    assert namespace.parse_directory('d1/x03/d11/') is None
+    assert Namespace().parse_directory('') == 0
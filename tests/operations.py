@@ -2,16 +2,24 @@
 # License: Apache 2.0, see LICENSE for more details.
 
 import os
+import signal
 import subprocess
+import tempfile
 from unittest.mock import Mock, patch, mock_open
 
 import pytest
 
 from sxrumble import operations
-from sxrumble.config import ENTROPY_FILE_PATH
+from sxrumble.capture import CommandResult
+from sxrumble.churn import ChurnState
+from sxrumble.config import ENTROPY_FILE_PATH, Options
+from sxrumble.namespace import Namespace
 from sxrumble.operations import (
     Operation, ListUsers, ListVolumes, ListFiles, ShowVolumeAcl, UploadNewFile,
+    GlobFiles, UploadBatch, CreateVolume, DeleteVolume, CreateUser,
+    DeleteUser, GrantAcl, RevokeAcl,
 )
+from sxrumble.phases import Phases, PAYLOAD_READY, SPAWNED, EXITED
 
 
 @pytest.fixture
@@ -22,6 +30,9 @@ def config():
         min_size=1,
         max_size=1,
         entropy_size=10,
+        tree=Namespace(),
+        churn=ChurnState(),
+        threads=2,
     )
 
 
@@ -34,17 +45,103 @@ def test_operation_get_name():
     assert CustomOperation.get_name() == 'CustomOperation'
 
 
-@pytest.mark.parametrize('rc,report_func_name', [
-    (0, 'report_success'),
-    (1, 'report_error'),
+def make_result(returncode=0, stderr=b'', timed_out=False, **kwargs):
+    return CommandResult(
+        [], returncode, b'', stderr, timed_out=timed_out, **kwargs,
+    )
+
+
+@pytest.mark.parametrize('rc,report_func_name,error_class', [
+    (0, 'report_success', 'ok'),
+    (1, 'report_error', 'exit'),
 ])
-def test_operation_run(config, rc, report_func_name):
+def test_operation_run(config, rc, report_func_name, error_class):
     operation = CustomOperation(config)
-    ret = (0, Mock(returncode=rc))
-    with patch('sxrumble.operations.measure_command', return_value=ret):
+    ret = make_result(rc, stdout_size=3)
+    with patch('sxrumble.operations.run_command', return_value=ret):
         with patch.object(operation, report_func_name) as report_func:
             operation.run()
     assert report_func.called is True
+    assert operation.phases.stamps[PAYLOAD_READY] > 0
+    assert operation.duration > 0
+    assert operation.returncode == rc
+    assert operation.bytes == 3
+    assert operation.error_class == error_class
+    assert operation.entries == 0
+    assert operation.retries == 0
+
+
+def test_operation_run_counts_entries(config):
+    operation = ListFiles(config, volume='v1')
+    ret = make_result(stdout_size=30, stdout_lines=3)
+    with patch('sxrumble.operations.run_command', return_value=ret):
+        operation.run()
+    assert operation.entries == 3
+    assert operation.bytes == 30
+
+
+def test_operation_run_timeout(config):
+    operation = ListUsers(config)
+    options = Options(timeout={'*': 5.0, 'ListUsers': 2.5})
+    ret = make_result(-9, timed_out=True)
+    with patch('sxrumble.operations.run_command', return_value=ret) as run:
+        operation.run(options)
+    assert run.call_args[0][3] == 2.5
+    assert operation.error_class == 'timeout'
+
+
+def test_operation_run_retries(config):
+    operation = CustomOperation(config)
+    options = Options(retries=3, retry_backoff=0.0)
+    results = [make_result(1, b'Connection refused'), make_result(0)]
+    with patch('sxrumble.operations.run_command', side_effect=results) as run:
+        operation.run(options)
+    assert run.call_count == 2
+    assert operation.retries == 1
+    assert operation.error_class == 'ok'
+    assert operation.phases.stamps[EXITED] > 0
+
+
+def test_operation_run_retries_bounded(config):
+    operation = CustomOperation(config)
+    options = Options(retries=2, retry_backoff=0.0)
+    ret = make_result(1, b'503 Service Unavailable')
+    with patch('sxrumble.operations.run_command', return_value=ret) as run:
+        operation.run(options)
+    assert run.call_count == 3
+    assert operation.retries == 2
+    assert operation.error_class == 'server'
+
+
+def test_operation_run_does_not_retry_permanent_errors(config):
+    operation = CustomOperation(config)
+    ret = make_result(1, b'ERROR: Volume not found')
+    with patch('sxrumble.operations.run_command', return_value=ret) as run:
+        operation.run(Options(retries=2))
+    assert run.call_count == 1
+    assert operation.error_class == 'not_found'
+
+
+@pytest.mark.parametrize('result, expected', [
+    (make_result(0), 'ok'),
+    (make_result(-9, timed_out=True), 'timeout'),
+    (make_result(-11), 'signal'),
+    (make_result(1, b'ERROR: Permission denied: not enough privileges'),
+     'permission'),
+    (make_result(1, b'ERROR: Quota exceeded'), 'quota'),
+    (make_result(1, b"ERROR: Couldn't connect to server"), 'network'),
+    (make_result(1, b'ERROR: Internal Server Error'), 'server'),
+    (make_result(2, b'ERROR: Something else'), 'exit'),
+])
+def test_classify_error(result, expected):
+    assert operations.classify_error(result) == expected
+    assert expected in operations.ERROR_CLASSES
+
+
+def test_get_backoff():
+    with patch('random.random', return_value=0.5):
+        assert operations.get_backoff(1.0, 1) == 0.5
+        assert operations.get_backoff(1.0, 3) == 2.0
 
 
 def test_list_users(config):
@@ -75,6 +172,36 @@ def test_list_files(config):
 
 def test_list_files_serialize(config):
     assert ListFiles(config, volume='v').serialize() == {'volume': 'v'}
+    assert ListFiles(
+        config, volume='v', prefix='d1/', recursive=True,
+    ).serialize() == {'volume': 'v', 'prefix': 'd1/', 'recursive': True}
+
+
+def test_list_files_prefix(config):
+    operation = ListFiles(config, volume='v1', prefix='d1/d2/')
+    assert operation.prepare_command() == (['sxls', '@sx/v1/d1/d2/'], None)
+    operation.recursive = True
+    assert operation.prepare_command() == \
+        (['sxls', '--recursive', '@sx/v1/d1/d2/'], None)
+
+
+def test_list_files_randomize_namespace(config):
+    config.tree = Namespace(depth=2, fanout=[3], recursive=1.0)
+    listing = ListFiles.randomize(config)
+    assert (listing.prefix, listing.recursive) == ('', True)
+    upload = UploadNewFile.randomize(config)
+    directory = upload.filename.rpartition('/')[0] + '/'
+    for _ in range(20):
+        assert directory.startswith(ListFiles.randomize(config).prefix)
+
+
+def test_glob_files(config):
+    operation = GlobFiles.randomize(config)
+    assert operation.pattern[:-2] == 'sxrumble-'
+    assert operation.prepare_command() == \
+        (['sxls', '@sx/v1/' + operation.pattern], None)
+    assert operation.serialize() == \
+        {'volume': 'v1', 'pattern': operation.pattern}
 
 
 def test_show_volume_acl(config):
@@ -110,27 +237,140 @@ def test_upload_new_file_serialize(config):
     }
 
 
-def test_measure_command():
-    duration = 1.5
-    proc = Mock()
-    with patch('time.monotonic', side_effect=[0, duration]):
-        with patch('sxrumble.operations.run_command', return_value=proc):
-            result = operations.measure_command([], None)
-    assert result == (duration, proc)
-
-
 def test_run_command():
-    result = Mock()
-    args = ['ls', '-l', '.']
-    with patch('subprocess.run', return_value=result) as subprocess_run:
-        assert operations.run_command(args, input) is result
-    assert subprocess_run.call_args[0] == (args,)
-    assert subprocess_run.call_args[1] == {
-        'input': input,
-        'stdout': subprocess.PIPE,
-        'stderr': subprocess.PIPE,
-        'preexec_fn': os.setpgrp,
-    }
+    args = ['sh', '-c', 'cat; echo err >&2; exit 3']
+    with patch('subprocess.Popen', wraps=subprocess.Popen) as Popen:
+        proc = operations.run_command(args, b'a\nb\n')
+    assert Popen.call_args[1]['preexec_fn'] == os.setpgrp
+    assert (proc.args, proc.returncode, proc.stdout, proc.stderr) == \
+        (args, 3, b'a\nb\n', b'err\n')
+    assert (proc.stdout_size, proc.stdout_lines) == (4, 2)
+
+
+def test_run_command_timeout():
+    args = ['sh', '-c', 'echo started; sleep 10 & sleep 10']
+    proc = operations.run_command(args, None, None, 0.2)
+    assert proc.timed_out is True
+    assert proc.returncode == -signal.SIGKILL
+    assert proc.stdout == b'started\n'
+
+
+def test_run_command_not_found():
+    with pytest.raises(FileNotFoundError):
+        operations.run_command(['sxrumble-nonexistent-command'])
+
+
+def test_run_command_spawn_server():
+    client = Mock()
+    result = CommandResult(['ls'], 1, b'out', b'err', 3, 0)
+    client.run.return_value = (result, 2.0, 3.0)
+    phases = Phases()
+    with patch('sxrumble.spawner.get_client', return_value=client):
+        proc = operations.run_command(['ls'], b'in', phases, 5.0)
+    assert client.run.call_args == ((['ls'], b'in', 5.0), {})
+    assert proc is result
+    assert phases.stamps[SPAWNED] == 2.0
+    assert phases.stamps[EXITED] == 3.0
+
+
+def test_run_command_marks_phases():
+    phases = Phases()
+    proc = operations.run_command(['true'], None, phases)
+    assert proc.returncode == 0
+    assert phases.stamps[SPAWNED] > 0
+    assert phases.stamps[EXITED] >= phases.stamps[SPAWNED]
+
+
+def test_upload_batch(config):
+    config.tree = Namespace(depth=2, fanout=[3])
+    config.volumes = ['v1', 'v2']
+    config.min_size, config.max_size, config.entropy_size = 1, 4, 10
+    batch = UploadBatch.randomize_batch(config, 3)
+    assert batch.volume in config.volumes
+    assert config.tree.parse_directory(batch.directory) is not None
+    assert len(batch.files) == 3
+
+    seen = {}
+
+    def run_command(args, input, phases, timeout):
+        seen['args'] = args
+        seen['contents'] = [open(path, 'rb').read() for path in args[2:-1]]
+        return CommandResult(args, 0, b'', b'')
+
+    with patch('sxrumble.operations.get_file_content',
+               side_effect=lambda size, offset: b'x' * size), \
+            patch('sxrumble.operations.run_command', run_command):
+        batch.run(Options())
+    args = seen['args']
+    assert args[:2] == ['sxcp', '--no-progress']
+    assert args[-1] == '@sx/{}/{}'.format(batch.volume, batch.directory)
+    assert [os.path.basename(path) for path in args[2:-1]] == \
+        [name for name, _, _ in batch.files]
+    assert seen['contents'] == [b'x' * size for _, size, _ in batch.files]
+    assert os.path.dirname(batch.temporary) == \
+        (operations.STAGING_DIR or tempfile.gettempdir())
+    assert not os.path.exists(batch.temporary)
+    assert batch.bytes == sum(size for _, size, _ in batch.files)
+
+
+def test_churn_volumes(config):
+    create = CreateVolume.randomize(config)
+    args, _ = create.prepare_command()
+    assert args[:2] == ['sxvol', 'create']
+    assert args[-1] == '@sx/' + create.volume
+    assert create.volume.startswith('sxrumble-churn-')
+    # Nothing to delete yet.
+    assert isinstance(DeleteVolume.randomize(config), CreateVolume)
+    with patch('sxrumble.operations.run_command',
+               return_value=make_result()):
+        create.run()
+    assert config.churn.objects['volumes'] == [create.volume]
+    delete = DeleteVolume.randomize(config)
+    assert delete.serialize() == {'volume': create.volume}
+    assert delete.prepare_command()[0] == \
+        ['sxvol', 'remove', '@sx/' + create.volume]
+    assert config.churn.objects['volumes'] == []
+    with patch('sxrumble.operations.run_command',
+               return_value=make_result(1)):
+        delete.run()
+    # Still there, left for the next deletion.
+    assert config.churn.objects['volumes'] == [create.volume]
+
+
+def test_churn_users_and_grants(config):
+    assert isinstance(GrantAcl.randomize(config), CreateUser)
+    assert isinstance(RevokeAcl.randomize(config), CreateUser)
+    with patch('sxrumble.operations.run_command',
+               return_value=make_result()):
+        CreateUser(config, user='u').run()
+        grant = GrantAcl.randomize(config)
+        assert grant.prepare_command()[0] == [
+            'sxacl', 'volperm', '--grant', 'read,write', 'u', '@sx/v1',
+        ]
+        grant.run()
+        assert config.churn.objects['grants'] == [('u', 'v1')]
+        revoke = RevokeAcl.randomize(config)
+        assert revoke.prepare_command()[0][2] == '--revoke'
+        revoke.run()
+        assert config.churn.objects['grants'] == []
+        grant.run()
+        delete = DeleteUser.randomize(config)
+        assert delete.prepare_command()[0] == ['sxacl', 'userdel', 'u', '@sx']
+        delete.run()
+    assert config.churn.objects == {'volumes': [], 'users': [], 'grants': []}
+
+
+def test_remove_churn(config):
+    config.churn.add('volumes', 'sxrumble-churn-v')
+    config.churn.add('users', 'sxrumble-churn-u')
+    config.churn.add('grants', ('sxrumble-churn-u', 'v1'))
+    with patch('sxrumble.operations.run_command',
+               return_value=make_result()) as run_command:
+        operations.remove_churn(config, Options())
+    assert sorted(c[0][0][:2] for c in run_command.call_args_list) == [
+        ['sxacl', 'userdel'], ['sxvol', 'remove'],
+    ]
+    assert config.churn.objects == {'volumes': [], 'users': [], 'grants': []}
 
 
 def test_pick_operation():
@@ -138,10 +378,27 @@ def test_pick_operation():
     operation = Mock()
     with patch('random.choice', return_value=operation) as choice:
         operations.pick_operation(config)
-    assert choice.call_args == ((operations.ALL_OPERATIONS,), {})
+    assert choice.call_args == ((operations.MIX_OPERATIONS,), {})
     assert operation.randomize.call_args == ((config,), {})
 
 
+def test_get_mix_operations(config):
+    # Globs only with directory trees.
+    assert GlobFiles not in operations.get_mix_operations(config)
+    config.tree = Namespace(depth=2)
+    assert operations.get_mix_operations(config) == \
+        operations.MIX_OPERATIONS
+
+
+def test_pick_operation_weights():
+    config = Mock()
+    # Only the second type has a weight.
+    weights = [0.0, 2.0] + [2.0] * (len(operations.ALL_OPERATIONS) - 2)
+    for _ in range(20):
+        operation = operations.pick_operation(config, weights)
+        assert isinstance(operation, operations.ALL_OPERATIONS[1])
+
+
 def test_pick_volume():
     volumes = ['v1', 'v2', 'v3']
     config = Mock(volumes=volumes)
@@ -185,9 +442,8 @@ def test_read_slice():
     assert f.read.call_args == ((size,), {})
 
 
-def test_pick_filename():
-    config = Mock()
-    with patch('sxrumble.operations.uuid4') as uuid4:
-        name = operations.pick_filename(config)
+def test_pick_filename(config):
+    with patch('sxrumble.namespace.uuid4') as uuid4:
+        name = operations.pick_filename(config, 'v1')
     assert uuid4.call_args == ((), {})
     assert name.startswith('sxrumble-')
@@ -6,28 +6,81 @@ import pytest
 from sxrumble.exceptions import ValidationError
 from sxrumble.parsers import (
     parse_args, parse_threads, parse_entropy_size, parse_size,
+    parse_percentage, parse_probability, parse_count, parse_seconds,
+    parse_timeouts, parse_time_offset, parse_endpoints,
+    parse_namespace, parse_slo, parse_address,
 )
 
 
 def test_parse_args():
     raw_args = {
         'sx_url': '@indian',
+        'namespace': 'depth=2,fanout=4:8,name-length=12-20,prefix=f',
         'volumes': ['jungle'],
         'threads': '4',
         'min_size': '1KB',
         'max_size': '1MB',
         'entropy_size': None,
         'entropy_seed': 'c0ffee',
+        'shards': '2',
+        'count': '1000',
+        'users': '500',
+        'batch': '100',
+        'upload_batch': '4',
+        'upload_linger': '0.05',
+        'rate': '2.5',
+        'slo': 'p95=0.2,errors=2',
+        'metrics_address': ':9464',
+        'metrics_interval': '5',
+        'host_interval': '0.5',
+        'log_rate': '100',
+        'timeout': '60,UploadNewFile=120',
+        'retries': '2',
+        'retry_backoff': '1.5',
+        'from': '30m',
+        'to': None,
+        'warm_up': '1m',
+        'cool_down': None,
+        'p99_threshold': '10',
+        'throughput_threshold': '5%',
+        'alpha': '0.01',
     }
     args = parse_args(raw_args)
     assert args == {
         'sx_url': raw_args['sx_url'],
+        'endpoints': [{'url': '@indian', 'weight': 1}],
+        'namespace': {
+            'depth': 2, 'fanout': [4, 8], 'name_length': [12, 20],
+            'prefix': 'f',
+        },
         'volumes': raw_args['volumes'],
         'threads': 4,
         'min_size': 2 ** 10,
         'max_size': 2 ** 20,
         'entropy_size': None,
         'entropy_seed': raw_args['entropy_seed'],
+        'shards': 2,
+        'count': 1000,
+        'users': 500,
+        'batch': 100,
+        'upload_batch': 4,
+        'upload_linger': 0.05,
+        'rate': 2.5,
+        'slo': {'percentile': 95.0, 'latency': 0.2, 'errors': 2.0},
+        'metrics_address': ('', 9464),
+        'metrics_interval': 5.0,
+        'host_interval': 0.5,
+        'log_rate': 100,
+        'timeout': {'*': 60.0, 'UploadNewFile': 120.0},
+        'retries': 2,
+        'retry_backoff': 1.5,
+        'from': 1800.0,
+        'to': None,
+        'warm_up': 60.0,
+        'cool_down': None,
+        'p99_threshold': 10.0,
+        'throughput_threshold': 5.0,
+        'alpha': 0.01,
     }
 
 
@@ -38,6 +91,12 @@ def test_parse_threads():
         parse_threads('garbage')
 
 
+def test_parse_count():
+    assert parse_count('3') == 3
+    with pytest.raises(ValidationError):
+        parse_count('garbage')
+
+
 def test_parse_entropy_size():
     assert parse_entropy_size(None) is None
     assert parse_entropy_size('1k') == 2 ** 10
@@ -57,3 +116,102 @@ def test_parse_size():
 
     with pytest.raises(ValidationError):
         parse_size('garbage')
+
+
+def test_parse_percentage():
+    assert parse_percentage('10') == 10
+    assert parse_percentage('2.5%') == 2.5
+    with pytest.raises(ValidationError):
+        parse_percentage('garbage')
+    with pytest.raises(ValidationError):
+        parse_percentage('-1')
+
+
+def test_parse_probability():
+    assert parse_probability('0.05') == 0.05
+    with pytest.raises(ValidationError):
+        parse_probability('garbage')
+    with pytest.raises(ValidationError):
+        parse_probability('1')
+
+
+def test_parse_seconds():
+    assert parse_seconds('1.5') == 1.5
+    assert parse_seconds('2s') == 2.0
+    with pytest.raises(ValidationError):
+        parse_seconds('soon')
+
+
+@pytest.mark.parametrize('spec, expected', [
+    (None, {}),
+    ('60', {'*': 60.0}),
+    ('ListFiles=5, UploadNewFile=120s', {'ListFiles': 5.0,
+                                         'UploadNewFile': 120.0}),
+])
+def test_parse_timeouts(spec, expected):
+    assert parse_timeouts(spec) == expected
+
+
+def test_parse_timeouts_invalid():
+    with pytest.raises(ValidationError):
+        parse_timeouts('ListFiles=')
+
+
+def test_parse_time_offset():
+    assert parse_time_offset(None) is None
+    assert parse_time_offset('90') == 90.0
+    assert parse_time_offset('1h') == 3600.0
+    with pytest.raises(ValidationError):
+        parse_time_offset('later')
+
+
+def test_parse_endpoints():
+    assert parse_endpoints(None) is None
+    assert parse_endpoints('sx://a@node1:8443=3, @b') == [
+        {'url': 'sx://a@node1:8443', 'weight': 3},
+        {'url': '@b', 'weight': 1},
+    ]
+    with pytest.raises(ValidationError):
+        parse_endpoints('@a=heavy')
+
+
+def test_parse_args_endpoints():
+    args = parse_args({
+        'sx_url': '@a=2,@b', 'namespace': None, 'threads': '1',
+        'min_size': '1', 'max_size': '1', 'entropy_size': None, 'shards': '2',
+        'count': None, 'users': None, 'batch': '1', 'upload_batch': '1',
+        'upload_linger': '0', 'rate': None, 'slo': None,
+        'metrics_address': None, 'metrics_interval': '15',
+        'host_interval': '1',
+        'log_rate': '0', 'timeout': None, 'retries': '0',
+        'retry_backoff': '1', 'from': None, 'to': None, 'warm_up': None,
+        'cool_down': None,
+        'p99_threshold': '10', 'throughput_threshold': '10', 'alpha': '0.01',
+    })
+    assert args['sx_url'] == '@a'
+    assert [e['weight'] for e in args['endpoints']] == [2, 1]
+
+
+def test_parse_namespace():
+    assert parse_namespace(None) == {}
+    assert parse_namespace('name-length=32, recursive=0') == {
+        'name_length': [32, 32], 'recursive': 0.0,
+    }
+    with pytest.raises(ValidationError):
+        parse_namespace('fanout=4:many')
+
+
+def test_parse_slo():
+    assert parse_slo(None) is None
+    assert parse_slo('p99.9=1.5s') == {'percentile': 99.9, 'latency': 1.5}
+    for spec in ['p99=fast', 'latency=1', 'p=1']:
+        with pytest.raises(ValidationError):
+            parse_slo(spec)
+
+
+def test_parse_address():
+    assert parse_address(None) is None
+    assert parse_address('127.0.0.1:9464') == ('127.0.0.1', 9464)
+    assert parse_address('[::1]:80') == ('::1', 80)
+    with pytest.raises(ValidationError):
+        parse_address('localhost')
@@ -0,0 +1,161 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from sxrumble.config import Config, Session
+from sxrumble.exceptions import ValidationError
+from sxrumble.partition import get_last_time, merge_sessions, split_session
+from sxrumble.sessions import SessionReader, SessionWriter
+
+
+def make_config(**kwargs):
+    payload = {
+        'sx_url': '@indian',
+        'volumes': ['v1', 'v2'],
+        'threads': 4,
+        'min_size': 1,
+        'max_size': 2,
+        'entropy_size': 200,
+        'entropy_seed': 'abcdef',
+    }
+    payload.update(kwargs)
+    return Config(**payload)
+
+
+OPERATIONS = [
+    {'time': 0.0, 'type': 'ListUsers', 'params': {}},
+    {'time': 1.0, 'type': 'ListFiles', 'params': {'volume': 'v1'}},
+    {'time': 2.0, 'type': 'ListFiles', 'params': {'volume': 'v2'}},
+    {'time': 3.0, 'type': 'UploadNewFile', 'params': {
+        'volume': 'v2', 'filename': 'f', 'size': 1, 'offset': 0,
+    }},
+]
+
+
+def write_session(filename, config, operations):
+    writer = SessionWriter(str(filename), config)
+    for o in operations:
+        writer.write_operation(o['time'], o['type'], o['params'])
+    writer.close()
+    return str(filename)
+
+
+def read_session(filename):
+    with SessionReader(filename) as reader:
+        return reader.config, list(reader)
+
+
+@pytest.fixture
+def session_file(tmpdir):
+    return write_session(tmpdir.join('s.yaml'), make_config(), OPERATIONS)
+
+
+def test_split_round_robin(session_file):
+    filenames = split_session(session_file, 2, 'round-robin')
+    assert filenames[0].endswith('/s-shard1of2.yaml')
+    assert filenames[1].endswith('/s-shard2of2.yaml')
+    first_config, first = read_session(filenames[0])
+    _, second = read_session(filenames[1])
+    assert first == OPERATIONS[0::2]
+    assert second == OPERATIONS[1::2]
+    assert first_config.threads == 2
+    assert first_config.volumes == ['v1', 'v2']
+
+
+def test_split_volume(session_file):
+    filenames = split_session(session_file, 2, 'volume')
+    first_config, first = read_session(filenames[0])
+    second_config, second = read_session(filenames[1])
+    assert first_config.volumes == ['v1']
+    assert second_config.volumes == ['v2']
+    assert [o['time'] for o in first] == [0, 1]
+    assert [o['time'] for o in second] == [2, 3]
+
+
+def test_split_volume_created(tmpdir):
+    churn = [
+        {'time': 0.0, 'type': 'CreateVolume', 'params': {
+            'volume': 'sxrumble-churn-a', 'owner': 'admin',
+        }},
+        {'time': 1.0, 'type': 'DeleteVolume', 'params': {
+            'volume': 'sxrumble-churn-a',
+        }},
+    ]
+    filename = write_session(tmpdir.join('s.yaml'), make_config(), churn)
+    filenames = split_session(filename, 2, 'volume')
+    sessions = [read_session(f)[1] for f in filenames]
+    assert sorted(len(s) for s in sessions) == [0, 2]
+
+
+def test_split_type(session_file):
+    filenames = split_session(session_file, 5, 'type')
+    sessions = [read_session(f)[1] for f in filenames]
+    assert [len(s) for s in sessions] == [1, 0, 2, 0, 1]
+
+
+def test_split_time(session_file):
+    filenames = split_session(session_file, 2, 'time')
+    first_config, first = read_session(filenames[0])
+    _, second = read_session(filenames[1])
+    assert first_config.threads == 4
+    assert [o['time'] for o in first] == [0, 1]
+    assert [o['time'] for o in second] == [0.5, 1.5]
+
+
+def test_get_last_time(session_file):
+    # Only the end of an indexed session is read.
+    with patch.object(SessionReader, '__iter__', side_effect=AssertionError):
+        assert get_last_time(session_file) == 3.0
+
+
+def test_get_last_time_without_index(tmpdir):
+    filename = tmpdir.join('s.yaml')
+    filename.write(yaml.safe_dump(
+        Session(make_config(), OPERATIONS).serialize(),
+        default_flow_style=False,
+    ))
+    assert get_last_time(str(filename)) == 3.0
+
+
+@pytest.mark.parametrize('shards, by', [
+    (1, 'round-robin'),
+    (2, 'garbage'),
+    (3, 'volume'),
+])
+def test_split_invalid(session_file, shards, by):
+    with pytest.raises(ValidationError):
+        split_session(session_file, shards, by)
+
+
+def test_merge(tmpdir, session_file):
+    other_file = write_session(
+        tmpdir.join('other.yaml'),
+        make_config(volumes=['v2', 'v3'], threads=2, max_size=5),
+        [dict(o, time=o['time'] + 0.5) for o in OPERATIONS],
+    )
+    output = str(tmpdir.join('merged.yaml'))
+    merge_sessions([session_file, other_file], output)
+
+    config, operations = read_session(output)
+    assert config.volumes == ['v1', 'v2', 'v3']
+    assert config.threads == 6
+    assert config.max_size == 5
+    assert [o['time'] for o in operations] == \
+        [0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5]
+    filenames = [
+        o['params']['filename'] for o in operations
+        if o['type'] == 'UploadNewFile'
+    ]
+    assert filenames == ['f', 'f-1']
+
+
+def test_merge_different_clusters(tmpdir, session_file):
+    other_file = write_session(
+        tmpdir.join('other.yaml'), make_config(sx_url='@other'), [],
+    )
+    with pytest.raises(ValidationError):
+        merge_sessions([session_file, other_file], str(tmpdir.join('m')))
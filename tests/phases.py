@@ -0,0 +1,56 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import json
+
+from sxrumble.phases import (
+    Phases, PhaseReport, PHASE_NAMES, INTERVAL_NAMES, QUEUED, DEQUEUED,
+)
+
+
+def make_phases(*stamps):
+    phases = Phases()
+    for phase, stamp in enumerate(stamps):
+        phases.mark(phase, stamp)
+    return phases
+
+
+def test_phases_mark():
+    phases = Phases()
+    phases.mark(QUEUED, 1.5)
+    assert phases.stamps[QUEUED] == 1.5
+    phases.mark(DEQUEUED)
+    assert phases.stamps[DEQUEUED] > 0
+    assert phases.thread != 0
+
+
+def test_phases_intervals():
+    phases = make_phases(1, 2, 4, 7, 11, 16)
+    assert phases.intervals() == [1, 2, 3, 4, 5]
+    assert len(INTERVAL_NAMES) == len(PHASE_NAMES) - 1
+    assert phases.response_time() == 10
+
+
+def test_phase_report():
+    report = PhaseReport(0)
+    report.add('Foo', make_phases(1, 2, 4, 7, 11, 16))
+    report.add('Foo', make_phases(1, 3, 4, 7, 11, 16))
+    assert [list(d) for d in report.durations] == \
+        [[1, 2], [2, 1], [3, 3], [4, 4], [5, 5]]
+    report.close()
+
+
+def test_phase_report_trace(tmpdir):
+    filename = str(tmpdir.join('trace.json'))
+    report = PhaseReport(1, filename)
+    report.add('Foo', make_phases(1, 2, 4, 7, 11, 16))
+    report.close()
+
+    with open(filename) as f:
+        events = json.load(f)['traceEvents']
+    assert [e['name'] for e in events] == ['Foo'] + list(INTERVAL_NAMES)
+    assert events[0]['ts'] == 0
+    assert events[0]['dur'] == 15e6
+    assert events[1]['cat'] == 'phase'
+    assert events[5]['ts'] == 10e6
+    assert events[5]['dur'] == 5e6
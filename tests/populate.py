@@ -0,0 +1,96 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+import pytest
+
+from sxrumble import populate
+from sxrumble.capture import CommandResult
+from sxrumble.config import Config, Options, Session
+from sxrumble.operations import UploadBatch
+from sxrumble.populate import (
+    ManifestWriter, get_batch_sizes, load_manifest, seed_namespace,
+)
+
+
+@pytest.fixture
+def config():
+    return Config(
+        sx_url='@sx',
+        volumes=['v1', 'v2'],
+        threads=2,
+        min_size=1,
+        max_size=4,
+        entropy_size=10,
+        entropy_seed='abc',
+        namespace={'depth': 2, 'fanout': [3]},
+    )
+
+
+def test_get_batch_sizes():
+    assert list(get_batch_sizes(250, 100)) == [100, 100, 50]
+    assert list(get_batch_sizes(0, 100)) == []
+
+
+def test_manifest_round_trip(tmpdir, config):
+    filename = str(tmpdir.join('data.manifest'))
+    writer = ManifestWriter(filename, config)
+    first = UploadBatch(
+        config, volume='v1', directory='d0/d2/', files=[('a', 1, 0)],
+    )
+    writer.add(first)
+    writer.close()
+    writer = ManifestWriter(filename, config, append=True)
+    writer.add(UploadBatch(
+        config, volume='v2', directory='d1/d1/',
+        files=[('b', 2, 0), ('c', 3, 1)],
+    ))
+    writer.close()
+    with open(filename, 'a') as f:
+        f.write('{"volume": "v1", "dir')
+
+    manifest = load_manifest(filename)
+    assert manifest.config == config.serialize()
+    assert manifest.batches[0] == {
+        'volume': 'v1', 'directory': 'd0/d2/', 'files': [['a', 1, 0]],
+    }
+    assert manifest.count == 3
+
+    seed_namespace(config, manifest)
+    assert set(config.tree.populated) == {'v1', 'v2'}
+    assert list(config.tree.populated['v1'][1]) == [2]
+
+
+@pytest.mark.parametrize('contents', ['', 'garbage\n', '{"version": 9}\n'])
+def test_load_manifest_invalid(tmpdir, contents):
+    filename = tmpdir.join('data.manifest')
+    filename.write(contents)
+    with pytest.raises(SystemExit):
+        load_manifest(str(filename))
+    with pytest.raises(SystemExit):
+        load_manifest(str(tmpdir.join('missing')))
+
+
+def test_populate_resume(tmpdir, config):
+    filename = str(tmpdir.join('data.manifest'))
+    results = iter([0, 1, 0, 0, 0])
+
+    def run_command(args, input, phases, timeout):
+        return CommandResult(args, next(results), b'', b'')
+
+    def run(count, resume):
+        options = Options(count=count, batch=2, manifest=filename,
+                          resume=resume)
+        with patch('sxrumble.operations.get_file_content', return_value=b''), \
+                patch('sxrumble.operations.run_command', run_command):
+            populate.populate(Session(config, options=options))
+
+    config.threads = 1
+    run(5, False)
+    # The second batch failed.
+    assert load_manifest(filename).count == 3
+    run(5, True)
+    manifest = load_manifest(filename)
+    assert manifest.count == 5
+    assert len(manifest.batches) == 3
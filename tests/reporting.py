@@ -0,0 +1,109 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import logging
+from unittest.mock import Mock, patch
+
+from sxrumble import reporting
+from sxrumble.operations import ListFiles, ListUsers
+from sxrumble.phases import QUEUED, DEQUEUED, EXITED
+from sxrumble.reporting import Reporter, RunSummary
+
+
+def make_operation(
+        operation, duration, returncode=0, entries=0, error_class='ok',
+        retries=0):
+    operation.duration = duration
+    operation.returncode = returncode
+    operation.entries = entries
+    operation.error_class = error_class
+    operation.retries = retries
+    return operation
+
+
+def test_run_summary(caplog):
+    config = Mock()
+    summary = RunSummary()
+    summary.add(make_operation(ListFiles(config, volume='v'), 2.0, 0, 400))
+    summary.add(make_operation(ListFiles(config, volume='v'), 1.0, 0, 0))
+    summary.add(make_operation(
+        ListFiles(config, volume='v'), 1.0, 1, 0, 'network', 2,
+    ))
+    late = make_operation(ListUsers(config), 0.5)
+    # Due at 10s, started at 12s.
+    late.phases.mark(QUEUED, 10.0)
+    late.phases.mark(DEQUEUED, 12.0)
+    late.phases.mark(EXITED, 12.5)
+    summary.add(late)
+
+    list_files = summary.types['ListFiles']
+    assert list(list_files.durations) == [2.0, 1.0]
+    assert list(list_files.entries) == [400, 0]
+    assert list(list_files.entry_latencies) == [0.005]
+    assert list_files.errors == {'network': 1}
+    assert list_files.retries == 2
+    assert list(summary.types['ListUsers'].entries) == []
+    assert list(summary.types['ListUsers'].durations) == [0.5]
+    assert list(summary.types['ListUsers'].response_times) == [2.5]
+
+    with caplog.at_level(logging.INFO):
+        summary.log()
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(
+        'ListFiles' in m and '2 ok, 1 failed, 2 retries' in m
+        for m in messages
+    )
+    assert any('errors network=1' in m for m in messages)
+    assert any('service  p50=0.500s' in m for m in messages)
+    assert any('response p50=2.500s' in m for m in messages)
+    assert any('per entry p50=5.000ms' in m for m in messages)
+    assert not any('UploadNewFile' in m for m in messages)
+
+
+def test_run_summary_endpoints(caplog):
+    config = Mock()
+    summary = RunSummary(['@a', '@b'])
+    for endpoint, start, error_class in [
+            (0, 10.0, 'ok'), (0, 12.0, 'ok'), (1, 11.0, 'exit')]:
+        operation = make_operation(
+            ListUsers(config), 1.0, error_class=error_class,
+        )
+        operation.endpoint = endpoint
+        operation.bytes = 1024
+        operation.phases.mark(DEQUEUED, start)
+        operation.phases.mark(EXITED, start + 1.0)
+        summary.add(operation)
+
+    first, second = summary.endpoints
+    assert list(first.durations) == [1.0, 1.0]
+    assert (first.failed, first.bytes, first.span()) == (0, 2048, 3.0)
+    assert (second.failed, second.bytes, second.span()) == (1, 0, 1.0)
+
+    with caplog.at_level(logging.INFO):
+        summary.log()
+    messages = [r.getMessage() for r in caplog.records]
+    assert any(
+        '@a 2 ok, 0 failed, 0.7 ops/s, 682 bytes/s' in m
+        for m in messages
+    )
+    assert any('@b 0 ok, 1 failed, 1.0 ops/s' in m for m in messages)
+
+
+def test_run_summary_single_endpoint(caplog):
+    summary = RunSummary(['@a'])
+    summary.add(make_operation(ListUsers(Mock()), 1.0))
+    with caplog.at_level(logging.INFO):
+        summary.log()
+    assert not any('endpoint' in r.getMessage() for r in caplog.records)
+
+
+def test_reporter_log_steady_state():
+    reporter = Mock(host=None)
+    reporter.options = Mock(warm_up=0.0, cool_down=0.0, steady_state=False)
+    with patch.object(reporting, 'load_results') as load_results:
+        Reporter.log(reporter)
+        # Not read again for the whole run.
+        assert not load_results.called
+        reporter.options.warm_up = 10.0
+        Reporter.log(reporter)
+        load_results.assert_called_once_with(reporter.results.filename)
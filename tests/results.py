@@ -0,0 +1,127 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble import results as results_module
+from sxrumble.operations import ListUsers, ListFiles
+from sxrumble.phases import QUEUED, DEQUEUED, EXITED
+from sxrumble.results import ResultsWriter, load_results, NO_VOLUME
+
+
+@pytest.fixture
+def config():
+    return Mock(
+        sx_url='@sx',
+        volumes=['v1', 'v2'],
+        endpoints=[{'url': '@sx', 'weight': 1}, {'url': '@sy', 'weight': 1}],
+    )
+
+
+def make_operation(
+        operation, start, duration, returncode=0, error_class='ok'):
+    operation.phases.mark(QUEUED, start - 0.5)
+    operation.phases.mark(DEQUEUED, start)
+    operation.phases.mark(EXITED, start + duration)
+    operation.duration = duration
+    operation.returncode = returncode
+    operation.error_class = error_class
+    operation.bytes = 100
+    return operation
+
+
+def write_results(filename, config, operations):
+    writer = ResultsWriter(filename, 10, config)
+    for operation in operations:
+        writer.add(operation)
+    writer.close()
+
+
+def test_results_round_trip(tmpdir, config):
+    filename = str(tmpdir.join('run.results'))
+    listing = ListFiles(config, volume='v2')
+    listing.entries = 7
+    listing.retries = 2
+    listing.endpoint = 1
+    write_results(filename, config, [
+        make_operation(ListUsers(config), 10, 0.5),
+        make_operation(listing, 11, 1.5, 1, 'exit'),
+        make_operation(ListUsers(config), 12, 0.25),
+    ])
+
+    results = load_results(filename)
+    assert len(results) == 3
+    assert results.volume_names == ['v1', 'v2']
+    assert [results.type_names[t] for t in results['type']] == \
+        ['ListUsers', 'ListFiles', 'ListUsers']
+    assert list(results['intended_start']) == [-0.5, 0.5, 1.5]
+    assert list(results['start']) == [0, 1, 2]
+    assert list(results['end']) == [0.5, 2.5, 2.25]
+    assert list(results['volume']) == [NO_VOLUME, 1, NO_VOLUME]
+    assert results.endpoint_names == ['@sx', '@sy']
+    assert list(results['endpoint']) == [0, 1, 0]
+    assert list(results['bytes']) == [100, 100, 100]
+    assert list(results['entries']) == [0, 7, 0]
+    assert list(results['retries']) == [0, 2, 0]
+    assert list(results['exit_code']) == [0, 1, 0]
+    assert list(results['error_class']) == [0, 1, 0]
+    assert results.span() == 2.5
+    assert results.throughput() == 3 / 2.5
+    by_type = results.durations_by_type()
+    assert {k: list(v) for k, v in by_type.items()} == \
+        {'ListUsers': [0.5, 0.25]}
+
+
+def test_results_blocks(tmpdir, config):
+    filename = str(tmpdir.join('run.results'))
+    with patch.object(results_module, 'BLOCK_SIZE', 2):
+        write_results(filename, config, [
+            make_operation(ListUsers(config), 10 + i, 1)
+            for i in range(5)
+        ])
+    results = load_results(filename)
+    assert list(results['start']) == [0, 1, 2, 3, 4]
+
+
+def test_results_truncated(tmpdir, config):
+    filename = str(tmpdir.join('run.results'))
+    write_results(filename, config, [
+        make_operation(ListUsers(config), 10 + i, 1)
+        for i in range(3)
+    ])
+    with open(filename, 'rb+') as f:
+        f.truncate(len(f.read()) - 1)
+    assert len(load_results(filename)) == 0
+
+
+def test_load_results_invalid(tmpdir):
+    filename = tmpdir.join('run.results')
+    filename.write('garbage')
+    with pytest.raises(SystemExit):
+        load_results(str(filename))
+
+
+def test_results_resume(tmpdir, config):
+    filename = str(tmpdir.join('run.results'))
+    writer = ResultsWriter(filename, 10, config)
+    writer.add(make_operation(ListUsers(config), 10, 1))
+    writer.flush()
+    size = writer.tell()
+    # Written after the checkpoint, then lost.
+    writer.add(make_operation(ListUsers(config), 11, 1))
+    writer.close()
+
+    writer = ResultsWriter(filename, 10, config, resume_at=size)
+    writer.add(make_operation(ListUsers(config), 12, 1))
+    writer.close()
+    results = load_results(filename)
+    assert list(results['start']) == [0, 2]
+
+
+def test_results_resume_invalid(tmpdir, config):
+    filename = tmpdir.join('run.results')
+    filename.write('foo\n')
+    with pytest.raises(SystemExit):
+        ResultsWriter(str(filename), 10, config, resume_at=4)
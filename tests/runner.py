@@ -0,0 +1,27 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+from sxrumble.config import Config, Session
+from sxrumble.runner import cleanup_volumes
+
+
+def test_cleanup_volumes_namespace():
+    config = Config(
+        sx_url='@sx',
+        endpoints=[{'url': '@sx', 'weight': 1}],
+        volumes=['v1', 'v2'],
+        threads=1,
+        min_size=1,
+        max_size=4,
+        entropy_size=10,
+        entropy_seed='abc',
+        namespace={'depth': 2, 'fanout': [4]},
+    )
+    # Only the directories of the namespace at the root of `v1`.
+    listings = {'@sx/v1/*': b'd0/\nd1/\n', '@sx/v2/*': b''}
+    with patch('subprocess.check_output', lambda a: listings[a[1]]), \
+            patch('subprocess.check_call') as check_call:
+        cleanup_volumes(Session(config))
+    check_call.assert_called_once_with(['sxrm', '-r', '@sx/v1/*'])
@@ -0,0 +1,162 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from sxrumble import sessions
+from sxrumble.config import Config, Session
+from sxrumble.exceptions import ValidationError
+from sxrumble.sessions import SessionReader, SessionWriter, format_operation
+
+
+@pytest.fixture
+def config():
+    return Config(
+        sx_url='@indian',
+        volumes=['v1', 'yes'],
+        threads=4,
+        min_size=1,
+        max_size=2,
+        entropy_size=200,
+        entropy_seed='abcdef',
+    )
+
+
+def test_format_operation():
+    assert format_operation(1.5, 'ListFiles', {'volume': 'v'}) == \
+        '- {"params": {"volume": "v"}, "time": 1.500000, ' \
+        '"type": "ListFiles"}\n'
+
+
+def test_session_writer(tmpdir, config):
+    filename = str(tmpdir.join('session.yaml'))
+    writer = SessionWriter(filename, config)
+    writer.write_operation(0.5, 'ListUsers', {})
+    writer.write_lines(format_operation(1, 'ListFiles', {'volume': 'yes'}))
+    writer.close()
+
+    session = Session.from_file(filename)
+    assert session.config.volumes == ['v1', 'yes']
+    assert session.operations == [
+        {'time': 0.5, 'type': 'ListUsers', 'params': {}},
+        {'time': 1, 'type': 'ListFiles', 'params': {'volume': 'yes'}},
+    ]
+
+
+def test_session_reader(tmpdir, config):
+    filename = str(tmpdir.join('session.yaml'))
+    writer = SessionWriter(filename, config)
+    writer.write_operation(0.5, 'ListUsers', {})
+    writer.write_operation(1, 'ListFiles', {'volume': 'yes'})
+    writer.close()
+
+    with SessionReader(filename) as reader:
+        assert reader.config.volumes == ['v1', 'yes']
+        assert list(reader) == [
+            {'time': 0.5, 'type': 'ListUsers', 'params': {}},
+            {'time': 1, 'type': 'ListFiles', 'params': {'volume': 'yes'}},
+        ]
+
+
+def test_session_reader_block_format(tmpdir, config):
+    operations = [
+        {'time': 0.5, 'type': 'ListUsers', 'params': {}},
+        {'time': 1, 'type': 'ListFiles', 'params': {'volume': 'yes'}},
+    ]
+    filename = tmpdir.join('session.yaml')
+    filename.write(yaml.safe_dump(
+        Session(config, operations).serialize(),
+        default_flow_style=False,
+    ))
+    with SessionReader(str(filename)) as reader:
+        assert list(reader) == operations
+
+
+def test_session_reader_no_operations(tmpdir, config):
+    filename = tmpdir.join('session.yaml')
+    filename.write(yaml.safe_dump(
+        Session(config, []).serialize(),
+        default_flow_style=False,
+    ))
+    with SessionReader(str(filename)) as reader:
+        assert list(reader) == []
+
+
+def test_session_reader_invalid(tmpdir):
+    filename = tmpdir.join('session.yaml')
+    filename.write('foo: bar\n')
+    with pytest.raises(ValidationError):
+        SessionReader(str(filename))
+
+
+def write_session(filename, config, times, lines=False):
+    writer = SessionWriter(filename, config)
+    for time in times:
+        if lines:
+            writer.write_lines(format_operation(time, 'ListUsers', {}))
+        else:
+            writer.write_operation(time, 'ListUsers', {})
+    writer.close()
+
+
+@pytest.mark.parametrize('lines', [False, True])
+def test_session_index(tmpdir, config, lines):
+    filename = str(tmpdir.join('session.yaml'))
+    with patch.object(sessions, 'INDEX_STRIDE', 200):
+        write_session(filename, config, [i / 2 for i in range(20)], lines)
+
+    with SessionReader(filename) as reader:
+        index = reader.read_index()
+        assert len(index) > 2
+        assert [entry[2] for entry in index] == \
+            sorted(entry[2] for entry in index)
+        for time, offset, number in index:
+            assert time == number / 2
+            reader.file.seek(offset)
+            assert next(iter(reader))['time'] == time
+        assert reader.read_end() == 9.5
+    # The index is ignored by YAML parsers.
+    assert len(Session.from_file(filename).operations) == 20
+
+
+def test_session_index_window(tmpdir, config):
+    filename = str(tmpdir.join('session.yaml'))
+    # Large windows of operations, such as the ones of `synthesize`.
+    writer = SessionWriter(filename, config)
+    with patch.object(sessions, 'INDEX_STRIDE', 300):
+        for window in range(4):
+            writer.write_lines(''.join(
+                format_operation(window * 5 + i, 'ListUsers', {})
+                for i in range(5)
+            ))
+    writer.close()
+
+    with SessionReader(filename) as reader:
+        window = list(reader.read_window(7, 13))
+    assert [number for number, _ in window] == [7, 8, 9, 10, 11, 12]
+    assert [o['time'] for _, o in window] == [7, 8, 9, 10, 11, 12]
+
+
+def test_session_writer_lines_invalid(tmpdir, config):
+    writer = SessionWriter(str(tmpdir.join('session.yaml')), config)
+    with pytest.raises(ValueError):
+        writer.write_lines('- garbage\n')
+    writer.close()
+
+
+def test_session_read_window_without_index(tmpdir, config):
+    operations = [
+        {'time': i, 'type': 'ListUsers', 'params': {}} for i in range(5)
+    ]
+    filename = tmpdir.join('session.yaml')
+    filename.write(yaml.safe_dump(
+        Session(config, operations).serialize(),
+        default_flow_style=False,
+    ))
+    with SessionReader(str(filename)) as reader:
+        assert reader.read_index() == []
+        assert reader.read_end() is None
+        assert [n for n, _ in reader.read_window(2)] == [2, 3, 4]
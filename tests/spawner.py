@@ -0,0 +1,77 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import os
+import signal
+
+import pytest
+
+from sxrumble import spawner
+from sxrumble.spawner import spawn, get_returncode
+
+
+SCRIPT = ['sh', '-c', 'cat; echo err >&2; exit 3']
+
+
+def test_spawn():
+    data = b'line\n' * 4000
+    result, spawned, exited = spawn(SCRIPT, data)
+    assert result.returncode == 3
+    assert result.stdout == data
+    assert result.stderr == b'err\n'
+    assert (result.stdout_size, result.stdout_lines) == (len(data), 4000)
+    assert 0 < spawned <= exited
+
+
+def test_spawn_new_process_group():
+    result, _, _ = spawn(['sh', '-c', 'ps -o pgid= -p $$'], b'')
+    assert int(result.stdout) != os.getpgrp()
+
+
+def test_spawn_timeout():
+    result, spawned, exited = spawn(['sleep', '10'], b'', 0.2)
+    assert result.timed_out is True
+    assert result.returncode == -signal.SIGKILL
+    assert exited - spawned < 5
+
+
+def test_spawn_not_found():
+    with pytest.raises(FileNotFoundError):
+        spawn(['sxrumble-nonexistent-command'], b'')
+
+
+def test_get_returncode():
+    assert get_returncode(3 << 8) == 3
+    assert get_returncode(9) == -9
+
+
+@pytest.fixture
+def client():
+    spawner.start()
+    yield spawner.get_client()
+    spawner.stop()
+
+
+def test_spawn_client(client):
+    result, _, _ = client.run(SCRIPT, b'foo\n')
+    assert (result.returncode, result.stdout, result.stderr) == \
+        (3, b'foo\n', b'err\n')
+    assert (result.stdout_size, result.stdout_lines) == (4, 1)
+    # The connection is reused.
+    assert client.run(['true'], None)[0].returncode == 0
+    assert client.run(['sleep', '10'], None, 0.2)[0].timed_out is True
+    assert len(client.connections) == 1
+
+
+def test_spawn_client_not_found(client):
+    with pytest.raises(FileNotFoundError):
+        client.run(['sxrumble-nonexistent-command'], None)
+
+
+def test_stop():
+    spawner.start()
+    client = spawner.get_client()
+    spawner.stop()
+    assert spawner.get_client() is None
+    assert client.process.returncode == 0
+    assert not os.path.exists(client.directory)
@@ -0,0 +1,73 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import math
+
+import pytest
+
+from sxrumble.stats import (
+    percentile, format_percentiles, mann_whitney_u, mean_interval,
+    percentile_interval, batch_means,
+)
+
+
+@pytest.mark.parametrize('q, expected', [
+    (0, 1),
+    (50, 2.5),
+    (100, 4),
+    (25, 1.75),
+])
+def test_percentile(q, expected):
+    assert percentile([1, 2, 3, 4], q) == expected
+
+
+def test_percentile_single_value():
+    assert percentile([7], 99) == 7
+
+
+def test_percentile_empty():
+    assert math.isnan(percentile([], 50))
+
+
+def test_format_percentiles():
+    assert format_percentiles([3, 1, 2]) == \
+        'p50=2.000s p90=2.800s p99=2.980s max=3.000s'
+    assert format_percentiles([0.003, 0.001], 'ms', 1000, 1) == \
+        'p50=2.0ms p90=2.8ms p99=3.0ms max=3.0ms'
+
+
+def test_mann_whitney_u():
+    a = [1, 2, 3, 4, 5, 6, 7, 8]
+    b = [9, 10, 11, 12, 13, 14, 15, 16]
+    assert mann_whitney_u(a, b) < 0.001
+    assert mann_whitney_u(b, a) > 0.999
+
+
+def test_mann_whitney_u_ties():
+    assert mann_whitney_u([1, 1, 1], [1, 1, 1]) == 1.0
+    assert 0.4 < mann_whitney_u([1, 2, 2, 3], [1, 2, 2, 3]) < 0.7
+
+
+def test_mann_whitney_u_empty():
+    assert mann_whitney_u([], [1]) == 1.0
+
+
+def test_mean_interval():
+    mean, half_width = mean_interval([1, 2, 3])
+    assert mean == 2
+    assert half_width == pytest.approx(4.303 / math.sqrt(3))
+    assert math.isnan(mean_interval([5])[1])
+    assert math.isnan(mean_interval([])[0])
+
+
+def test_percentile_interval():
+    values = list(range(100))
+    low, high = percentile_interval(values, 50)
+    assert low < 50 < high
+    assert (low, high) == (40, 60)
+    assert percentile_interval(values, 99) == (97, 99)
+
+
+def test_batch_means():
+    assert batch_means([1, 3, 5, 7, 9], 2) == [2, 6]
+    assert batch_means([1, 2], 10) == [1, 2]
@@ -0,0 +1,88 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+import logging
+import random
+from array import array
+
+from sxrumble.results import Results
+from sxrumble.steady import find_window, log_steady_state, mser, per_second
+
+
+def make_results(operations):
+    """Results of (start, duration, failed) operations."""
+    header = {'types': ['ListUsers'], 'volumes': [], 'error_classes': []}
+    return Results(header, {
+        'type': array('B', [0] * len(operations)),
+        'start': array('d', [s for s, _, _ in operations]),
+        'end': array('d', [s + d for s, d, _ in operations]),
+        'duration': array('d', [d for _, d, _ in operations]),
+        'error_class': array('B', [int(f) for _, _, f in operations]),
+    })
+
+
+def make_run(warm_up, steady, cool_down):
+    """Slow and few operations during the warm-up and the cool-down."""
+    random.seed(1)
+    operations = []
+    for second in range(warm_up + steady + cool_down):
+        transient = second < warm_up or second >= warm_up + steady
+        for i in range(2 if transient else 20):
+            duration = random.uniform(0.5, 0.9) if transient \
+                else random.uniform(0.09, 0.11)
+            operations.append((second + i / 20, duration, False))
+    return make_results(operations)
+
+
+def test_per_second():
+    results = make_results([
+        (0.0, 0.5, False), (0.2, 0.6, False), (1.0, 1.5, True),
+        (3.0, 0.2, False), (9.0, 0.1, False),
+    ])
+    counts, latency = per_second(results, 0.0, 4.5)
+    assert counts == [2, 0, 1, 1]
+    # The failure does not count towards the latency.
+    assert latency == [0.55, 0.55, 0.55, 0.2]
+
+
+def test_mser():
+    assert mser([5.0] * 50) == 0
+    assert mser([50.0] * 10 + [5.0] * 40) == 10
+    assert mser([5.0] * 40 + [50.0] * 10) == 0
+
+
+def test_find_window():
+    results = make_run(20, 80, 10)
+    window = find_window(results)
+    assert (window.start, window.end) == (0.0, max(results['end']))
+    assert window.description == 'the whole run'
+    window = find_window(results, warm_up=5, cool_down=10)
+    assert window.start == 5.0
+    assert window.end == max(results['end']) - 10
+    assert find_window(results, warm_up=60, cool_down=60) is None
+    assert find_window(make_results([])) is None
+
+
+def test_find_window_steady_state():
+    results = make_run(20, 80, 10)
+    window = find_window(results, detect=True)
+    assert 20 <= window.start <= 25
+    assert 95 <= window.end <= 100
+    assert window.description.startswith('steady state')
+    # Too short to tell.
+    window = find_window(make_run(5, 10, 5), detect=True)
+    assert window.start == 0.0
+    assert window.description.endswith('too short for a steady state')
+
+
+def test_log_steady_state(caplog):
+    caplog.set_level(logging.INFO)
+    log_steady_state(make_run(20, 80, 10), 0.0, 0.0, True)
+    messages = [r.getMessage() for r in caplog.records]
+    assert messages[0].startswith('From 2')
+    assert 'with 95% confidence intervals' in messages[0]
+    assert messages[1].startswith(' - throughput 19.97 ±0.10 ops/s, 1580 ok')
+    assert messages[2].startswith(' - ListUsers      p50=0.100s [0.')
+    caplog.clear()
+    log_steady_state(make_run(5, 10, 5), 30.0, 0.0, False)
+    assert caplog.records[0].levelname == 'WARNING'
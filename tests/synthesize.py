@@ -0,0 +1,123 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from unittest.mock import patch
+
+import pytest
+import yaml
+
+from sxrumble import synthesize
+from sxrumble.config import Session
+from sxrumble.exceptions import ValidationError
+from sxrumble.synthesize import (
+    WorkloadModel, synthesize_session, generate_windows,
+)
+
+
+@pytest.fixture
+def payload():
+    return {
+        'sx_url': '@indian',
+        'volumes': ['v1', 'v2'],
+        'duration': 10,
+        'rate': 20,
+        'seed': 1,
+        'mix': {'ListFiles': 1, 'UploadNewFile': 2, 'ListUsers': 1},
+        'sizes': {'min': '1K', 'max': '4K'},
+    }
+
+
+def test_workload_model(payload):
+    model = WorkloadModel(payload)
+    assert model.config.volumes == ['v1', 'v2']
+    assert model.config.min_size == 1024
+    assert model.config.max_size == 4096
+    assert model.arrival == 'poisson'
+    assert model.mix == [
+        ('ListFiles', 1), ('ListUsers', 1), ('UploadNewFile', 2),
+    ]
+
+
+def test_workload_model_defaults(payload):
+    del payload['mix']
+    del payload['sizes']
+    model = WorkloadModel(payload)
+    assert len(model.mix) == 5
+    assert 'GlobFiles' not in dict(model.mix)
+    assert model.config.max_size == 2 ** 20
+    assert model.size_distribution == 'uniform'
+
+
+@pytest.mark.parametrize('change', [
+    {'duration': None},
+    {'rate': 0},
+    {'arrival': 'bursty'},
+    {'mix': {'Garbage': 1}},
+    {'mix': {'ListFiles': -1}},
+    {'mix': {'CreateVolume': 1}},
+    {'sizes': {'distribution': 'zipf'}},
+    {'sizes': {'min': 'garbage'}},
+    {'volumes': ['a/b']},
+])
+def test_workload_model_invalid(payload, change):
+    payload.update(change)
+    with pytest.raises(ValidationError):
+        WorkloadModel(payload)
+
+
+def test_workload_model_missing(payload):
+    del payload['sx_url']
+    with pytest.raises(ValidationError):
+        WorkloadModel(payload)
+
+
+def load_session(tmpdir, payload):
+    model_file = tmpdir.join('model.yaml')
+    model_file.write(yaml.safe_dump(payload))
+    session_file = str(tmpdir.join('session.yaml'))
+    synthesize_session(str(model_file), session_file)
+    return Session.from_file(session_file)
+
+
+@pytest.mark.parametrize('arrival', ['poisson', 'uniform'])
+def test_synthesize_session(tmpdir, payload, arrival):
+    payload['arrival'] = arrival
+    payload['sizes']['distribution'] = 'lognormal'
+    payload['sizes']['median'] = '2K'
+    session = load_session(tmpdir, payload)
+    operations = session.operations
+    assert 100 < len(operations) < 300
+    times = [o['time'] for o in operations]
+    assert times == sorted(times)
+    assert 0 <= times[0] and times[-1] < 10
+    assert {o['type'] for o in operations} == \
+        {'ListFiles', 'UploadNewFile', 'ListUsers'}
+    for o in operations:
+        if o['type'] == 'UploadNewFile':
+            params = o['params']
+            assert 1024 <= params['size'] <= 4096
+            assert params['offset'] + params['size'] <= \
+                session.config.entropy_size
+            assert params['filename'].startswith('sxrumble-')
+            assert params['volume'] in ('v1', 'v2')
+
+
+def test_synthesize_session_deterministic(tmpdir, payload):
+    first = load_session(tmpdir, payload)
+    second = load_session(tmpdir, payload)
+    assert first.operations == second.operations
+    assert first.config.serialize() == second.config.serialize()
+
+    payload['seed'] = 2
+    assert load_session(tmpdir, payload).operations != first.operations
+
+
+def test_generate_windows_independent_of_processes(payload):
+    model = WorkloadModel(payload)
+    with patch.object(synthesize, 'WINDOW_OPERATIONS', 10):
+        with patch('os.cpu_count', return_value=1):
+            serial = list(generate_windows(model))
+        with patch('os.cpu_count', return_value=2):
+            parallel = list(generate_windows(model))
+    assert len(serial) == 10
+    assert serial == parallel
@@ -0,0 +1,173 @@
+# Copyright (C) 2015-2016 Skylable Ltd. <info-copyright@skylable.com>
+# License: Apache 2.0, see LICENSE for more details.
+
+from concurrent.futures import Future
+from unittest.mock import Mock, patch
+
+import pytest
+
+from sxrumble import record
+from sxrumble.config import Config, Options
+from sxrumble.control import Controls, POLL_INTERVAL
+from sxrumble.exceptions import ValidationError
+from sxrumble.metrics import Metrics
+from sxrumble.operations import ListFiles, UploadNewFile
+from sxrumble.users import (
+    UserModel, VirtualUser, create_users, load_user_model, parse_think,
+)
+
+
+MODEL = {
+    'start': 'browse',
+    'states': {
+        'browse': {
+            'operation': 'ListFiles',
+            'think': {'distribution': 'constant', 'value': 2},
+            'next': {'upload': 1},
+        },
+        'upload': {
+            'operation': 'UploadNewFile',
+            'next': {'pause': 1, 'upload': 0},
+        },
+        'pause': {'think': 5, 'next': {'browse': 1}},
+    },
+}
+
+
+@pytest.fixture
+def config():
+    return Config(
+        sx_url='@a',
+        endpoints=[{'url': '@a', 'weight': 1}, {'url': '@b', 'weight': 1}],
+        endpoint_policy='sticky',
+        volumes=['v1', 'v2', 'v3'],
+        threads=4,
+        min_size=1,
+        max_size=4,
+        entropy_size=10,
+        entropy_seed='abc',
+    )
+
+
+def test_virtual_user(config):
+    user = VirtualUser(config, Mock(pick=Mock(return_value=1), urls=[
+        '@a', '@b',
+    ]), UserModel(MODEL))
+    assert len(user.config.volumes) == 1
+    assert user.config.volumes[0] in config.volumes
+    assert config.volumes == ['v1', 'v2', 'v3']
+    operation = user.create_operation()
+    assert isinstance(operation, ListFiles)
+    assert operation.volume == user.config.volumes[0]
+    assert (operation.endpoint, operation.sx_url) == (1, '@b')
+    assert user.advance() == 2
+    assert isinstance(user.create_operation(), UploadNewFile)
+    user.advance()
+    assert user.state.name == 'pause'
+    assert user.create_operation() is None
+
+
+def test_create_users(config):
+    users = create_users(config, load_user_model(None), 30)
+    assert len(users) == 30
+    # Sticky endpoints follow the volume of the user.
+    for user in users:
+        assert user.sx_url == users[0].sx_url or \
+            user.config.volumes != users[0].config.volumes
+
+
+def test_load_user_model(tmpdir):
+    path = tmpdir.join('users.yaml')
+    path.write(
+        'start: a\n'
+        'states:\n'
+        '  a: {operation: ListUsers, next: {a: 1}}\n',
+    )
+    model = load_user_model(str(path))
+    assert model.start.name == 'a'
+    assert model.start.think() == 0.0
+    assert model.ramp_up == 0
+
+
+def test_parse_think():
+    assert parse_think(0)() == 0.0
+    assert parse_think(1.5)() >= 0.0
+    assert 1 <= parse_think({
+        'distribution': 'uniform', 'min': 1, 'max': 2,
+    })() <= 2
+    assert parse_think({'mean': 1})() >= 0.0
+    for think in [-1, 'long', {'distribution': 'pareto'},
+                  {'distribution': 'uniform', 'min': 1}]:
+        with pytest.raises(ValidationError):
+            parse_think(think)
+
+
+@pytest.mark.parametrize('payload', [
+    [],
+    {'start': 'a'},
+    {'start': 'b', 'states': {'a': {'operation': 'ListUsers',
+                                    'next': {'a': 1}}}},
+    {'start': 'a', 'states': {'a': {'operation': 'Nonexistent',
+                                    'next': {'a': 1}}}},
+    {'start': 'a', 'states': {'a': {'operation': 'ListUsers',
+                                    'next': {'b': 1}}}},
+    {'start': 'a', 'states': {'a': {'operation': 'ListUsers',
+                                    'next': {'a': 0}}}},
+    {'start': 'a', 'states': {'a': {'operation': 'ListUsers'}}},
+    {'start': 'a', 'states': {'a': {'next': {'a': 1}}}},
+    {'start': 'a', 'ramp_up': -1,
+     'states': {'a': {'operation': 'ListUsers', 'next': {'a': 1}}}},
+])
+def test_user_model_invalid(payload):
+    with pytest.raises(ValidationError):
+        UserModel(payload)
+
+
+def test_run_users_paused(config):
+    controls = Controls(4, 4)
+    controls.execute('pause')
+    users = create_users(config, UserModel(MODEL), 2)
+    timeouts = []
+
+    def sleep(timeout):
+        timeouts.append(timeout)
+        if len(timeouts) == 3:
+            raise KeyboardInterrupt
+
+    with patch.object(record, 'sleep', side_effect=sleep):
+        futures = list(record.run_users_and_yield_futures(
+            config, Options(), Metrics(0.0), controls, users, 0.0,
+        ))
+    # Overdue users do not start while paused.
+    assert futures == []
+    assert timeouts == [POLL_INTERVAL] * 3
+
+
+def test_schedule_threads_change(config):
+    controls = Controls(1, 4, rate=1e6)
+    batcher = Mock()
+    batcher.submit.side_effect = lambda *args: Future()
+    operation = Mock(volume='v1')
+    pending = []
+
+    def wait(running, timeout, return_when):
+        if timeout is not None:
+            # Waiting for the next arrival.
+            return set(), running
+        pending.append(len(running))
+        if len(pending) == 1:
+            controls.execute('threads 2')
+        else:
+            raise KeyboardInterrupt
+        return set(), running
+
+    with patch.object(record, 'UploadBatcher', return_value=batcher), \
+            patch.object(record, 'pick_operation', return_value=operation), \
+            patch.object(record, 'wait', side_effect=wait):
+        list(record.schedule_and_yield_futures(
+            config, Options(), Metrics(0.0), controls,
+        ))
+    # The limit of pending operations follows the threads.
+    assert pending == [
+        record.PENDING_PER_THREAD, 2 * record.PENDING_PER_THREAD,
+    ]
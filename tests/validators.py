@@ -6,9 +6,11 @@ import pytest
 from sxrumble.config import ENTROPY_SEED_LENGTH, ENTROPY_SEED_CHARACTERS
 from sxrumble.exceptions import ValidationError
 from sxrumble.validators import (
-    validate_args, validate_sx_url, validate_volume, validate_threads,
+    validate_args, validate_endpoints, validate_endpoint_policy,
+    validate_choice, validate_namespace,
+    validate_sx_url, validate_volume, validate_threads,
     validate_sizes, validate_entropy_size, validate_entropy_seed,
-    generate_entropy_seed,
+    generate_entropy_seed, validate_options,
 )
 
 
@@ -35,9 +37,82 @@ def test_validate_args():
         'max_size': raw_args['max_size'],
         'entropy_size': 100 * ONE_MB,
         'entropy_seed': raw_args['entropy_seed'],
+        'endpoints': [{'url': '@indian', 'weight': 1}],
+        'endpoint_policy': 'round-robin',
+        'namespace': {
+            'depth': 0,
+            'fanout': [10],
+            'name_length': None,
+            'prefix': 'sxrumble-',
+            'recursive': 0.1,
+        },
     }
 
 
+def test_validate_args_endpoints():
+    raw_args = {
+        'sx_url': '@indian',
+        'endpoints': [
+            {'url': '@indian', 'weight': 2},
+            {'url': 'sx://admin@node2', 'weight': 1},
+        ],
+        'endpoint_policy': 'sticky',
+        'volumes': ['jungle'],
+        'threads': 4,
+        'min_size': ONE_KB,
+        'max_size': ONE_MB,
+        'entropy_size': None,
+        'entropy_seed': None,
+    }
+    args = validate_args(raw_args)
+    assert args['endpoints'] == raw_args['endpoints']
+    assert args['endpoint_policy'] == 'sticky'
+
+
+@pytest.mark.parametrize('endpoints', [
+    [],
+    [{'url': 'indian', 'weight': 1}],
+    [{'url': '@indian', 'weight': 0}],
+])
+def test_validate_endpoints_invalid(endpoints):
+    with pytest.raises(ValidationError):
+        validate_endpoints(endpoints)
+
+
+def test_validate_namespace():
+    shape = validate_namespace({'depth': 2, 'name_length': [12, 20]})
+    assert shape['fanout'] == [10]
+    assert shape['name_length'] == [12, 20]
+
+
+@pytest.mark.parametrize('shape', [
+    {'depth': -1},
+    {'fanout': [4, 0]},
+    {'depth': 20, 'fanout': [1000]},
+    {'prefix': 'a/b'},
+    {'name_length': [5, 20]},
+    {'name_length': [20, 12]},
+    {'recursive': 1.5},
+    {'width': 3},
+])
+def test_validate_namespace_invalid(shape):
+    with pytest.raises(ValidationError):
+        validate_namespace(shape)
+
+
+def test_validate_endpoint_policy():
+    assert validate_endpoint_policy('weighted') == 'weighted'
+    with pytest.raises(ValidationError):
+        validate_endpoint_policy('random')
+
+
+def test_validate_choice():
+    assert validate_choice('uniform', ('poisson', 'uniform'), 'arrival') \
+        == 'uniform'
+    with pytest.raises(ValidationError):
+        validate_choice('bursty', ('poisson', 'uniform'), 'arrival')
+
+
 def test_validate_sx_url():
     assert validate_sx_url('@indian') == '@indian'
     with pytest.raises(ValidationError):
@@ -131,3 +206,60 @@ def test_generate_entropy_seed():
     assert len(seed) == ENTROPY_SEED_LENGTH
     for c in seed:
         assert c in ENTROPY_SEED_CHARACTERS
+
+
+def test_validate_options_defaults():
+    options = validate_options({})
+    assert options['timeouts'] == {}
+    assert options['retries'] == 0
+    assert options['retry_backoff'] == 1.0
+    assert (options['window_start'], options['window_end']) == (0.0, None)
+    assert options['manifest'] is None
+    assert (options['populate_count'], options['batch_size']) == (0, 1)
+    assert (options['upload_batch'], options['upload_linger']) == (1, 0.01)
+    assert options['rate'] is None
+    assert options['slo'] is None
+    assert (options['metrics_address'], options['metrics_file']) == \
+        (None, None)
+    assert options['metrics_interval'] == 15.0
+    assert options['control_socket'] is None
+    assert options['host_interval'] == 0.0
+    assert (options['users'], options['user_model']) == (None, None)
+    assert options['mix'] is None
+    assert (options['warm_up'], options['cool_down']) == (0.0, 0.0)
+    assert options['steady_state'] is False
+    assert validate_options({'mix': 'ListUsers=1,RevokeAcl=3'})['mix'][-1] \
+        == 4.0
+    assert validate_options({'slo': {'percentile': 99.0, 'latency': 0.5}})[
+        'slo'] == {'percentile': 99.0, 'latency': 0.5, 'errors': 1.0}
+
+
+@pytest.mark.parametrize('args', [
+    {'timeout': {'Nonexistent': 1.0}},
+    {'timeout': {'*': 0.0}},
+    {'retries': -1},
+    {'retry_backoff': -1.0},
+    {'from': -1.0},
+    {'from': 10.0, 'to': 5.0},
+    {'count': -1},
+    {'batch': 0},
+    {'upload_batch': 0},
+    {'upload_linger': -1.0},
+    {'rate': 0.0},
+    {'slo': {'errors': 1.0}},
+    {'slo': {'percentile': 100.0, 'latency': 0.5}},
+    {'slo': {'percentile': 99.0, 'latency': 0.0}},
+    {'rate': 1.0, 'slo': {'percentile': 99.0, 'latency': 0.5}},
+    {'metrics_address': ('', 65536)},
+    {'metrics_interval': 0.0},
+    {'host_interval': -1.0},
+    {'users': 0},
+    {'count': 10, 'resume': True},
+    {'users': 10, 'rate': 1.0},
+    {'user_model': 'users.yaml'},
+    {'mix': 'Nonexistent=1'},
+    {'users': 10, 'mix': 'ListUsers=1'},
+])
+def test_validate_options_invalid(args):
+    with pytest.raises(ValidationError):
+        validate_options(args)